@@ -14,6 +14,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 
 
+import os
+
 from pathlib import Path
 
 from datetime import timedelta
@@ -84,6 +86,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
 
+    'base.middleware.PerformanceMiddleware',
+
+    'base.middleware.ReplicaPinningMiddleware',
+
     'corsheaders.middleware.CorsMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
@@ -151,16 +157,53 @@ DATABASES = {
 
     'default': {
 
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus WAL and other PRAGMAs, see base/db/sqlite3.
+        # WAL is recorded in the database file, so the first connection to a
+        # database still in rollback-journal mode rewrites it once. The file
+        # is not tracked by git; `manage.py migrate` creates it
+        'ENGINE': 'base.db.sqlite3',
 
         'NAME': BASE_DIR / 'db.sqlite3',
 
+        # Connections, and the PRAGMAs applied when they open, are reused for
+        # this many seconds by each request thread and by the write queue's
+        # thread; the health check replaces one that was closed under it
+        'CONN_MAX_AGE': 600,
+
+        'CONN_HEALTH_CHECKS': True,
+
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 20000,
+            },
+        },
+
     }
 
 }
 
 
 
+# Aliases in DATABASES that serve reads, see base.routers. Set
+# ARTISTHUB_LOCAL_REPLICA=1 to try it with a second SQLite file kept in sync
+# by `manage.py sync_replica`.
+DATABASE_REPLICAS = []
+
+if os.environ.get('ARTISTHUB_LOCAL_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['base.routers.ReplicaRouter']
+
+
+
 
 
 # Password validation
@@ -259,7 +302,7 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
 
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'base.authentication.CachedJWTAuthentication',
 
     ),
 
@@ -280,7 +323,7 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 
     "http://127.0.0.1:5173",
-    "https://artistryhubrw.netlify.app/",
+    "https://artistryhubrw.netlify.app",
 ]
 
 
@@ -305,3 +348,115 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 
 }
+
+
+
+# OpenAPI docs, see base.docs. In deployments, run `manage.py build_schema`
+# and point ARTISTHUB_SCHEMA_FILE at its output so the schema is served from
+# disk; ARTISTHUB_API_DOCS=0 drops Swagger UI and Redoc.
+API_DOCS = {
+    'ENABLED': os.environ.get('ARTISTHUB_API_DOCS', '1') == '1',
+    'SCHEMA_FILE': os.environ.get('ARTISTHUB_SCHEMA_FILE'),
+}
+
+if API_DOCS['ENABLED']:
+    # Provides the Swagger UI and Redoc templates
+    INSTALLED_APPS.append('drf_spectacular')
+
+
+
+# Request timing, query accounting and the /metrics endpoint
+PERFORMANCE_MONITORING = {
+    'SERVER_TIMING': True,
+    # Log requests slower than this (in ms) together with their SQL; None disables
+    'SLOW_REQUEST_MS': None,
+    # Bearer token a Prometheus scraper sends for /metrics; staff sessions
+    # can read it without one, and with neither it is forbidden
+    'METRICS_TOKEN': os.environ.get('ARTISTHUB_METRICS_TOKEN'),
+}
+
+
+
+# Prior for the Bayesian artwork score: WEIGHT virtual ratings of MEAN
+RATING_PRIOR = {
+    'WEIGHT': 5,
+    'MEAN': 3.0,
+}
+
+
+
+# Item-item recommendations behind /api/artworks/<slug>/similar/, recomputed
+# by `manage.py update_similar`
+SIMILAR_ARTWORKS = {
+    'TOP_K': 20,
+    'CHUNK_SIZE': 500,
+    'WEIGHTS': {'like': 1.0, 'rating': 1.0},
+}
+
+
+
+# Cache of users resolved from JWTs, see base.authentication.UserCache
+AUTH_USER_CACHE = {
+    'LOCAL_TTL': 5,
+    'MAX_AGE': 60,
+    'LOCAL_SIZE': 10000,
+}
+
+
+
+# Threads reserved for password hashing in the async register/login views;
+# None uses one per CPU
+PASSWORD_HASHING_WORKERS = None
+
+
+
+# Single writer thread for the like/join toggles, see base.writequeue
+WRITE_QUEUE = {
+    'ENABLED': True,
+    'RETRIES': 5,
+    'BACKOFF': 0.05,
+    'TIMEOUT': 30,
+}
+
+
+
+# Server-sent notification stream, see base.notifications
+NOTIFICATIONS = {
+    'BACKEND': 'base.notifications.InProcessHub',
+    'BACKLOG': 100,
+    'BACKLOG_USERS': 10000,
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT_SECONDS': 15,
+    'RETRY_MS': 3000,
+}
+
+
+
+# Holds the generations of base.refcache, the user versions of
+# base.authentication and the replica pins of base.middleware. The default
+# is local to each process, so other workers notice a change only once
+# their copies expire; set ARTISTHUB_REDIS_URL to share it between workers.
+# Not a database table: refcache lookups on GETs must not write to SQLite.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get('ARTISTHUB_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['ARTISTHUB_REDIS_URL'],
+    }
+
+
+
+# Per-process caches of galleries and usernames, see base.refcache. Changes
+# reach other workers through CACHES when it is shared, and after MAX_AGE
+# seconds when it is not
+REFERENCE_CACHE = {
+    'CHECK_INTERVAL': 5,
+    'MAX_AGE': 300,
+    'GALLERIES_SIZE': 1000,
+    'USERNAMES_SIZE': 50000,
+}
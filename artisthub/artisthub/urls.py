@@ -34,23 +34,22 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-    SpectacularRedocView,
-)
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from base.views import RegisterView
+from rest_framework_simplejwt.views import TokenRefreshView
+from base import docs
+from base.async_views import register
+from base.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/register/', RegisterView.as_view(), name='register'),
+    path('api/register/', register, name='register'),
     path('api/', include('base.urls')),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path('api/schema/', docs.schema, name='schema'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if docs.docs_config()['ENABLED']:
+    urlpatterns += [
+        path('api/docs/', docs.swagger_ui, name='swagger-ui'),
+        path('api/redoc/', docs.redoc, name='redoc'),
+    ]
@@ -1,9 +1,178 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils.functional import cached_property
+from .authentication import user_cache
 from .models import User, Gallery, Artwork, Comment, Like, Event
-# Register your models here.
-admin.site.register(User)
-admin.site.register(Gallery)
-admin.site.register(Artwork)
-admin.site.register(Comment)
-admin.site.register(Like)
-admin.site.register(Event)
+
+# Unfiltered changelists of tables at least this big show the planner's row
+# estimate instead of running COUNT(*)
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimated_row_count(model):
+    """The database's statistics-based row count for model's table, or None"""
+    connection = connections[model.objects.db]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]),
+        'mysql': ('SELECT table_rows FROM information_schema.tables '
+                  'WHERE table_schema = DATABASE() AND table_name = %s', [table]),
+        # Filled in by ANALYZE / PRAGMA optimize; the first number is the row count
+        'sqlite': ('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for a table that was never analyzed
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        # Unfiltered but for the default manager's own filter, such as the
+        # soft-delete one, which the estimate of the whole table ignores
+        base = self.object_list.model._default_manager.all().query.where
+        if self.object_list.query.where == base:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+@admin.action(description='Soft-delete selected (purged later by purge_deleted)')
+def soft_delete_selected(modeladmin, request, queryset):
+    count = 0
+    for obj in queryset:
+        obj.soft_delete()
+        count += 1
+    modeladmin.message_user(request, f'{count} hidden; purge_deleted will remove them.', messages.SUCCESS)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow to millions of rows"""
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) over the whole table on filtered pages
+    show_full_result_count = False
+    # Newest first, straight off the primary key
+    ordering = ['-id']
+    search_help_text = 'Exact slug or username, or an ID'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Only indexed exact matches are searched, and a number is tried as an ID
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip().isdigit():
+            results |= queryset.filter(pk=int(search_term.strip()))
+        return results, may_have_duplicates
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin, LargeTableAdmin):
+    list_display = ['id', 'username', 'email', 'is_artist', 'is_staff', 'is_active', 'date_joined']
+    list_filter = ['is_artist', 'is_staff', 'is_active']
+    search_fields = ['username__exact']
+    search_help_text = 'Exact username, or an ID'
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ('Profile', {'fields': ('is_artist', 'bio', 'profile_picture', 'website', 'social_media')}),
+    )
+    # BaseUserAdmin comes first in the MRO and orders by username
+    ordering = LargeTableAdmin.ordering
+    actions = ['mark_artist', 'deactivate', soft_delete_selected]
+
+    def update_users(self, queryset, **values):
+        """
+        queryset.update(), plus what post_save would have done: drop the
+        cached copies CachedJWTAuthentication serves
+        """
+        user_ids = list(queryset.values_list('pk', flat=True))
+        updated = User.objects.filter(pk__in=user_ids).update(**values)
+
+        def invalidate():
+            for user_id in user_ids:
+                user_cache.invalidate(user_id)
+        transaction.on_commit(invalidate)
+        return updated
+
+    @admin.action(description='Mark selected users as artists')
+    def mark_artist(self, request, queryset):
+        updated = self.update_users(queryset, is_artist=True)
+        self.message_user(request, f'{updated} users marked as artists.', messages.SUCCESS)
+
+    @admin.action(description='Deactivate selected users')
+    def deactivate(self, request, queryset):
+        updated = self.update_users(queryset, is_active=False)
+        self.message_user(request, f'{updated} users deactivated.', messages.SUCCESS)
+
+
+@admin.register(Gallery)
+class GalleryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'type', 'slug', 'created_at']
+    list_filter = ['type']
+    # Also serves the artwork form's gallery autocomplete
+    search_fields = ['name', 'slug']
+    prepopulated_fields = {'slug': ['name']}
+
+
+@admin.register(Artwork)
+class ArtworkAdmin(LargeTableAdmin):
+    list_display = ['id', 'title', 'artist', 'gallery', 'status', 'views', 'rating_count', 'created_at']
+    list_select_related = ['artist', 'gallery']
+    list_filter = ['status', 'gallery__type']
+    search_fields = ['slug__exact', 'artist__username__exact']
+    raw_id_fields = ['artist']
+    autocomplete_fields = ['gallery']
+    readonly_fields = ['views', 'rating_sum', 'rating_count', 'bayesian_score']
+    actions = ['mark_completed', 'mark_in_progress', soft_delete_selected]
+
+    @admin.action(description='Mark selected artworks as completed')
+    def mark_completed(self, request, queryset):
+        updated = queryset.update(status='completed')
+        self.message_user(request, f'{updated} artworks marked as completed.', messages.SUCCESS)
+
+    @admin.action(description='Mark selected artworks as in progress')
+    def mark_in_progress(self, request, queryset):
+        updated = queryset.update(status='in-progress')
+        self.message_user(request, f'{updated} artworks marked as in progress.', messages.SUCCESS)
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ['id', 'user', 'artwork', 'excerpt', 'depth', 'reply_count', 'created_at']
+    # Artwork.__str__ includes the artist's username
+    list_select_related = ['user', 'artwork__artist']
+    search_fields = ['user__username__exact', 'artwork__slug__exact']
+    raw_id_fields = ['user', 'artwork', 'parent']
+    readonly_fields = ['path', 'depth', 'reply_count']
+
+    @admin.display(description='Content')
+    def excerpt(self, obj):
+        return obj.content if len(obj.content) <= 80 else f'{obj.content[:77]}...'
+
+
+@admin.register(Like)
+class LikeAdmin(LargeTableAdmin):
+    list_display = ['id', 'user', 'artwork', 'created_at']
+    # Artwork.__str__ includes the artist's username
+    list_select_related = ['user', 'artwork__artist']
+    search_fields = ['user__username__exact', 'artwork__slug__exact']
+    raw_id_fields = ['user', 'artwork']
+
+
+@admin.register(Event)
+class EventAdmin(LargeTableAdmin):
+    list_display = ['id', 'title', 'created_by', 'location', 'start_date', 'end_date', 'max_participants']
+    list_select_related = ['created_by']
+    search_fields = ['slug__exact', 'created_by__username__exact']
+    raw_id_fields = ['created_by', 'participants']
+    actions = [soft_delete_selected]
@@ -0,0 +1,285 @@
+"""
+Native async views.
+
+The catalog reads are the hottest anonymous endpoints. Under ASGI they
+run on the event loop instead of being pushed through a thread by DRF's
+sync views. Every relation the serializers touch is loaded up front with
+the async ORM, and the output matches the DRF endpoints byte for byte.
+Only lookups in base.refcache may still read the database, so they run
+in a thread. The lists are built by the row serializers in
+base.rowserializers. They always serve the anonymous view
+(is_liked/is_joined are false), which keeps the serializers from touching
+the session user synchronously.
+
+Registration and login hash passwords on the bounded pool in
+base.hashing, so a burst of them cannot starve other requests.
+
+The notification stream holds its connection open on the event loop,
+waiting on the hub in base.notifications, and the iCalendar feeds are
+written out from base.ical while their events are read.
+"""
+import asyncio
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import hashing, ical, notifications
+from .authentication import CachedJWTAuthentication, user_cache
+
+from .models import User, Gallery, Artwork, Comment, Event
+from .renderers import FastJSONRenderer
+from .rowserializers import ArtworkRows, EventRows
+from .serializers import ArtworkSerializer, UserSerializer
+from .views import filter_events_by_status
+from .writequeue import write_queue
+
+CHUNK_SIZE = 2000
+
+
+def artwork_queryset():
+    # Artist, gallery and commenter names come from base.refcache
+    return Artwork.objects.annotate(likes_total=Count('likes')).prefetch_related(
+        Prefetch(
+            'comments', queryset=Comment.objects.filter(parent=None).order_by('id'),
+            to_attr='top_level_comments',
+        ),
+    )
+
+
+def anonymous(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = AnonymousUser()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def render(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type='application/json'
+    )
+
+
+def not_found(model):
+    return render({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+@anonymous
+async def artwork_list(request):
+    """List artworks"""
+    return render(await ArtworkRows(request).aserialize(Artwork.objects.all()))
+
+
+@anonymous
+async def artwork_detail(request, slug):
+    """Retrieve a single artwork"""
+    try:
+        artwork = await artwork_queryset().aget(slug=slug)
+    except Artwork.DoesNotExist:
+        return not_found(Artwork)
+    await sync_to_async(write_queue.submit)(lambda: Artwork.record_view(artwork.pk, artwork.artist_id))
+    serializer = ArtworkSerializer(artwork, context={'request': request})
+    # A reference cache miss reads the database
+    return render(await sync_to_async(lambda: serializer.data)())
+
+
+@anonymous
+async def gallery_artworks(request, slug):
+    """List artworks in a gallery"""
+    try:
+        gallery = await Gallery.objects.aget(slug=slug)
+    except Gallery.DoesNotExist:
+        return not_found(Gallery)
+    # Matches GalleryViewSet.artworks, which serializes without a request
+    return render(await ArtworkRows().aserialize(Artwork.objects.filter(gallery=gallery)))
+
+
+@anonymous
+async def event_list(request):
+    """List events, optionally filtered and ordered by status"""
+    queryset = filter_events_by_status(
+        Event.objects.all(), request.GET.get('status'), request.GET.get('ordering')
+    )
+    return render(await EventRows(request).aserialize(queryset))
+
+
+def parse_body(request):
+    """Read a JSON or form-encoded body, returning None if the JSON is malformed"""
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """Register a new user"""
+    data = parse_body(request)
+    if data is None:
+        return render({'detail': 'JSON parse error'}, status=400)
+    serializer = UserSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return render(serializer.errors, status=400)
+    encoded = await hashing.amake_password(serializer.validated_data['password'])
+    await sync_to_async(serializer.save)(encoded_password=encoded)
+    return render(serializer.data, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def token_obtain_pair(request):
+    """Exchange a username and password for a refresh/access token pair"""
+    data = parse_body(request)
+    if data is None:
+        return render({'detail': 'JSON parse error'}, status=400)
+    if not isinstance(data, dict):
+        return render({'non_field_errors': [
+            f'Invalid data. Expected a dictionary, but got {type(data).__name__}.'
+        ]}, status=400)
+    errors = {}
+    for field in ('username', 'password'):
+        if not data.get(field):
+            errors[field] = ['This field is required.']
+        elif not isinstance(data[field], str):
+            errors[field] = ['Not a valid string.']
+    if errors:
+        return render(errors, status=400)
+
+    # ModelBackend spends the same hashing time on unknown usernames, so
+    # response times do not reveal which ones exist
+    user = await hashing.aauthenticate(request, username=data['username'], password=data['password'])
+    if user is None:
+        response = render(
+            {'detail': 'No active account found with the given credentials'}, status=401
+        )
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+        return response
+
+    refresh = RefreshToken.for_user(user)
+    return render({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+
+def sse_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+    )
+
+
+async def notification_events(user_id, last_event_id):
+    config = notifications.notification_config()
+    hub = notifications.get_hub()
+    subscriber, missed = hub.subscribe(user_id, last_event_id)
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        for event in missed:
+            yield sse_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(), config['HEARTBEAT_SECONDS']
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': heartbeat\n\n'
+                continue
+            if event is None:
+                # Dropped as a slow consumer; the client resumes from the backlog
+                break
+            yield sse_event(event)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def stream_user(request):
+    """The active user a stream request authenticates as, or None"""
+    # EventSource cannot set headers, so browsers pass a stream ticket instead
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    try:
+        if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+            authenticator = CachedJWTAuthentication()
+            user = authenticator.get_user(authenticator.get_validated_token(parts[1]))
+        elif request.GET.get('ticket'):
+            user = user_cache.get(notifications.ticket_user_id(request.GET['ticket']))
+        else:
+            return None
+    except (AuthenticationFailed, signing.BadSignature):
+        return None
+    # Neither a token nor a ticket outlives a deactivation or a deletion
+    if user is None or not user.is_active or user.deleted_at is not None:
+        return None
+    return user
+
+
+async def notification_stream(request):
+    """Stream the current user's notifications as server-sent events"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would drain the endless stream and never return
+        return render({'detail': 'Notification streams are only served under ASGI.'}, status=501)
+
+    user = await sync_to_async(stream_user)(request)
+    if user is None:
+        return render({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        notification_events(user.pk, last_event_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def event_calendar_feed(request, token):
+    """iCalendar feed of the events a user has joined"""
+    try:
+        user_id = ical.claimed_user_id(token)
+        secret = await User.objects.filter(pk=user_id).values_list('calendar_secret', flat=True).afirst()
+        if secret is None:
+            return not_found(User)
+        ical.check_token(token, secret)
+    except (signing.BadSignature, ValueError):
+        return not_found(User)
+    events = Event.objects.filter(participants=user_id)
+    aggregates = await events.aaggregate(**ical.FEED_AGGREGATES)
+    etag = ical.feed_etag(user_id, aggregates)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        events = events.only(
+            'id', 'slug', 'title', 'location', 'description', 'start_date', 'end_date', 'updated_at'
+        ).order_by('start_date', 'id')
+        response = StreamingHttpResponse(
+            ical.feed(
+                'ArtistryHub events', events.aiterator(chunk_size=CHUNK_SIZE),
+                lambda event: request.build_absolute_uri(reverse('event-detail', args=[event.slug])),
+            ),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'inline; filename="events.ics"'
+    response['ETag'] = etag
+    # Anyone holding the URL can read it, but shared caches should not keep it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,138 @@
+"""
+JWT authentication that resolves users without a query per request.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication, JWTStatelessUserAuthentication
+)
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+DEFAULTS = {
+    # Seconds a process trusts its own copy before re-checking the version
+    'LOCAL_TTL': 5,
+    # Seconds before a copy is read again whatever its version says
+    'MAX_AGE': 60,
+    'LOCAL_SIZE': 10000,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+
+def _version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+class UserCache:
+    """
+    In-process LRU of user rows, stamped with a version kept in the Django
+    cache that is replaced once a save or delete of the user commits. Every
+    LOCAL_TTL seconds a copy's version is read again, a cache read and no
+    query; a copy whose version moved on is reloaded with one SELECT.
+
+    When settings.CACHES is shared by every worker, a copy lives at most
+    LOCAL_TTL seconds past a change made elsewhere. With the per-process
+    default, other workers never see the new version, so each copy is also
+    reloaded once it is MAX_AGE seconds old.
+    """
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._fields = None
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = [field.attname for field in User._meta.concrete_fields]
+        return self._fields
+
+    def get(self, user_id):
+        """Return a fresh User instance for user_id, or None if it does not exist"""
+        config = _config()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry and entry[0] > now:
+                self._local.move_to_end(user_id)
+                return self._build(entry[3])
+
+        # Read only: users who never changed have no version yet
+        version = cache.get(_version_key(user_id))
+        if entry and entry[2] == version and now - entry[1] < config['MAX_AGE']:
+            loaded_at, row = entry[1], entry[3]
+        else:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                return None
+            loaded_at, row = now, tuple(getattr(user, name) for name in self.fields)
+
+        with self._lock:
+            self._local[user_id] = (now + config['LOCAL_TTL'], loaded_at, version, row)
+            self._local.move_to_end(user_id)
+            while len(self._local) > config['LOCAL_SIZE']:
+                self._local.popitem(last=False)
+        return self._build(row)
+
+    def invalidate(self, user_id):
+        cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _build(self, row):
+        # A new instance per request, so no state leaks between requests
+        return User.from_db('default', self.fields, row)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that loads users through user_cache"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class LiteJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Builds request.user from the token claims alone, without touching the
+    database or cache. Only for endpoints that need nothing but the user
+    ID: a deactivated user keeps access until their token expires.
+    """
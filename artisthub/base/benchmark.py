@@ -0,0 +1,236 @@
+"""
+Synthetic data and load-generation helpers for the API benchmarks.
+"""
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User, Gallery, Artwork, Like, Comment, Event, ArtworkRating, ArtistStats
+
+DEFAULT_VOLUMES = {
+    'users': 200,
+    'galleries': 8,
+    'artworks': 1000,
+    'likes': 5000,
+    'comments': 2000,
+    'ratings': 3000,
+    'events': 100,
+}
+
+
+@contextmanager
+def benchmark_database():
+    """Run the enclosed block against a throwaway test database"""
+    old_name = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite':
+        # A file database locks like production does; the shared-cache
+        # in-memory test database fails concurrent writers outright
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connection.settings_dict['TEST']['NAME'] = path
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def _pairs(rng, users, artworks, count):
+    """Pick up to count distinct (user, artwork) pairs"""
+    count = min(count, len(users) * len(artworks))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.choice(users), rng.choice(artworks)))
+    return pairs
+
+
+def seed_data(volumes=None, seed=0, batch_size=1000):
+    """Create a reproducible synthetic catalog and return the volumes used"""
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    rng = random.Random(seed)
+    now = timezone.now()
+    # Every benchmark user shares one hash; hashing each would dominate seeding
+    password = make_password('benchmark')
+
+    User.objects.bulk_create([
+        User(username=f'bench-user-{i}', email=f'bench{i}@example.com',
+             password=password, is_artist=i % 4 != 0)
+        for i in range(volumes['users'])
+    ], batch_size=batch_size)
+    users = list(User.objects.filter(username__startswith='bench-user-').values_list('id', flat=True))
+    artists = list(User.objects.filter(username__startswith='bench-user-', is_artist=True)
+                   .values_list('id', flat=True)) or users
+
+    types = [code for code, _ in Gallery.GALLERY_TYPES]
+    Gallery.objects.bulk_create([
+        Gallery(name=f'Bench Gallery {i}', slug=f'bench-gallery-{i}', type=types[i % len(types)])
+        for i in range(volumes['galleries'])
+    ], batch_size=batch_size)
+    galleries = list(Gallery.objects.filter(slug__startswith='bench-gallery-').values_list('id', flat=True))
+
+    Artwork.objects.bulk_create([
+        Artwork(title=f'Bench Artwork {i}', slug=f'bench-artwork-{i}',
+                artist_id=rng.choice(artists), gallery_id=rng.choice(galleries),
+                image='artworks/bench.webp', description='Synthetic benchmark artwork',
+                status=rng.choice(['in-progress', 'completed']), views=rng.randint(0, 5000))
+        for i in range(volumes['artworks'])
+    ], batch_size=batch_size)
+    artworks = list(Artwork.objects.filter(slug__startswith='bench-artwork-').values_list('id', flat=True))
+
+    Like.objects.bulk_create([
+        Like(user_id=u, artwork_id=a) for u, a in _pairs(rng, users, artworks, volumes['likes'])
+    ], batch_size=batch_size)
+    ArtworkRating.objects.bulk_create([
+        ArtworkRating(user_id=u, artwork_id=a, value=rng.randint(1, 5))
+        for u, a in _pairs(rng, users, artworks, volumes['ratings'])
+    ], batch_size=batch_size)
+    Comment.objects.bulk_create([
+        Comment(user_id=rng.choice(users), artwork_id=rng.choice(artworks), content=f'Comment {i}')
+        for i in range(volumes['comments'])
+    ], batch_size=batch_size)
+    Comment.objects.filter(path='').update(path=Comment.root_path_expression())
+
+    events = []
+    for i in range(volumes['events']):
+        start = now + timedelta(days=rng.randint(-60, 60))
+        events.append(Event(
+            title=f'Bench Event {i}', slug=f'bench-event-{i}', description='Synthetic event',
+            location='Kigali', start_date=start, end_date=start + timedelta(days=rng.randint(1, 5)),
+            created_by_id=rng.choice(users), max_participants=rng.choice([0, 50, 500]),
+            categories=['bench'],
+        ))
+    Event.objects.bulk_create(events, batch_size=batch_size)
+    Participant = Event.participants.through
+    event_ids = list(Event.objects.filter(slug__startswith='bench-event-').values_list('id', flat=True))
+    Participant.objects.bulk_create([
+        Participant(event_id=e, user_id=u)
+        for u, e in _pairs(rng, users, event_ids, volumes['events'] * 10)
+    ], batch_size=batch_size)
+    for start in range(0, len(users), batch_size):
+        ArtistStats.refresh(users[start:start + batch_size])
+    return volumes
+
+
+def auth_header(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def count_queries(method, path, headers=None):
+    """Run one request and return (status_code, query count)"""
+    client = Client()
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(path, **(headers or {}))
+    return response.status_code, len(ctx.captured_queries)
+
+
+def run_load(method, path, requests=200, concurrency=8, headers=None):
+    """
+    Fire requests at path from concurrency client threads and
+    return latency percentiles (ms) and throughput.
+    """
+    def worker(n):
+        client = Client()
+        send = getattr(client, method)
+        timings, errors = [], 0
+        for _ in range(n):
+            started = time.perf_counter()
+            response = send(path, **(headers or {}))
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        connection.close()
+        return timings, errors
+
+    share = [requests // concurrency + (1 if i < requests % concurrency else 0)
+             for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, share))
+    elapsed = time.perf_counter() - started
+
+    timings = [t for chunk, _ in results for t in chunk]
+    return _summarize(timings, sum(errors for _, errors in results), elapsed)
+
+
+def _summarize(timings, errors, elapsed):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def run_async_load(path, requests=200, concurrency=8, headers=None):
+    """
+    Like run_load, but drives the ASGI handler from concurrency
+    coroutines on one event loop.
+    """
+    async def worker(client, n, timings):
+        errors = 0
+        for _ in range(n):
+            started = time.perf_counter()
+            response = await client.get(path, **(headers or {}))
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        return errors
+
+    async def main():
+        client = AsyncClient()
+        timings = []
+        share = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                 for i in range(concurrency)]
+        started = time.perf_counter()
+        errors = await asyncio.gather(*(worker(client, n, timings) for n in share))
+        return _summarize(timings, sum(errors), time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Return a list of human-readable regressions of results against
+    baseline. Latency may grow by tolerance; query counts may not grow.
+    """
+    regressions = []
+    for name, old in baseline.get('endpoints', {}).items():
+        new = results['endpoints'].get(name)
+        if new is None:
+            regressions.append(f'{name}: missing from results')
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append(f"{name}: queries {old['queries']} -> {new['queries']}")
+        for key in ('p95_ms', 'p99_ms'):
+            if old[key] and new[key] > old[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {old[key]} -> {new[key]}')
+    return regressions
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
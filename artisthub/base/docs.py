@@ -0,0 +1,66 @@
+"""
+OpenAPI schema and interactive docs.
+
+drf_spectacular is only imported when one of these views is first hit,
+so workers that never serve docs do not load it. With
+API_DOCS['SCHEMA_FILE'] set, /api/schema/ serves the file written by
+`manage.py build_schema` at deploy time instead of introspecting every
+serializer on the first request.
+"""
+import functools
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+DEFAULTS = {
+    # Serve Swagger UI and Redoc
+    'ENABLED': True,
+    # Precomputed schema (.json, .yaml or .yml); None generates it per process
+    'SCHEMA_FILE': None,
+}
+
+
+def docs_config():
+    return {**DEFAULTS, **getattr(settings, 'API_DOCS', {})}
+
+
+@functools.cache
+def spectacular_view(name, **initkwargs):
+    from drf_spectacular import views
+
+    return getattr(views, name).as_view(**initkwargs)
+
+
+@functools.cache
+def load_schema_file(path):
+    content = Path(path).read_bytes()
+    if Path(path).suffix == '.json':
+        content_type = 'application/vnd.oai.openapi+json'
+    else:
+        content_type = 'application/vnd.oai.openapi'
+    return content, content_type, f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def schema(request, *args, **kwargs):
+    """OpenAPI schema of the API"""
+    schema_file = docs_config()['SCHEMA_FILE']
+    if not schema_file:
+        return spectacular_view('SpectacularAPIView')(request, *args, **kwargs)
+    content, content_type, etag = load_schema_file(str(schema_file))
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+    response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
+
+
+def swagger_ui(request, *args, **kwargs):
+    """Swagger UI for the schema"""
+    return spectacular_view('SpectacularSwaggerView', url_name='schema')(request, *args, **kwargs)
+
+
+def redoc(request, *args, **kwargs):
+    """Redoc for the schema"""
+    return spectacular_view('SpectacularRedocView', url_name='schema')(request, *args, **kwargs)
@@ -0,0 +1,151 @@
+"""
+The following-feed: newest artworks from the artists a user follows.
+
+For a short follow list the feed is read directly. Each followed artist's
+newest artworks come from their own range scan on
+(artist, -created_at, -id), and heapq.merge interleaves the sorted runs,
+so a page costs one small indexed query per artist. A single
+artist__in query would instead sort every artwork by those artists.
+
+Users who follow more than MERGE_LIMIT artists get a precomputed inbox.
+Each new artwork is fanned out to their FeedItem rows once its
+transaction commits, and a page is one range scan on
+(owner, -created_at, -artwork). The inbox is seeded with the newest
+INBOX_BACKFILL artworks when a user crosses the limit, and when they
+follow another artist. It is dropped if they fall back under the limit.
+
+Pages are keyset-paginated on (created_at, id) with an opaque cursor.
+"""
+import heapq
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ArtistStats, Artwork, FeedItem, Follow
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Any of these can be overridden in settings.FEED
+DEFAULTS = {
+    # Largest follow list read by merging per-artist scans
+    'MERGE_LIMIT': 50,
+    'PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+    # Artworks copied into an inbox when it is built
+    'INBOX_BACKFILL': 200,
+    # Followers written per INSERT when fanning out a new artwork
+    'FANOUT_BATCH': 1000,
+}
+
+
+def feed_config():
+    return {**DEFAULTS, **getattr(settings, 'FEED', {})}
+
+
+def encode_cursor(created_at, artwork_id):
+    return f'{(created_at - EPOCH) // timedelta(microseconds=1)}_{artwork_id}'
+
+
+def decode_cursor(cursor):
+    """(created_at, artwork_id) from a cursor, or None if it is malformed"""
+    try:
+        micros, artwork_id = (int(part) for part in cursor.split('_'))
+        return EPOCH + timedelta(microseconds=micros), artwork_id
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def following_count(user_id):
+    return ArtistStats.objects.filter(artist_id=user_id).values_list('following_count', flat=True).first() or 0
+
+
+def has_inbox(count):
+    return count > feed_config()['MERGE_LIMIT']
+
+
+def before(queryset, cursor, id_field):
+    """Rows strictly after cursor in (-created_at, -id) order"""
+    if cursor is None:
+        return queryset
+    created_at, artwork_id = cursor
+    return queryset.filter(created_at__lte=created_at).exclude(
+        Q(created_at=created_at) & Q(**{f'{id_field}__gte': artwork_id})
+    )
+
+
+def merged_page(user_id, cursor, size):
+    """[(created_at, artwork_id)] of the next page, merged from per-artist scans"""
+    artist_ids = Follow.objects.filter(follower_id=user_id).values_list('followed_id', flat=True)
+    runs = [
+        before(Artwork.objects.filter(artist_id=artist_id), cursor, 'id')
+        .order_by('-created_at', '-id').values_list('created_at', 'id')[:size]
+        for artist_id in artist_ids
+    ]
+    return list(heapq.merge(*runs, reverse=True))[:size]
+
+
+def inbox_page(user_id, cursor, size):
+    """[(created_at, artwork_id)] of the next page from the user's inbox"""
+    items = before(FeedItem.objects.filter(owner_id=user_id), cursor, 'artwork_id')
+    return list(items.order_by('-created_at', '-artwork_id').values_list('created_at', 'artwork_id')[:size])
+
+
+def page(user_id, cursor, size):
+    if has_inbox(following_count(user_id)):
+        return inbox_page(user_id, cursor, size)
+    return merged_page(user_id, cursor, size)
+
+
+def fill_inbox(user_id, artworks):
+    """Copy the newest INBOX_BACKFILL of an Artwork queryset into an inbox"""
+    rows = [
+        FeedItem(owner_id=user_id, artwork_id=artwork_id, created_at=created_at)
+        for artwork_id, created_at in artworks.order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:feed_config()['INBOX_BACKFILL']]
+    ]
+    FeedItem.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def followed(follow):
+    """Update the follower's inbox after a new Follow is counted"""
+    count = following_count(follow.follower_id)
+    if not has_inbox(count):
+        return
+    if not has_inbox(count - 1):
+        # Just crossed the limit: build the inbox from every followed artist
+        fill_inbox(follow.follower_id, Artwork.objects.filter(artist__followers__follower_id=follow.follower_id))
+    else:
+        fill_inbox(follow.follower_id, Artwork.objects.filter(artist_id=follow.followed_id))
+
+
+def unfollowed(follow):
+    """Update the follower's inbox after a Follow is uncounted"""
+    inbox = FeedItem.objects.filter(owner_id=follow.follower_id)
+    if has_inbox(following_count(follow.follower_id)):
+        inbox = inbox.filter(artwork__artist_id=follow.followed_id)
+    inbox.delete()
+
+
+def fan_out(artwork_id, artist_id, created_at):
+    """Add a new artwork to the inbox of every follower who has one"""
+    followers = Follow.objects.filter(
+        followed_id=artist_id, follower__stats__following_count__gt=feed_config()['MERGE_LIMIT'],
+    ).order_by('follower_id').values_list('follower_id', flat=True)
+    batch_size = feed_config()['FANOUT_BATCH']
+    last_id = 0
+    while True:
+        batch = list(followers.filter(follower_id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        FeedItem.objects.bulk_create([
+            FeedItem(owner_id=owner_id, artwork_id=artwork_id, created_at=created_at)
+            for owner_id in batch
+        ], ignore_conflicts=True)
+
+
+def published(artwork):
+    """Fan a new artwork out once the transaction that created it commits"""
+    transaction.on_commit(lambda: fan_out(artwork.pk, artwork.artist_id, artwork.created_at))
@@ -0,0 +1,60 @@
+"""
+Password hashing off the event loop.
+
+PBKDF2 holds a core for hundreds of milliseconds. Async views hand it to
+a small dedicated pool, so a burst of signups or logins queues up here
+instead of stalling every other request on the worker. Logins run all of
+authenticate() there and then check the user as simplejwt's
+TokenObtainPairView does, so AUTHENTICATION_BACKENDS, user_login_failed,
+USER_AUTHENTICATION_RULE and UPDATE_LAST_LOGIN apply as they do there.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
+from django.db import close_old_connections
+# The module, since it replaces api_settings when SIMPLE_JWT changes
+from rest_framework_simplejwt import settings as jwt_settings
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+async def amake_password(password):
+    return await _run(make_password, password)
+
+
+def _login(request, credentials):
+    try:
+        # Sends user_login_failed on a mismatch, and rehashes outdated hashes
+        user = authenticate(request, **credentials)
+        if user is None or not jwt_settings.api_settings.USER_AUTHENTICATION_RULE(user):
+            return None
+        # Off by default: an UPDATE per login would also replace the user's
+        # base.authentication cache version
+        if jwt_settings.api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return user
+    finally:
+        # Pool threads are outside the request cycle that closes connections
+        close_old_connections()
+
+
+async def aauthenticate(request, **credentials):
+    """The user the credentials belong to if USER_AUTHENTICATION_RULE admits them, else None"""
+    return await _run(_login, request, credentials)
@@ -0,0 +1,118 @@
+"""
+iCalendar (RFC 5545) feeds of the events a user has joined.
+
+Calendar apps cannot send a bearer token, so each user's feed lives at a
+URL carrying a signed token instead. Tokens are signed with the user's
+calendar_secret as well, so rotating it revokes a leaked URL. The feed is written line by line
+while the events are read, and its ETag comes from a single aggregate
+over the joined events. A client polling an unchanged feed gets a 304
+without the feed being built.
+"""
+import datetime
+import hashlib
+
+from django.core import signing
+from django.db.models import Count, Max, Sum
+
+PRODID = '-//ArtistryHub//Events//EN'
+# Bump when the feed's layout changes so cached copies are refetched
+FORMAT_VERSION = 1
+SIGNING_SALT = 'base.ical.feed'
+
+
+def signer(secret):
+    return signing.Signer(salt=f'{SIGNING_SALT}:{secret}')
+
+
+def feed_token(user):
+    return signer(user.calendar_secret).sign(str(user.pk))
+
+
+def claimed_user_id(token):
+    """
+    User ID a feed token names, not yet verified; raises ValueError if
+    malformed. Look up the user's calendar_secret for check_token().
+    """
+    return int(token.split(signing.Signer().sep, 1)[0])
+
+
+def check_token(token, secret):
+    """Raises signing.BadSignature unless token was signed with secret"""
+    signer(secret).unsign(token)
+
+
+FEED_AGGREGATES = {
+    'count': Count('id'),
+    # Changes when one joined event is swapped for another
+    'id_sum': Sum('id'),
+    'updated': Max('updated_at'),
+}
+
+
+def feed_etag(user_id, aggregates):
+    """ETag for a feed, from the FEED_AGGREGATES of its events"""
+    updated = aggregates['updated'].isoformat() if aggregates['updated'] else ''
+    key = f"{FORMAT_VERSION}:{user_id}:{aggregates['count']}:{aggregates['id_sum']}:{updated}"
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
+
+def escape(text):
+    return (
+        text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF + space"""
+    encoded = line.encode()
+    pieces = []
+    while len(encoded) > 75:
+        cut = 75 if not pieces else 74
+        # Do not split a multi-byte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut])
+        encoded = encoded[cut:]
+    pieces.append(encoded)
+    return b'\r\n '.join(pieces) + b'\r\n'
+
+
+def timestamp(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_lines(event, url=None):
+    yield 'BEGIN:VEVENT'
+    yield f'UID:event-{event.pk}@artisthub'
+    yield f'DTSTAMP:{timestamp(event.updated_at)}'
+    yield f'DTSTART:{timestamp(event.start_date)}'
+    yield f'DTEND:{timestamp(event.end_date)}'
+    yield f'SUMMARY:{escape(event.title)}'
+    if event.location:
+        yield f'LOCATION:{escape(event.location)}'
+    if event.description:
+        yield f'DESCRIPTION:{escape(event.description)}'
+    if url:
+        yield f'URL:{url}'
+    yield 'END:VEVENT'
+
+
+def header_lines(name):
+    yield 'BEGIN:VCALENDAR'
+    yield 'VERSION:2.0'
+    yield f'PRODID:{PRODID}'
+    yield 'CALSCALE:GREGORIAN'
+    yield f'X-WR-CALNAME:{escape(name)}'
+
+
+async def feed(name, events, url_for=None):
+    """
+    Stream a calendar of events (an async iterable) as encoded, folded
+    content lines
+    """
+    yield b''.join(fold(line) for line in header_lines(name))
+    async for event in events:
+        url = url_for(event) if url_for else None
+        yield b''.join(fold(line) for line in event_lines(event, url))
+    yield fold('END:VCALENDAR')
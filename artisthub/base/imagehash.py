@@ -0,0 +1,78 @@
+"""
+Perceptual hashes for spotting re-uploaded artworks.
+
+dHash shrinks an image to 9x8 greyscale and records whether each pixel is
+brighter than its right-hand neighbour. Re-encoding, resizing and small
+edits flip only a few of the 64 bits, so near-duplicates are hashes a
+small Hamming distance apart.
+
+Lookups use multi-index hashing: the hash is cut into four 16-bit bands
+stored in indexed columns. Two hashes at most three bits apart must agree
+exactly on at least one band, so the candidates are the union of four
+index lookups, which are then checked bit by bit.
+"""
+from django.db.models import Q
+
+from .models import ArtworkImageHash
+
+BANDS = 4
+BAND_BITS = 16
+# The largest distance the band lookup is guaranteed to find
+MAX_DISTANCE = BANDS - 1
+
+
+def dhash(fp):
+    """64-bit difference hash of an image file, as an unsigned int"""
+    # Imported here so workers that never hash an upload do not load them
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(fp) as img:
+        # Lets the JPEG decoder scale down while decoding
+        img.draft('L', (64, 64))
+        small = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+        pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def bands(value):
+    return [
+        (value >> (BAND_BITS * (BANDS - 1 - i))) & ((1 << BAND_BITS) - 1)
+        for i in range(BANDS)
+    ]
+
+
+def to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hash_row(artwork_id, value):
+    band0, band1, band2, band3 = bands(value)
+    return ArtworkImageHash(
+        artwork_id=artwork_id, hash=to_signed(value),
+        band0=band0, band1=band1, band2=band2, band3=band3,
+    )
+
+
+def find_duplicates(value, max_distance=MAX_DISTANCE, exclude=None):
+    """
+    Artwork IDs whose image hash is within max_distance bits of value,
+    as a list of (artwork_id, distance) sorted closest first.
+    """
+    query = Q()
+    for i, band in enumerate(bands(value)):
+        query |= Q(**{f'band{i}': band})
+    candidates = ArtworkImageHash.objects.filter(query)
+    if exclude is not None:
+        candidates = candidates.exclude(artwork_id=exclude)
+    matches = []
+    for artwork_id, other in candidates.values_list('artwork_id', 'hash'):
+        distance = (value ^ to_unsigned(other)).bit_count()
+        if distance <= max_distance:
+            matches.append((artwork_id, distance))
+    return sorted(matches, key=lambda match: match[1])
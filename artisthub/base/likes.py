@@ -0,0 +1,94 @@
+"""
+Idempotent like and unlike.
+
+PUT /api/artworks/{slug}/like/ and DELETE on the same URL each change
+the like in a single statement that also resolves the artwork from its
+slug: an INSERT ... SELECT that skips an existing like, or a DELETE
+whose artwork comes from a subquery. Repeating either is harmless and
+reports the same count, so clients can retry freely, and neither needs
+the artwork loaded first. The statement's row count says whether
+anything changed; only then are the artist's totals and the
+notification updated, since the Like signals are bypassed.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from .models import ArtistStats, Artwork, Like
+from .notifications import notify
+
+
+def _names():
+    quote = connection.ops.quote_name
+    return {
+        'like': quote(Like._meta.db_table),
+        'artwork': quote(Artwork._meta.db_table),
+    }
+
+
+def _insert_sql():
+    if connection.vendor == 'mysql':
+        return (
+            'INSERT IGNORE INTO {like} (user_id, artwork_id, created_at) '
+            'SELECT %s, id, %s FROM {artwork} WHERE slug = %s AND deleted_at IS NULL'
+        )
+    return (
+        'INSERT INTO {like} (user_id, artwork_id, created_at) '
+        'SELECT %s, id, %s FROM {artwork} WHERE slug = %s AND deleted_at IS NULL '
+        'ON CONFLICT (user_id, artwork_id) DO NOTHING'
+    )
+
+
+DELETE_SQL = (
+    'DELETE FROM {like} WHERE user_id = %s AND artwork_id = '
+    '(SELECT id FROM {artwork} WHERE slug = %s AND deleted_at IS NULL)'
+)
+
+# The artwork and its like count after the write, read in the same transaction
+ARTWORK_SQL = (
+    'SELECT a.id, a.artist_id, a.title, '
+    '(SELECT COUNT(*) FROM {like} l WHERE l.artwork_id = a.id) '
+    'FROM {artwork} a WHERE a.slug = %s AND a.deleted_at IS NULL'
+)
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**_names()), params)
+        return cursor.rowcount
+
+
+def _artwork(slug):
+    with connection.cursor() as cursor:
+        cursor.execute(ARTWORK_SQL.format(**_names()), [slug])
+        return cursor.fetchone()
+
+
+def like(user, slug):
+    """
+    Make sure user likes the artwork. Returns (created, likes_count), or
+    None if there is no such artwork. Run it inside a transaction.
+    """
+    created = _execute(_insert_sql(), [user.pk, connection.ops.adapt_datetimefield_value(timezone.now()), slug]) == 1
+    row = _artwork(slug)
+    if row is None:
+        return None
+    artwork_id, artist_id, title, count = row
+    if created:
+        ArtistStats.apply(artist_id, total_likes=1)
+        notify(artist_id, user, 'like', artwork={'id': artwork_id, 'slug': slug, 'title': title})
+    return created, count
+
+
+def unlike(user, slug):
+    """
+    Make sure user does not like the artwork. Returns (deleted,
+    likes_count), or None if there is no such artwork.
+    """
+    deleted = _execute(DELETE_SQL, [user.pk, slug]) == 1
+    row = _artwork(slug)
+    if row is None:
+        return None
+    _, artist_id, _, count = row
+    if deleted:
+        ArtistStats.apply(artist_id, total_likes=-1)
+    return deleted, count
@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from base import placeholders
+
+
+class Command(BaseCommand):
+    help = (
+        'Store dimensions and blurhash placeholders for images uploaded before '
+        'they were computed at upload, or imported with import_catalog.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models',
+                            choices=placeholders.IMAGE_FIELDS,
+                            help='Limit to these models (default: all)')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads decoding images in parallel')
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute images that already have metadata')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for label in options['models'] or placeholders.IMAGE_FIELDS:
+                self.backfill(pool, apps.get_model(label), placeholders.IMAGE_FIELDS[label], options)
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.2f}s'))
+
+    def backfill(self, pool, model, field_name, options):
+        columns = [f'{field_name}_{suffix}' for suffix in ('width', 'height', 'blurhash')]
+        pending = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if not options['all']:
+            pending = pending.filter(**{f'{field_name}_blurhash': ''})
+        pending = pending.only('pk', field_name, *columns).order_by('pk')
+
+        updated = failed = 0
+        last_pk = None
+        while True:
+            # Keyset pagination keeps each batch an indexed range scan
+            batch_query = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            batch = list(batch_query[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            readable = list(pool.map(lambda instance: placeholders.update_metadata(instance, field_name), batch))
+            done = [instance for instance, ok in zip(batch, readable) if ok]
+            failed += len(batch) - len(done)
+            model.objects.bulk_update(done, columns)
+            updated += len(done)
+
+        self.stdout.write(
+            f'{model._meta.label}: {updated} images measured, {failed} missing or unreadable'
+        )
@@ -0,0 +1,111 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from base import benchmark
+from base.models import User, Gallery, Artwork, Event
+
+# (name, method, url name, url kwargs factory, needs auth)
+ENDPOINTS = [
+    ('artwork-list', 'get', 'artwork-list', None, False),
+    ('artwork-detail', 'get', 'artwork-detail', lambda c: {'slug': c['artwork']}, False),
+    ('artwork-comments', 'get', 'artwork-comments', lambda c: {'slug': c['artwork']}, True),
+    ('artwork-like', 'post', 'artwork-like', lambda c: {'slug': c['artwork']}, True),
+    ('gallery-list', 'get', 'gallery-list', None, False),
+    ('gallery-artworks', 'get', 'gallery-artworks', lambda c: {'slug': c['gallery']}, True),
+    ('event-list', 'get', 'event-list', None, False),
+    ('event-detail', 'get', 'event-detail', lambda c: {'slug': c['event']}, False),
+    ('user-artists', 'get', 'user-artists', None, True),
+    ('user-me', 'get', 'user-me', None, True),
+    ('dashboard-stats', 'get', 'dashboard-stats', None, True),
+    ('dashboard-activities', 'get', 'dashboard-activities', None, True),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with synthetic data, drive the API '
+        'routes with concurrent clients and report latency, throughput and '
+        'query counts per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run the named endpoint (repeatable)')
+        parser.add_argument('--output', help='Write JSON results to this file')
+        parser.add_argument('--baseline', help='Fail if results regress against this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative latency growth against the baseline')
+
+    def handle(self, *args, **options):
+        with benchmark.benchmark_database():
+            results = self.run(options)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output)
+        self.report(results)
+
+        if options['baseline']:
+            baseline = benchmark.load_results(options['baseline'])
+            if options['endpoints']:
+                baseline['endpoints'] = {
+                    name: row for name, row in baseline['endpoints'].items()
+                    if name in options['endpoints']
+                }
+            regressions = benchmark.compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def run(self, options):
+        volumes = benchmark.seed_data(
+            {name: options[name] for name in benchmark.DEFAULT_VOLUMES}, seed=options['seed']
+        )
+        user = User.objects.filter(username__startswith='bench-user-', is_artist=True).first()
+        context = {
+            'artwork': Artwork.objects.filter(artist=user).values_list('slug', flat=True).first()
+                       or Artwork.objects.values_list('slug', flat=True).first(),
+            'gallery': Gallery.objects.values_list('slug', flat=True).first(),
+            'event': Event.objects.values_list('slug', flat=True).first(),
+        }
+        headers = benchmark.auth_header(user)
+
+        endpoints = {}
+        for name, method, url_name, kwargs, needs_auth in ENDPOINTS:
+            if options['endpoints'] and name not in options['endpoints']:
+                continue
+            path = reverse(url_name, kwargs=kwargs(context) if kwargs else None)
+            request_headers = headers if needs_auth else None
+            status_code, queries = benchmark.count_queries(method, path, request_headers)
+            if status_code >= 400:
+                raise CommandError(f'{name} returned {status_code} for {path}')
+            stats = benchmark.run_load(
+                method, path, options['requests'], options['concurrency'], request_headers
+            )
+            endpoints[name] = {'path': path, 'queries': queries, **stats}
+
+        return {
+            'volumes': volumes,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f"{'endpoint':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}"
+        )
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<22}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                f"{row['rps']:>10}{row['queries']:>9}{row['errors']:>8}"
+            )
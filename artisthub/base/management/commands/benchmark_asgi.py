@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from base import benchmark
+from base.models import Artwork
+
+# (name, sync DRF route, async route, url kwargs factory)
+ROUTES = [
+    ('artwork-list', 'artwork-list', 'public-artwork-list', None),
+    ('artwork-detail', 'artwork-detail', 'public-artwork-detail', lambda c: {'slug': c['artwork']}),
+    ('event-list', 'event-list', 'public-event-list', None),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync DRF catalog reads served through the WSGI handler '
+        'with the native async views served through the ASGI handler, at the '
+        'same number of concurrent clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artworks', type=int, default=200)
+        parser.add_argument('--events', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per route and handler')
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        volumes = {
+            'artworks': options['artworks'], 'events': options['events'],
+            'likes': options['artworks'] * 5, 'comments': options['artworks'] * 2,
+            'ratings': options['artworks'] * 3,
+        }
+        results = {}
+        with benchmark.benchmark_database():
+            benchmark.seed_data(volumes)
+            context = {'artwork': Artwork.objects.values_list('slug', flat=True).first()}
+            for name, sync_route, async_route, kwargs in ROUTES:
+                kwargs = kwargs(context) if kwargs else None
+                results[name] = {
+                    'wsgi': benchmark.run_load(
+                        'get', reverse(sync_route, kwargs=kwargs),
+                        options['requests'], options['concurrency'],
+                    ),
+                    'asgi': benchmark.run_async_load(
+                        reverse(async_route, kwargs=kwargs),
+                        options['requests'], options['concurrency'],
+                    ),
+                }
+
+        self.stdout.write(f"{'route':<16}{'handler':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, handlers in results.items():
+            for handler, row in handlers.items():
+                self.stdout.write(
+                    f"{name:<16}{handler:<8}{row['rps']:>10}{row['p50_ms']:>10}"
+                    f"{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
@@ -0,0 +1,106 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from base import benchmark
+from base.models import ArtistStats, Artwork, Gallery, Like, User
+
+# (phase, method, likes expected on the hot artwork afterwards)
+PHASES = [
+    ('put', 'put', 'users'),
+    ('put-retry', 'put', 'users'),
+    ('delete', 'delete', 0),
+    ('delete-retry', 'delete', 0),
+    ('post-toggle-on', 'post', 'users'),
+    ('post-toggle-off', 'post', 0),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure like/unlike throughput while many users hit one hot artwork '
+        'at once: idempotent PUT and DELETE, their retries, and the POST '
+        'toggle. Checks the like count and the artist totals after each phase.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        with benchmark.benchmark_database():
+            results = self.run(options['users'], options['concurrency'])
+
+        self.stdout.write(f"{'phase':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+        for name, row in results['phases'].items():
+            self.stdout.write(
+                f"{name:<18}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+                f"{row['rps']:>10}{row['errors']:>8}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def run(self, users, concurrency):
+        password = make_password(None)
+        artist = User.objects.create(username='bench-artist', email='artist@example.com', is_artist=True)
+        likers = User.objects.bulk_create([
+            User(username=f'bench-liker-{i}', email=f'liker{i}@example.com', password=password)
+            for i in range(users)
+        ])
+        gallery = Gallery.objects.create(name='Bench', slug='bench', type='PAINTING')
+        artwork = Artwork.objects.create(
+            title='Hot', slug='hot', artist=artist, gallery=gallery, image='artworks/hot.jpg',
+        )
+        path = reverse('artwork-like', kwargs={'slug': artwork.slug})
+        headers = [benchmark.auth_header(user) for user in likers]
+
+        phases = {}
+        for name, method, expected in PHASES:
+            phases[name] = self.burst(method, path, headers, concurrency)
+            expected = users if expected == 'users' else expected
+            likes = Like.objects.filter(artwork=artwork).count()
+            total = ArtistStats.objects.get(artist=artist).total_likes
+            if likes != expected or total != expected:
+                raise CommandError(
+                    f'After {name}: {likes} likes and total_likes {total}, expected {expected}'
+                )
+        return {'users': users, 'concurrency': concurrency, 'phases': phases}
+
+    def burst(self, method, path, headers, concurrency):
+        """One request per user, spread over concurrency client threads"""
+        def worker(chunk):
+            client = Client()
+            send = getattr(client, method)
+            timings, errors = [], 0
+            for header in chunk:
+                started = time.perf_counter()
+                response = send(path, **header)
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+            connection.close()
+            return timings, errors
+
+        chunks = [headers[i::concurrency] for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(worker, chunks))
+        elapsed = time.perf_counter() - started
+
+        timings = [t for chunk, _ in results for t in chunk]
+        return {
+            'requests': len(timings),
+            'errors': sum(errors for _, errors in results),
+            'p50_ms': round(benchmark.percentile(timings, 50), 3),
+            'p95_ms': round(benchmark.percentile(timings, 95), 3),
+            'p99_ms': round(benchmark.percentile(timings, 99), 3),
+            'rps': round(len(timings) / elapsed, 1),
+        }
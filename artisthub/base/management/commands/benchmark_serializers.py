@@ -0,0 +1,104 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from base import benchmark
+from base.models import Artwork, Comment, Event, Gallery, Like, User
+from base.renderers import FastJSONRenderer
+from base.rowserializers import ArtworkRows, EventRows, GalleryRows
+from base.serializers import ArtworkSerializer, EventSerializer, GallerySerializer
+from base.views import filter_events_by_status
+
+
+def artworks():
+    # With every relation prefetched, as the DRF list was served
+    return Artwork.objects.select_related('artist', 'gallery').prefetch_related(
+        Prefetch('likes', queryset=Like.objects.only('id', 'artwork_id')),
+        Prefetch('comments', queryset=Comment.objects.select_related('user')),
+    )
+
+
+def events():
+    return filter_events_by_status(
+        Event.objects.select_related('created_by').prefetch_related(
+            Prefetch('participants', queryset=User.objects.only('id')),
+        ), None,
+    )
+
+
+# (name, DRF serializer, row serializer, queryset factory)
+CASES = [
+    ('artworks', ArtworkSerializer, ArtworkRows, artworks),
+    ('events', EventSerializer, EventRows, events),
+    ('galleries', GallerySerializer, GalleryRows, Gallery.objects.all),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and measure serialized rows/sec for '
+        'the artwork, event and gallery lists: DRF serializers against the '
+        'row serializers, and JSONRenderer against FastJSONRenderer. Times '
+        'include the queries each path runs; the best of --repeat runs counts.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        with benchmark.benchmark_database():
+            benchmark.seed_data(
+                {name: options[name] for name in benchmark.DEFAULT_VOLUMES}, seed=options['seed']
+            )
+            results = {name: self.measure(*case, options['repeat']) for name, *case in CASES}
+
+        self.stdout.write(
+            f"{'list':<12}{'rows':>7}{'DRF rows/s':>14}{'row rows/s':>14}"
+            f"{'render rows/s':>15}{'fast render rows/s':>20}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<12}{row['rows']:>7}{row['drf_rows_per_sec']:>14}{row['row_rows_per_sec']:>14}"
+                f"{row['render_rows_per_sec']:>15}{row['fast_render_rows_per_sec']:>20}"
+            )
+            if not row['identical']:
+                self.stdout.write(self.style.ERROR(f'{name}: the two paths rendered different bytes'))
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def measure(self, serializer_class, rows_class, queryset, repeat):
+        request = Request(APIRequestFactory().get('/'))
+
+        def best(func):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - started)
+            return min(timings), result
+
+        drf_seconds, data = best(
+            lambda: serializer_class(queryset(), many=True, context={'request': request}).data
+        )
+        row_seconds, rows = best(lambda: rows_class(request).serialize(queryset()))
+        render_seconds, rendered = best(lambda: JSONRenderer().render(data))
+        fast_seconds, fast_rendered = best(lambda: FastJSONRenderer().render(rows))
+        count = len(rows)
+        return {
+            'rows': count,
+            'identical': rendered == fast_rendered,
+            'drf_rows_per_sec': round(count / drf_seconds),
+            'row_rows_per_sec': round(count / row_seconds),
+            'render_rows_per_sec': round(count / render_seconds),
+            'fast_render_rows_per_sec': round(count / fast_seconds),
+        }
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.urls import reverse
+
+from base import benchmark, hashing
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure signups/sec for one worker process through the async register '
+        'view, and the latency of a cheap read issued during the burst.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        with benchmark.benchmark_database():
+            results = asyncio.run(self.burst(options['signups'], options['concurrency']))
+        results['hashing_workers'] = hashing.get_executor()._max_workers
+        results['hasher'] = settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]
+
+        self.stdout.write(
+            f"{results['signups']} signups ({results['errors']} errors) with "
+            f"{results['hashing_workers']} hashing threads: "
+            f"{results['signups_per_sec']} signups/sec, p95 {results['signup_p95_ms']} ms"
+        )
+        self.stdout.write(
+            f"Concurrent reads: {results['probe_requests']} requests, "
+            f"p50 {results['probe_p50_ms']} ms, p99 {results['probe_p99_ms']} ms"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    async def burst(self, signups, concurrency):
+        client = AsyncClient()
+        register_url = reverse('register')
+        probe_url = reverse('public-event-list')
+        queue = asyncio.Queue()
+        for i in range(signups):
+            queue.put_nowait(i)
+        signup_timings, probe_timings, errors = [], [], 0
+        done = asyncio.Event()
+
+        async def signup_worker():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                payload = json.dumps({
+                    'username': f'signup-{i}', 'email': f'signup{i}@example.com',
+                    'password': 'benchmark-password',
+                })
+                started = time.perf_counter()
+                response = await client.post(register_url, payload, content_type='application/json')
+                signup_timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 201:
+                    errors += 1
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get(probe_url)
+                probe_timings.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(signup_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+        return {
+            'signups': len(signup_timings),
+            'errors': errors,
+            'signups_per_sec': round(len(signup_timings) / elapsed, 1),
+            'signup_p95_ms': round(benchmark.percentile(signup_timings, 95), 1),
+            'probe_requests': len(probe_timings),
+            'probe_p50_ms': round(benchmark.percentile(probe_timings, 50), 1),
+            'probe_p99_ms': round(benchmark.percentile(probe_timings, 99), 1),
+        }
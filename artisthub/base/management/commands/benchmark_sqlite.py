@@ -0,0 +1,163 @@
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from base import benchmark
+from base.models import Artwork, Like, User
+from base.writequeue import write_queue
+
+PROFILES = {
+    # Django's stock SQLite backend: rollback journal, deferred transactions,
+    # every request thread writing for itself
+    'stock': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'OPTIONS': {},
+        'CONN_MAX_AGE': 0,
+        'WRITE_QUEUE': False,
+    },
+    # The production profile from settings.py plus the single-writer queue
+    'tuned': {
+        'ENGINE': 'base.db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 20000},
+        },
+        'CONN_MAX_AGE': 600,
+        'WRITE_QUEUE': True,
+    },
+}
+
+
+def use_database(path, profile):
+    """Point the default alias at path with the given profile"""
+    connections.close_all()
+    config = connections.settings['default']
+    config.update({
+        'NAME': path, 'ENGINE': profile['ENGINE'],
+        'OPTIONS': profile['OPTIONS'], 'CONN_MAX_AGE': profile['CONN_MAX_AGE'],
+    })
+    del connections['default']
+    settings.WRITE_QUEUE = {**getattr(settings, 'WRITE_QUEUE', {}), 'ENABLED': profile['WRITE_QUEUE']}
+
+
+def toggle_like(user_id, artwork_id):
+    # Same writes as ArtworkViewSet.like
+    like, created = Like.objects.get_or_create(user_id=user_id, artwork_id=artwork_id)
+    if not created:
+        like.delete()
+
+
+def worker(seed, operations, threads, users, artworks, results):
+    """One simulated server process: threads issuing likes mixed with reads"""
+    rng = random.Random(seed)
+
+    def client(n):
+        timings, errors = [], 0
+        for _ in range(n):
+            user_id, artwork_id = rng.choice(users), rng.choice(artworks)
+            started = time.perf_counter()
+            try:
+                if rng.random() < 0.5:
+                    write_queue.run(lambda: toggle_like(user_id, artwork_id))
+                else:
+                    Like.objects.filter(artwork_id=artwork_id).count()
+            except OperationalError:
+                errors += 1
+            timings.append((time.perf_counter() - started) * 1000)
+        connections.close_all()
+        return timings, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        chunks = list(pool.map(client, [operations // threads] * threads))
+    results.put(([t for timings, _ in chunks for t in timings], sum(e for _, e in chunks)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Multi-process contention benchmark of hot like toggles and reads on '
+        'the stock SQLite backend versus the tuned profile with the write queue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Request threads per process')
+        parser.add_argument('--operations', type=int, default=400,
+                            help='Operations per process')
+        parser.add_argument('--hot-artworks', type=int, default=5)
+        parser.add_argument('--profile', action='append', choices=PROFILES, dest='profiles')
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        original = dict(connections.settings['default'])
+        original_queue = getattr(settings, 'WRITE_QUEUE', {})
+        results = {}
+        try:
+            for name in options['profiles'] or PROFILES:
+                results[name] = self.run_profile(PROFILES[name], options)
+        finally:
+            connections.close_all()
+            connections.settings['default'].update(original)
+            del connections['default']
+            settings.WRITE_QUEUE = original_queue
+
+        self.stdout.write(f"{'profile':<8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<8}{row['ops_per_sec']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['errors']:>8}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def run_profile(self, profile, options):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        try:
+            use_database(path, profile)
+            call_command('migrate', verbosity=0, interactive=False)
+            benchmark.seed_data({
+                'users': 100, 'artworks': options['hot_artworks'], 'likes': 0,
+                'comments': 0, 'ratings': 0, 'events': 0,
+            })
+            users = list(User.objects.values_list('id', flat=True))
+            artworks = list(Artwork.objects.values_list('id', flat=True))
+            connections.close_all()
+
+            context = multiprocessing.get_context('fork')
+            queue = context.Queue()
+            processes = [
+                context.Process(target=worker, args=(
+                    seed, options['operations'], options['threads'], users, artworks, queue
+                ))
+                for seed in range(options['processes'])
+            ]
+            started = time.perf_counter()
+            for process in processes:
+                process.start()
+            collected = [queue.get() for _ in processes]
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.join()
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        timings = [t for chunk, _ in collected for t in chunk]
+        return {
+            'operations': len(timings),
+            'errors': sum(errors for _, errors in collected),
+            'ops_per_sec': round(len(timings) / elapsed, 1),
+            'p50_ms': round(benchmark.percentile(timings, 50), 2),
+            'p99_ms': round(benchmark.percentile(timings, 99), 2),
+        }
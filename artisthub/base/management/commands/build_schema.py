@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base.docs import docs_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI schema to a file at build or deploy time, for "
+        "API_DOCS['SCHEMA_FILE'] to serve without generating it at runtime."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Output path (default: API_DOCS['SCHEMA_FILE'])")
+
+    def handle(self, *args, **options):
+        from drf_spectacular.generators import SchemaGenerator
+        from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+
+        path = options['file'] or docs_config()['SCHEMA_FILE']
+        if not path:
+            raise CommandError("Pass --file or set API_DOCS['SCHEMA_FILE']")
+        path = Path(path)
+        renderer = OpenApiJsonRenderer() if path.suffix == '.json' else OpenApiYamlRenderer()
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        path.write_bytes(renderer.render(schema, renderer_context={}))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
@@ -0,0 +1,363 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from django.contrib.auth.hashers import identify_hasher
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from base import feed
+from base.models import ArtistStats, User, Gallery, Artwork, Event, Follow, JobCheckpoint
+
+# Rows are flushed in this order so foreign keys always point at rows
+# that already exist in the database
+MODELS = ('user', 'gallery', 'artwork', 'event')
+
+
+def unique_slug(value, taken):
+    """Return a slug for value that is not in taken, and reserve it"""
+    base = slugify(value) or 'item'
+    slug = base
+    counter = 1
+    while slug in taken:
+        slug = f"{base}-{counter}"
+        counter += 1
+    taken.add(slug)
+    return slug
+
+
+def to_bool(value, default=False):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def to_json(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def to_datetime(value):
+    if not value:
+        raise ValueError('missing date')
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'invalid date {value!r}')
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users, galleries, artworks and events from NDJSON or CSV. '
+        'NDJSON records carry a "model" key; CSV files need --model. Each '
+        'batch commits together with a checkpoint, so re-running an '
+        'interrupted import resumes after the last committed batch. Rows '
+        'are bulk inserted without their save signals; the artist totals '
+        'and feeds they affect are updated per batch, and image metadata '
+        'is left to backfill_image_metadata and index_image_hashes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='NDJSON or CSV files to import')
+        parser.add_argument('--model', choices=MODELS,
+                            help='Record type for CSV input')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads used to copy image files')
+        parser.add_argument('--media-source', default='.',
+                            help='Directory image paths in the input are relative to')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint name (defaults to the absolute path of the input)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any existing checkpoint')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.media_source = Path(options['media_source'])
+        self.pool = ThreadPoolExecutor(max_workers=options['workers'])
+        self.load_maps()
+        self.images = 0
+
+        total = 0
+        started = time.monotonic()
+        try:
+            for path in options['paths']:
+                if not os.path.exists(path):
+                    raise CommandError(f'{path} does not exist')
+                checkpoint = self.checkpoint_name(options['checkpoint'] or os.path.abspath(path))
+                if options['restart']:
+                    JobCheckpoint.objects.filter(name=checkpoint).delete()
+                total += self.import_file(path, options['model'], checkpoint)
+        finally:
+            self.pool.shutdown()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/sec)'
+        ))
+        if self.images:
+            self.stdout.write(
+                f'Copied {self.images} images without their dimensions, placeholders or duplicate '
+                'hashes; run `manage.py backfill_image_metadata` and `manage.py index_image_hashes`'
+            )
+
+    def checkpoint_name(self, key):
+        name = f'import_catalog:{key}'
+        if len(name) > JobCheckpoint._meta.get_field('name').max_length:
+            name = f'import_catalog:{hashlib.sha1(key.encode()).hexdigest()}'
+        return name
+
+    def load_maps(self):
+        """Load natural keys once so lookups never hit the database per row"""
+        # Soft-deleted rows still hold their usernames and slugs
+        self.user_ids = dict(User.all_objects.values_list('username', 'id'))
+        self.gallery_ids = dict(Gallery.objects.values_list('slug', 'id'))
+        # Usernames and slugs in use, including those this run assigns
+        self.taken = {
+            User: set(self.user_ids),
+            Gallery: set(self.gallery_ids),
+            Artwork: set(Artwork.all_objects.values_list('slug', flat=True)),
+            Event: set(Event.all_objects.values_list('slug', flat=True)),
+        }
+        # Those in the database before the run: rows naming one are skipped
+        # as imported before, rows repeating one from this run are rejected
+        self.existing = {model: set(keys) for model, keys in self.taken.items()}
+
+    def read_records(self, path, model):
+        if path.endswith('.csv'):
+            if not model:
+                raise CommandError('--model is required for CSV input')
+            with open(path, newline='', encoding='utf-8') as fh:
+                for row in csv.DictReader(fh):
+                    yield model, row
+        else:
+            with open(path, encoding='utf-8') as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    yield record.pop('model', model), record
+
+    def import_file(self, path, model, checkpoint):
+        done = JobCheckpoint.objects.filter(name=checkpoint).values_list('position', flat=True).first()
+        if done:
+            self.stdout.write(f'Resuming {path} after row {done}')
+        done = done or 0
+
+        pending = {name: [] for name in MODELS}
+        count = 0
+        position = 0
+        started = time.monotonic()
+        for position, (kind, record) in enumerate(self.read_records(path, model), 1):
+            if position <= done:
+                continue
+            if kind not in pending:
+                raise CommandError(f'Row {position}: unknown model {kind!r}')
+            pending[kind].append((position, record))
+            count += 1
+            if count % self.batch_size == 0:
+                self.flush(pending, position, checkpoint)
+                elapsed = max(time.monotonic() - started, 1e-6)
+                self.stdout.write(f'{path}: {count} rows ({count / elapsed:.0f} rows/sec)')
+        self.flush(pending, position, checkpoint)
+        return count
+
+    def flush(self, pending, position, checkpoint):
+        """
+        Write every buffered row and how far the input got in one
+        transaction, so a resumed run never writes a batch twice
+        """
+        self.copied = []
+        # Users whose ArtistStats the batch changed
+        self.artist_ids = set()
+        try:
+            with transaction.atomic():
+                self.create_users(pending['user'])
+                self.create_galleries(pending['gallery'])
+                self.create_artworks(pending['artwork'])
+                self.create_events(pending['event'])
+                # bulk_create skips the signals that keep these rows current
+                ArtistStats.refresh(self.artist_ids)
+                JobCheckpoint.objects.update_or_create(
+                    name=checkpoint, defaults={'position': position, 'last_run_at': timezone.now()},
+                )
+        except BaseException:
+            # No row refers to the files copied for the rolled back batch
+            for name in self.copied:
+                default_storage.delete(name)
+            raise
+        self.images += len(self.copied)
+        for rows in pending.values():
+            rows.clear()
+
+    def copy_images(self, model, field_name, rows):
+        """Copy the image files of a batch into storage in parallel"""
+        field = model._meta.get_field(field_name)
+
+        def copy(source):
+            if not source:
+                return ''
+            with open(self.media_source / source, 'rb') as fh:
+                name = field.generate_filename(None, os.path.basename(source))
+                name = default_storage.save(name, File(fh))
+            self.copied.append(name)
+            return name
+
+        futures = [self.pool.submit(copy, record.get(field_name)) for _, record in rows]
+        # Every copy has finished or failed before an error is raised, so
+        # flush() knows all the files to remove
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def new_rows(self, model, rows, field, label):
+        """
+        The rows to create: those whose username or slug is not in the
+        database already. A row repeating one from earlier in this run
+        would fail the unique constraint, and is reported instead.
+        """
+        taken, existing = self.taken[model], self.existing[model]
+        fresh = []
+        for pos, record in rows:
+            key = record.get(field)
+            if key in existing:
+                continue
+            if key:
+                if key in taken:
+                    raise CommandError(f'Row {pos}: duplicate {label} {key!r}')
+                taken.add(key)
+            fresh.append((pos, record))
+        return fresh
+
+    def create_users(self, rows):
+        for pos, record in rows:
+            if not record.get('username'):
+                raise CommandError(f'Row {pos}: missing username')
+        rows = self.new_rows(User, rows, 'username', 'username')
+        if not rows:
+            return
+        pictures = self.copy_images(User, 'profile_picture', rows)
+        users = []
+        for (_, record), picture in zip(rows, pictures):
+            user = User(
+                username=record['username'],
+                email=record.get('email', ''),
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''),
+                is_artist=to_bool(record.get('is_artist'), True),
+                bio=record.get('bio', ''),
+                website=record.get('website', ''),
+                social_media=to_json(record.get('social_media'), {}),
+                profile_picture=picture or None,
+            )
+            # Only already-hashed passwords are imported; hashing tens of
+            # thousands of raw passwords here would dominate the run
+            password = record.get('password')
+            try:
+                identify_hasher(password)
+                user.password = password
+            except (TypeError, ValueError):
+                user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        created = dict(User.objects.filter(
+            username__in=[u.username for u in users]
+        ).values_list('username', 'id'))
+        self.user_ids.update(created)
+        self.artist_ids.update(created.values())
+
+    def create_galleries(self, rows):
+        rows = self.new_rows(Gallery, rows, 'slug', 'gallery slug')
+        if not rows:
+            return
+        taken = self.taken[Gallery]
+        galleries = []
+        for pos, record in rows:
+            slug = record.get('slug') or unique_slug(record['name'], taken)
+            galleries.append(Gallery(
+                name=record['name'],
+                type=record['type'],
+                description=record.get('description', ''),
+                slug=slug,
+            ))
+        Gallery.objects.bulk_create(galleries, batch_size=self.batch_size)
+        self.gallery_ids.update(Gallery.objects.filter(
+            slug__in=[g.slug for g in galleries]
+        ).values_list('slug', 'id'))
+
+    def resolve(self, mapping, key, pos, label):
+        try:
+            return mapping[key]
+        except KeyError:
+            raise CommandError(f'Row {pos}: unknown {label} {key!r}')
+
+    def create_artworks(self, rows):
+        rows = self.new_rows(Artwork, rows, 'slug', 'artwork slug')
+        if not rows:
+            return
+        taken = self.taken[Artwork]
+        images = self.copy_images(Artwork, 'image', rows)
+        artworks = []
+        for (pos, record), image in zip(rows, images):
+            slug = record.get('slug') or unique_slug(record['title'], taken)
+            artworks.append(Artwork(
+                title=record['title'],
+                artist_id=self.resolve(self.user_ids, record['artist'], pos, 'artist'),
+                gallery_id=self.resolve(self.gallery_ids, record['gallery'], pos, 'gallery'),
+                image=image,
+                description=record.get('description', ''),
+                status=record.get('status') or 'in-progress',
+                views=int(record.get('views') or 0),
+                slug=slug,
+            ))
+        Artwork.objects.bulk_create(artworks, batch_size=self.batch_size)
+        artist_ids = {artwork.artist_id for artwork in artworks}
+        self.artist_ids.update(artist_ids)
+        # Into the inboxes of the artists' followers, as for an upload
+        followed = set(Follow.objects.filter(followed_id__in=artist_ids).values_list('followed_id', flat=True))
+        for artwork in artworks:
+            if artwork.artist_id in followed:
+                feed.published(artwork)
+
+    def create_events(self, rows):
+        rows = self.new_rows(Event, rows, 'slug', 'event slug')
+        if not rows:
+            return
+        taken = self.taken[Event]
+        images = self.copy_images(Event, 'image', rows)
+        events = []
+        for (pos, record), image in zip(rows, images):
+            slug = record.get('slug') or unique_slug(record['title'], taken)
+            try:
+                start_date = to_datetime(record.get('start_date'))
+                end_date = to_datetime(record.get('end_date'))
+            except ValueError as exc:
+                raise CommandError(f'Row {pos}: {exc}')
+            events.append(Event(
+                title=record['title'],
+                description=record.get('description', ''),
+                location=record.get('location', ''),
+                start_date=start_date,
+                end_date=end_date,
+                image=image or None,
+                created_by_id=self.resolve(self.user_ids, record['created_by'], pos, 'user'),
+                max_participants=int(record.get('max_participants') or 0),
+                categories=to_json(record.get('categories'), []),
+                requirements=record.get('requirements', ''),
+                slug=slug,
+            ))
+        Event.objects.bulk_create(events, batch_size=self.batch_size)
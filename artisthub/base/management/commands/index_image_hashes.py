@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from base import imagehash
+from base.models import Artwork, ArtworkImageHash
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute perceptual hashes for artworks that have none, such as rows '
+        'from import_catalog or uploads made before duplicate detection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Threads decoding images in parallel')
+        parser.add_argument('--rehash', action='store_true',
+                            help='Recompute every hash, not only missing ones')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rehash']:
+            ArtworkImageHash.objects.all().delete()
+        pending = Artwork.objects.filter(image_hash__isnull=True).exclude(image='')
+        hashed = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                batch = list(
+                    pending.filter(id__gt=last_id).order_by('id').only('id', 'image')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                rows = []
+                for artwork, value in zip(batch, pool.map(self.hash_artwork, batch)):
+                    if value is None:
+                        failed += 1
+                    else:
+                        rows.append(imagehash.hash_row(artwork.id, value))
+                ArtworkImageHash.objects.bulk_create(rows, ignore_conflicts=True)
+                hashed += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Hashed {hashed} artworks ({failed} unreadable) in {time.monotonic() - started:.2f}s'
+        ))
+
+    def hash_artwork(self, artwork):
+        try:
+            with artwork.image.open('rb') as fp:
+                return imagehash.dhash(fp)
+        except (OSError, ValueError):
+            return None
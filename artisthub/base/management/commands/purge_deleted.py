@@ -0,0 +1,161 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from base.models import (
+    ArtistStats, Artwork, ArtworkImageHash, ArtworkRating, ArtworkSimilarity, ArtworkTrend,
+    Comment, Event, FeedItem, Follow, Like, User,
+)
+
+Participant = Event.participants.through
+
+
+class Command(BaseCommand):
+    help = (
+        'Permanently remove soft-deleted users, artworks and events. Dependent '
+        'rows are deleted in bounded batches, each in its own short '
+        'transaction, so a prolific account never holds the write lock for '
+        'long. Media files are removed once their rows are gone. Schedule it '
+        'periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--older-than', type=int, default=0, metavar='SECONDS',
+                            help='Only purge rows soft-deleted at least this long ago')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.deleted = {}
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+
+        for user_id in User.all_objects.filter(deleted_at__lte=cutoff).values_list('id', flat=True):
+            self.purge_user(user_id)
+        # Artworks and events deleted on their own
+        self.purge_artworks(Artwork.all_objects.filter(deleted_at__lte=cutoff))
+        self.purge_events(Event.all_objects.filter(deleted_at__lte=cutoff))
+
+        summary = ', '.join(f'{count} {label}' for label, count in self.deleted.items() if count)
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {summary or "nothing"} in {time.monotonic() - started:.2f}s'
+        ))
+
+    def report(self, label, count):
+        self.deleted[label] = self.deleted.get(label, 0) + count
+        if self.verbosity >= 2:
+            self.stdout.write(f'  {label}: {self.deleted[label]}')
+
+    def drain(self, label, queryset):
+        """Delete a queryset's rows batch by batch, without loading them or sending signals"""
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            with transaction.atomic():
+                # A plain DELETE ... WHERE id IN (...); the caller has already
+                # removed anything that references these rows
+                queryset.model._base_manager.filter(pk__in=ids)._raw_delete(queryset.db)
+            self.report(label, len(ids))
+
+    def remove_files(self, model, field_name, names):
+        """Delete media files no remaining row refers to"""
+        storage = model._meta.get_field(field_name).storage
+        for name in set(filter(None, names)):
+            if not model._base_manager.filter(**{field_name: name}).exists():
+                storage.delete(name)
+                self.report('files', 1)
+
+    def purge_artworks(self, artworks):
+        chunk = max(self.batch_size // 10, 1)
+        while True:
+            rows = list(artworks.values_list('id', 'artist_id', 'image')[:chunk])
+            if not rows:
+                return
+            ids = [artwork_id for artwork_id, _, _ in rows]
+            self.drain('feed items', FeedItem.objects.filter(artwork_id__in=ids))
+            self.drain('similarities', ArtworkSimilarity.objects.filter(
+                Q(artwork_id__in=ids) | Q(similar_id__in=ids)
+            ))
+            self.drain('image hashes', ArtworkImageHash.objects.filter(artwork_id__in=ids))
+            self.drain('trends', ArtworkTrend.objects.filter(artwork_id__in=ids))
+            self.drain('likes', Like.objects.filter(artwork_id__in=ids))
+            self.drain('ratings', ArtworkRating.objects.filter(artwork_id__in=ids))
+            # Deepest first, so no batch removes a comment that still has replies
+            self.drain('comments', Comment.objects.filter(artwork_id__in=ids).order_by('-depth', 'id'))
+            self.drain('artworks', Artwork.all_objects.filter(pk__in=ids))
+            self.remove_files(Artwork, 'image', [image for _, _, image in rows])
+            ArtistStats.refresh({artist_id for _, artist_id, _ in rows})
+
+    def purge_events(self, events):
+        chunk = max(self.batch_size // 10, 1)
+        while True:
+            rows = list(events.values_list('id', 'image')[:chunk])
+            if not rows:
+                return
+            ids = [event_id for event_id, _ in rows]
+            self.drain('event participants', Participant.objects.filter(event_id__in=ids))
+            self.drain('events', Event.all_objects.filter(pk__in=ids))
+            self.remove_files(Event, 'image', [image for _, image in rows])
+
+    def purge_user(self, user_id):
+        if self.verbosity >= 2:
+            self.stdout.write(f'User {user_id}')
+        self.purge_artworks(Artwork.all_objects.filter(artist_id=user_id))
+        self.purge_events(Event.all_objects.filter(created_by_id=user_id))
+
+        # Their activity on other artists' artworks, whose totals are recomputed
+        liked = set(Like.objects.filter(user_id=user_id).values_list('artwork__artist_id', flat=True))
+        self.drain('likes', Like.objects.filter(user_id=user_id))
+        rated = set(ArtworkRating.objects.filter(user_id=user_id).values_list('artwork_id', flat=True))
+        self.drain('ratings', ArtworkRating.objects.filter(user_id=user_id))
+        self.recount_ratings(rated)
+        while True:
+            # Through the collector, so replies go too and thread counts stay right
+            ids = list(Comment.objects.filter(user_id=user_id).values_list('pk', flat=True)[:100])
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted, _ = Comment.objects.filter(pk__in=ids).delete()
+            self.report('comments', deleted)
+        self.drain('event participants', Participant.objects.filter(user_id=user_id))
+
+        followed = set(Follow.objects.filter(follower_id=user_id).values_list('followed_id', flat=True))
+        followers = set(Follow.objects.filter(followed_id=user_id).values_list('follower_id', flat=True))
+        self.drain('follows', Follow.objects.filter(Q(follower_id=user_id) | Q(followed_id=user_id)))
+        self.drain('feed items', FeedItem.objects.filter(owner_id=user_id))
+        affected = sorted(liked | followed | followers | set(
+            Artwork.objects.filter(pk__in=rated).values_list('artist_id', flat=True)
+        ))
+        for start in range(0, len(affected), self.batch_size):
+            ArtistStats.refresh(affected[start:start + self.batch_size])
+
+        # What is left is small: tokens, sessions, admin log entries, stats
+        picture = User.all_objects.filter(pk=user_id).values_list('profile_picture', flat=True).first()
+        with transaction.atomic():
+            User.all_objects.filter(pk=user_id).delete()
+        self.report('users', 1)
+        self.remove_files(User, 'profile_picture', [picture])
+
+    def recount_ratings(self, artwork_ids):
+        """Recompute the rating totals and score of artworks that lost ratings"""
+        artwork_ids = sorted(artwork_ids)
+        for start in range(0, len(artwork_ids), self.batch_size):
+            batch = artwork_ids[start:start + self.batch_size]
+            totals = {
+                row['artwork_id']: row for row in ArtworkRating.objects.filter(artwork_id__in=batch)
+                .values('artwork_id').annotate(total=Sum('value'), count=Count('id'))
+            }
+            with transaction.atomic():
+                for artwork_id in batch:
+                    row = totals.get(artwork_id, {'total': 0, 'count': 0})
+                    score = Artwork.bayesian_expression(row['total'], row['count']) if row['count'] else 0.0
+                    Artwork.all_objects.filter(pk=artwork_id).update(
+                        rating_sum=row['total'], rating_count=row['count'], bayesian_score=score,
+                    )
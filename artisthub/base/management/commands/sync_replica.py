@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into each SQLite replica alias. '
+        'Stands in for real replication when trying the replica router locally.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep copying every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No DATABASE_REPLICAS configured')
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Only SQLite primaries can be copied; use database replication')
+
+        while True:
+            primary.ensure_connection()
+            for alias in replicas:
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'Copied default -> {alias}')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.models import ArtistStats, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the per-artist totals behind /api/users/directory/ from the '
+        'source tables. Run it after bulk imports and migrations; afterwards '
+        'the totals are kept current incrementally.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        refreshed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                User.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]
+            refreshed += ArtistStats.refresh(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed stats for {refreshed} users in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,133 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from base.models import ArtworkRating, ArtworkSimilarity, JobCheckpoint, Like
+
+JOB_NAME = 'update_similar'
+DEFAULTS = {
+    # Neighbours stored per artwork
+    'TOP_K': 20,
+    # Artworks whose similarity rows are computed at once; bounds memory
+    # to CHUNK_SIZE x artworks similarity scores
+    'CHUNK_SIZE': 500,
+    # Engagement weights in the user x artwork matrix; a rating counts
+    # WEIGHTS['rating'] * value / 5
+    'WEIGHTS': {'like': 1.0, 'rating': 1.0},
+}
+
+
+def similarity_config():
+    config = {**DEFAULTS, **getattr(settings, 'SIMILAR_ARTWORKS', {})}
+    config['WEIGHTS'] = {**DEFAULTS['WEIGHTS'], **config['WEIGHTS']}
+    return config
+
+
+def engagement_matrix(weights):
+    """
+    Sparse user x artwork engagement matrix with unit-length columns, and
+    the artwork ID of each column.
+    """
+    likes = np.array(Like.objects.values_list('user_id', 'artwork_id'), dtype=np.int64).reshape(-1, 2)
+    ratings = np.array(
+        ArtworkRating.objects.values_list('user_id', 'artwork_id', 'value'), dtype=np.int64
+    ).reshape(-1, 3)
+    users = np.concatenate([likes[:, 0], ratings[:, 0]])
+    artworks = np.concatenate([likes[:, 1], ratings[:, 1]])
+    values = np.concatenate([
+        np.full(len(likes), weights['like'], dtype=np.float64),
+        weights['rating'] * ratings[:, 2] / 5.0,
+    ])
+    user_ids, rows = np.unique(users, return_inverse=True)
+    artwork_ids, columns = np.unique(artworks, return_inverse=True)
+    # Duplicate (user, artwork) entries from a like plus a rating are summed
+    matrix = sparse.csc_matrix(
+        (values, (rows, columns)), shape=(len(user_ids), len(artwork_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    return (matrix @ sparse.diags(1.0 / norms)).tocsc(), artwork_ids
+
+
+def top_neighbours(matrix, columns, k):
+    """
+    Cosine top-k for the given columns: one sparse product per chunk, then
+    a partial sort of each row. Yields (column, neighbour columns, scores).
+    """
+    scores = (matrix[:, columns].T @ matrix).tocsr()
+    for row, column in enumerate(columns):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        neighbours = scores.indices[start:end]
+        values = scores.data[start:end]
+        keep = neighbours != column
+        neighbours, values = neighbours[keep], values[keep]
+        if len(values) > k:
+            best = np.argpartition(-values, k)[:k]
+            neighbours, values = neighbours[best], values[best]
+        order = np.argsort(-values, kind='stable')
+        yield column, neighbours[order], values[order]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute item-item cosine similarity from likes and ratings and store '
+        'the top neighbours behind /api/artworks/<slug>/similar/. By default '
+        'only artworks with engagement since the last run are recomputed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recompute every artwork, picking up unlikes and changed ratings')
+
+    def handle(self, *args, **options):
+        config = similarity_config()
+        started = time.monotonic()
+        now = timezone.now()
+
+        checkpoint = JobCheckpoint.objects.filter(name=JOB_NAME).first()
+        rebuild = options['full'] or checkpoint is None
+        matrix, artwork_ids = engagement_matrix(config['WEIGHTS'])
+        if rebuild:
+            targets = np.arange(len(artwork_ids))
+        else:
+            since = checkpoint.last_run_at
+            changed = set(Like.objects.filter(created_at__gt=since).values_list('artwork_id', flat=True))
+            changed.update(
+                ArtworkRating.objects.filter(created_at__gt=since).values_list('artwork_id', flat=True)
+            )
+            targets = np.flatnonzero(np.isin(artwork_ids, list(changed)))
+
+        for start in range(0, len(targets), config['CHUNK_SIZE']):
+            chunk = targets[start:start + config['CHUNK_SIZE']]
+            rows = [
+                ArtworkSimilarity(
+                    artwork_id=int(artwork_ids[column]), similar_id=int(artwork_ids[neighbour]),
+                    score=float(score),
+                )
+                for column, neighbours, scores in top_neighbours(matrix, chunk, config['TOP_K'])
+                for neighbour, score in zip(neighbours, scores)
+            ]
+            with transaction.atomic():
+                ArtworkSimilarity.objects.filter(
+                    artwork_id__in=[int(artwork_ids[column]) for column in chunk]
+                ).delete()
+                ArtworkSimilarity.objects.bulk_create(rows, batch_size=1000)
+
+        if rebuild:
+            # Artworks that lost all their engagement keep no neighbours
+            ArtworkSimilarity.objects.exclude(
+                artwork_id__in=Like.objects.values('artwork_id')
+            ).exclude(
+                artwork_id__in=ArtworkRating.objects.values('artwork_id')
+            ).delete()
+        JobCheckpoint.objects.update_or_create(name=JOB_NAME, defaults={'last_run_at': now})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated similar artworks for {len(targets)} of {len(artwork_ids)} artworks '
+            f'in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,104 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base.models import Artwork, ArtworkRating, ArtworkTrend, Comment, JobCheckpoint, Like
+
+JOB_NAME = 'update_trending'
+# Any of these can be overridden in settings.TRENDING
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 24,
+    # How far back a first (or --full) run looks for activity
+    'WINDOW_DAYS': 7,
+    'WEIGHTS': {'like': 1.0, 'comment': 2.0, 'rating': 1.5, 'view': 0.1},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold activity since the last run into the time-decayed trending '
+        'scores behind /api/artworks/trending/. Schedule it periodically.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Discard stored scores and rebuild from the activity window')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        config = {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+        weights = {**DEFAULTS['WEIGHTS'], **config['WEIGHTS']}
+        half_life = timedelta(hours=config['HALF_LIFE_HOURS']).total_seconds()
+        started = time.monotonic()
+        now = timezone.now()
+
+        with transaction.atomic():
+            checkpoint = JobCheckpoint.objects.select_for_update().filter(name=JOB_NAME).first()
+            rebuild = options['full'] or checkpoint is None
+            if rebuild:
+                ArtworkTrend.objects.all().delete()
+                since = now - timedelta(days=config['WINDOW_DAYS'])
+            else:
+                since = checkpoint.last_run_at
+                # Age every stored score to now in one statement
+                factor = 0.5 ** ((now - since).total_seconds() / half_life)
+                ArtworkTrend.objects.update(score=F('score') * factor)
+
+            def decayed(created_at):
+                return 0.5 ** ((now - created_at).total_seconds() / half_life)
+
+            deltas = defaultdict(float)
+            sources = [(Like, weights['like']), (Comment, weights['comment']),
+                       (ArtworkRating, weights['rating'])]
+            for model, weight in sources:
+                rows = model.objects.filter(created_at__gt=since, created_at__lte=now)
+                for artwork_id, created_at in rows.values_list('artwork_id', 'created_at').iterator():
+                    deltas[artwork_id] += weight * decayed(created_at)
+
+            # Views are a bare counter, so new views are the growth since the
+            # last run and are treated as happening now. A rebuild cannot
+            # date existing views and only records them as the baseline.
+            view_weight = 0.0 if rebuild else weights['view']
+            viewed = Artwork.objects.annotate(
+                seen=Coalesce('trend__views_seen', 0)
+            ).filter(views__gt=F('seen')).values_list('id', 'views', 'seen')
+            views = {}
+            for artwork_id, total, seen in viewed.iterator():
+                deltas[artwork_id] += view_weight * (total - seen)
+                views[artwork_id] = total
+
+            self.apply(deltas, views, options['batch_size'])
+            JobCheckpoint.objects.update_or_create(name=JOB_NAME, defaults={'last_run_at': now})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {len(deltas)} trending artworks in {time.monotonic() - started:.2f}s'
+        ))
+
+    def apply(self, deltas, views, batch_size):
+        ids = list(deltas)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            types = dict(Artwork.objects.filter(id__in=chunk).values_list('id', 'gallery__type'))
+            existing = ArtworkTrend.objects.in_bulk(chunk)
+            updated, created = [], []
+            for artwork_id in chunk:
+                if artwork_id not in types:
+                    continue  # deleted since the activity was recorded
+                trend = existing.get(artwork_id)
+                if trend is None:
+                    trend = ArtworkTrend(artwork_id=artwork_id)
+                    created.append(trend)
+                else:
+                    updated.append(trend)
+                trend.score += deltas[artwork_id]
+                trend.gallery_type = types[artwork_id]
+                trend.views_seen = views.get(artwork_id, trend.views_seen)
+            ArtworkTrend.objects.bulk_create(created)
+            ArtworkTrend.objects.bulk_update(updated, ['score', 'gallery_type', 'views_seen'])
@@ -0,0 +1,117 @@
+"""
+In-process request metrics rendered in the Prometheus text format.
+"""
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram with one series per label set"""
+
+    def __init__(self, name, documentation, buckets, labels=('route',)):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = defaultdict(lambda: [[0] * (len(self.buckets) + 1), 0.0, 0])
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, _, _ = series = self._series[label_values]
+            counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count)
+                    for key, (counts, total, count) in self._series.items()}
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(self.snapshot().items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+requests_total = Counter(
+    'artisthub_requests_total', 'Requests handled, by route, method and status.',
+    ('route', 'method', 'status'),
+)
+request_duration = Histogram(
+    'artisthub_request_duration_seconds', 'Wall time spent handling a request.', DURATION_BUCKETS,
+)
+db_duration = Histogram(
+    'artisthub_db_duration_seconds', 'Time spent in SQL queries per request.', DURATION_BUCKETS,
+)
+db_queries = Histogram(
+    'artisthub_db_queries', 'SQL queries executed per request.', QUERY_BUCKETS,
+)
+db_duplicate_queries = Histogram(
+    'artisthub_db_duplicate_queries', 'Repeated SQL statements per request (N+1 indicator).',
+    QUERY_BUCKETS,
+)
+response_size = Histogram(
+    'artisthub_response_size_bytes', 'Response body size.', SIZE_BUCKETS,
+)
+
+reference_cache_lookups = Counter(
+    'artisthub_reference_cache_lookups_total', 'Reference cache lookups, by cache and hit or miss.',
+    ('cache', 'result'),
+)
+reference_cache_evictions = Counter(
+    'artisthub_reference_cache_evictions_total', 'Rows evicted from a full reference cache.',
+    ('cache',),
+)
+
+REGISTRY = [requests_total, request_duration, db_duration, db_queries,
+            db_duplicate_queries, response_size, reference_cache_lookups,
+            reference_cache_evictions]
+
+
+def render():
+    """Return every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,223 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics
+from .routers import pinned, replica_config
+
+logger = logging.getLogger('base.performance')
+
+# The recorder of the request being handled. A context variable follows the
+# request into the threads async views use for ORM calls, where the database
+# connections are different objects from the ones in the event loop thread.
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+class QueryRecorder:
+    """Times and counts the SQL statements of one request"""
+
+    def __init__(self, keep_sql=False):
+        self.keep_sql = keep_sql
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self.captured = []
+
+    def record(self, sql, params, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[sql] = self.statements.get(sql, 0) + 1
+        if self.keep_sql:
+            self.captured.append((elapsed, sql, params))
+
+    @property
+    def duplicates(self):
+        """Statements that ran more than once with the same SQL template"""
+        return self.count - len(self.statements)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper feeding the current request's recorder"""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.record(sql, params, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class PerformanceMiddleware:
+    """
+    Record wall time, DB time, query counts and response size per
+    resolved route, and emit a Server-Timing header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        config = getattr(settings, 'PERFORMANCE_MONITORING', {})
+        self.server_timing = config.get('SERVER_TIMING', True)
+        self.slow_request_ms = config.get('SLOW_REQUEST_MS')
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Connections opened before this module was imported missed the signal
+        for alias in connections:
+            install_query_recorder(connections[alias])
+        recorder = QueryRecorder(keep_sql=self.slow_request_ms is not None)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.finish(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(keep_sql=self.slow_request_ms is not None)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.finish(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        route = (match.url_name or match.view_name) if match else 'unresolved'
+        if response.has_header('Content-Length'):
+            size = int(response['Content-Length'])
+        elif not response.streaming:
+            size = len(response.content)
+        else:
+            size = 0
+
+        metrics.requests_total.inc(route, request.method, response.status_code)
+        metrics.request_duration.observe(elapsed, route)
+        metrics.db_duration.observe(recorder.duration, route)
+        metrics.db_queries.observe(recorder.count, route)
+        metrics.db_duplicate_queries.observe(recorder.duplicates, route)
+        metrics.response_size.observe(size, route)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'app;dur={(elapsed - recorder.duration) * 1000:.1f}, '
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+
+        if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+            statements = '\n'.join(
+                f'  {duration * 1000:.1f}ms {sql} {params!r}'
+                for duration, sql, params in recorder.captured
+            )
+            logger.warning(
+                'Slow request %s %s (%s) took %.1fms with %d queries (%d duplicate):\n%s',
+                request.method, request.path, route, elapsed * 1000,
+                recorder.count, recorder.duplicates, statements,
+            )
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pinned'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for the replica router: a successful write pins the
+    writer to the primary for PIN_SECONDS, keyed by the user ID from their
+    JWT (shared across workers through the cache) and by a short cookie.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', []):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        user_id = self.token_user_id(request)
+        pin = self.is_write(request) or PIN_COOKIE in request.COOKIES or (
+            user_id is not None and cache.get(self.pin_key(user_id)) is not None
+        )
+        token = pinned.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            pinned.reset(token)
+        if self.is_write(request) and response.status_code < 400:
+            if user_id is not None:
+                cache.set(self.pin_key(user_id), 1, replica_config()['PIN_SECONDS'])
+            self.set_cookie(response)
+        return response
+
+    async def __acall__(self, request):
+        user_id = self.token_user_id(request)
+        pin = self.is_write(request) or PIN_COOKIE in request.COOKIES or (
+            user_id is not None and await cache.aget(self.pin_key(user_id)) is not None
+        )
+        token = pinned.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            pinned.reset(token)
+        if self.is_write(request) and response.status_code < 400:
+            if user_id is not None:
+                await cache.aset(self.pin_key(user_id), 1, replica_config()['PIN_SECONDS'])
+            self.set_cookie(response)
+        return response
+
+    def is_write(self, request):
+        return request.method not in SAFE_METHODS
+
+    def pin_key(self, user_id):
+        return f'db-pin:{user_id}'
+
+    def token_user_id(self, request):
+        parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(parts) != 2 or parts[0] not in api_settings.AUTH_HEADER_TYPES:
+            return None
+        try:
+            return AccessToken(parts[1]).get(api_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
+
+    def set_cookie(self, response):
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=replica_config()['PIN_SECONDS'],
+            httponly=True, samesite='Lax',
+        )
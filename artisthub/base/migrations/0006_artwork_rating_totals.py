@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Artwork = apps.get_model('base', 'Artwork')
+    ArtworkRating = apps.get_model('base', 'ArtworkRating')
+    prior = getattr(settings, 'RATING_PRIOR', {})
+    weight = float(prior.get('WEIGHT', 5))
+    mean = float(prior.get('MEAN', 3.0))
+    totals = ArtworkRating.objects.values('artwork').annotate(
+        rating_sum=Sum('value'), rating_count=Count('id')
+    )
+    for row in totals.iterator():
+        Artwork.objects.filter(pk=row['artwork']).update(
+            rating_sum=row['rating_sum'],
+            rating_count=row['rating_count'],
+            bayesian_score=(weight * mean + row['rating_sum']) / (weight + row['rating_count']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0005_artwork_views_artworkrating_artwork_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artwork',
+            name='bayesian_score',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='artwork',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='artwork',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
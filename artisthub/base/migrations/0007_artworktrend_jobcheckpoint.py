@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0006_artwork_rating_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_run_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArtworkTrend',
+            fields=[
+                ('artwork', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='base.artwork')),
+                ('gallery_type', models.CharField(choices=[('PHOTO', 'Photography'), ('DIGITAL', 'Digital Art'), ('PAINTING', 'Painting'), ('SCULPTURE', 'Sculpture')], max_length=20)),
+                ('score', models.FloatField(default=0)),
+                ('views_seen', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='trend_score_idx'), models.Index(fields=['gallery_type', '-score'], name='trend_type_score_idx')],
+            },
+        ),
+    ]
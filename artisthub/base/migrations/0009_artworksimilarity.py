@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtworkSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('artwork', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='base.artwork')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.artwork')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['artwork', '-score'], name='similarity_rank_idx')],
+                'unique_together': {('artwork', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_event_end_dates_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArtistStats',
+            fields=[
+                ('artist', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('search_name', models.CharField(db_index=True, max_length=150)),
+                ('artwork_count', models.PositiveIntegerField(default=0)),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('total_likes', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-artwork_count', 'artist'], name='artist_artworks_idx'), models.Index(fields=['-total_views', 'artist'], name='artist_views_idx'), models.Index(fields=['-total_likes', 'artist'], name='artist_likes_idx'), models.Index(fields=['-average_rating', 'artist'], name='artist_rating_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobcheckpoint',
+            name='position',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+BATCH_SIZE = 500
+
+
+def backfill_artist_stats(apps, schema_editor):
+    # Rows for users who predate ArtistStats, computed as ArtistStats.refresh()
+    # does; historical managers do not hide soft-deleted rows, so filter them here
+    User = apps.get_model('base', 'User')
+    Artwork = apps.get_model('base', 'Artwork')
+    ArtworkRating = apps.get_model('base', 'ArtworkRating')
+    Like = apps.get_model('base', 'Like')
+    Follow = apps.get_model('base', 'Follow')
+    ArtistStats = apps.get_model('base', 'ArtistStats')
+    users = User.objects.filter(deleted_at=None, stats=None).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id).values_list('id', 'username')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        ids = [artist_id for artist_id, _ in batch]
+        artworks = {
+            row['artist_id']: row for row in Artwork.objects.filter(artist_id__in=ids, deleted_at=None)
+            .values('artist_id').annotate(count=Count('id'), views=Sum('views'))
+        }
+        likes = dict(
+            Like.objects.filter(artwork__artist_id__in=ids, artwork__deleted_at=None)
+            .values('artwork__artist_id')
+            .annotate(count=Count('id')).values_list('artwork__artist_id', 'count')
+        )
+        ratings = {
+            row['artwork__artist_id']: row for row in ArtworkRating.objects
+            .filter(artwork__artist_id__in=ids, artwork__deleted_at=None).values('artwork__artist_id')
+            .annotate(total=Sum('value'), count=Count('id'))
+        }
+        followers = dict(
+            Follow.objects.filter(followed_id__in=ids, follower__deleted_at=None).values('followed_id')
+            .annotate(count=Count('id')).values_list('followed_id', 'count')
+        )
+        following = dict(
+            Follow.objects.filter(follower_id__in=ids, followed__deleted_at=None).values('follower_id')
+            .annotate(count=Count('id')).values_list('follower_id', 'count')
+        )
+        rows = []
+        for artist_id, username in batch:
+            works = artworks.get(artist_id, {})
+            rating = ratings.get(artist_id, {})
+            rating_sum, rating_count = rating.get('total') or 0, rating.get('count') or 0
+            rows.append(ArtistStats(
+                artist_id=artist_id, search_name=username.lower(),
+                artwork_count=works.get('count') or 0, total_views=works.get('views') or 0,
+                total_likes=likes.get(artist_id, 0),
+                rating_sum=rating_sum, rating_count=rating_count,
+                average_rating=rating_sum / rating_count if rating_count else 0,
+                follower_count=followers.get(artist_id, 0),
+                following_count=following.get(artist_id, 0),
+            ))
+        # A row the signals created meanwhile is already being kept up to date
+        ArtistStats.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_jobcheckpoint_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_artist_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:31
+
+import base.models
+from django.db import migrations, models
+
+
+def rotate_calendar_secrets(apps, schema_editor):
+    # AddField gives every existing row the same default; each user needs their own
+    User = apps.get_model('base', 'User')
+    for user in User.objects.only('id').iterator():
+        User.objects.filter(pk=user.pk).update(calendar_secret=base.models.new_calendar_secret())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0019_backfill_artist_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_secret',
+            field=models.CharField(default=base.models.new_calendar_secret, editable=False, max_length=32),
+        ),
+        migrations.RunPython(rotate_calendar_secrets, migrations.RunPython.noop),
+    ]
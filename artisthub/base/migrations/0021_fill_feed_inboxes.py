@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from base.feed import feed_config
+
+
+def fill_feed_inboxes(apps, schema_editor):
+    # Users who followed more than MERGE_LIMIT artists before the counts were
+    # backfilled by 0019 read their feed from an inbox nothing has built yet;
+    # build it as base.feed.followed() does when the limit is crossed
+    ArtistStats = apps.get_model('base', 'ArtistStats')
+    Artwork = apps.get_model('base', 'Artwork')
+    FeedItem = apps.get_model('base', 'FeedItem')
+    config = feed_config()
+    owners = ArtistStats.objects.filter(following_count__gt=config['MERGE_LIMIT'])
+    for owner_id in owners.values_list('artist_id', flat=True).iterator():
+        artworks = Artwork.objects.filter(
+            artist__followers__follower_id=owner_id, deleted_at=None,
+        ).order_by('-created_at', '-id').values_list('id', 'created_at')[:config['INBOX_BACKFILL']]
+        FeedItem.objects.bulk_create([
+            FeedItem(owner_id=owner_id, artwork_id=artwork_id, created_at=created_at)
+            for artwork_id, created_at in artworks
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_user_calendar_secret'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_inboxes, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,69 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+import secrets
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Cast, Concat, LPad
+from django.db.models.lookups import GreaterThan
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.utils import timezone
 from django.utils.text import slugify
 
+class LiveManager(models.Manager):
+    """
+    Hides soft-deleted rows; purge_deleted removes them later. Declared
+    first so it is the default manager, while all_objects still sees them.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at=None)
+
+class LiveUserManager(LiveManager, UserManager):
+    pass
+
+def new_calendar_secret():
+    return secrets.token_hex(16)
+
 class User(AbstractUser):
     is_artist = models.BooleanField(default=True)
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
     website = models.URLField(max_length=200, blank=True)
     social_media = models.JSONField(default=dict, blank=True)
+    # Filled in from the uploaded file, see base.placeholders
+    profile_picture_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    profile_picture_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    profile_picture_blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    # Signs the user's calendar feed URL, see base.ical; replacing it revokes the URL
+    calendar_secret = models.CharField(max_length=32, default=new_calendar_secret, editable=False)
+
+    objects = LiveUserManager()
+    all_objects = UserManager()
+
+    @property
+    def profile_picture_aspect_ratio(self):
+        if not self.profile_picture_width or not self.profile_picture_height:
+            return None
+        return round(self.profile_picture_width / self.profile_picture_height, 4)
+
+    def rotate_calendar_secret(self):
+        self.calendar_secret = new_calendar_secret()
+        self.save(update_fields=['calendar_secret'])
+
+    def soft_delete(self):
+        """
+        Hide the user with their artworks and events at once and block their
+        logins; purge_deleted removes everything in the background.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            self.deleted_at = now
+            self.is_active = False
+            self.save(update_fields=['deleted_at', 'is_active'])
+            Artwork.all_objects.filter(artist=self, deleted_at=None).update(deleted_at=now)
+            Event.all_objects.filter(created_by=self, deleted_at=None).update(deleted_at=now)
+            ArtistStats.objects.filter(artist=self).delete()
 
 class Gallery(models.Model):
     GALLERY_TYPES = [
@@ -55,6 +111,25 @@ class Artwork(models.Model):
         through='ArtworkRating',
         related_name='rated_artworks'
     )
+    # Running totals maintained by the rate/unrate endpoints; unrated
+    # artworks keep a score of 0 so they sort after every rated one
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    bayesian_score = models.FloatField(default=0, db_index=True)
+    # Filled in from the uploaded file, see base.placeholders
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_blurhash = models.CharField(max_length=64, blank=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # An artist's newest artworks, one range scan per artist in the feed merge
+            models.Index(fields=['artist', '-created_at', '-id'], name='artwork_artist_recent_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -64,6 +139,41 @@ class Artwork(models.Model):
     def __str__(self):
         return f"{self.title} by {self.artist.username}"
 
+    @property
+    def image_aspect_ratio(self):
+        if not self.image_width or not self.image_height:
+            return None
+        return round(self.image_width / self.image_height, 4)
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return round(self.rating_sum / self.rating_count, 2)
+
+    @staticmethod
+    def record_view(artwork_id, artist_id):
+        """Count a view towards the artwork's trending score and its artist's total"""
+        Artwork.all_objects.filter(pk=artwork_id).update(views=F('views') + 1)
+        ArtistStats.apply(artist_id, total_views=1)
+
+    def soft_delete(self):
+        """Hide the artwork at once; purge_deleted removes it in the background"""
+        with transaction.atomic():
+            Artwork.all_objects.filter(pk=self.pk).update(deleted_at=timezone.now())
+            ArtistStats.refresh([self.artist_id])
+
+    @staticmethod
+    def bayesian_expression(rating_sum, rating_count):
+        """
+        Weighted rating that pulls artworks with few ratings towards the
+        prior mean, so one 5-star rating does not top the charts.
+        """
+        prior = getattr(settings, 'RATING_PRIOR', {})
+        weight = float(prior.get('WEIGHT', 5))
+        mean = float(prior.get('MEAN', 3.0))
+        return (weight * mean + rating_sum) / (weight + rating_count)
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     artwork = models.ForeignKey(Artwork, on_delete=models.CASCADE, related_name='likes')
@@ -76,22 +186,104 @@ class Like(models.Model):
         return f"{self.user.username} likes {self.artwork.title}"
 
 class Comment(models.Model):
+    # Each path segment is a zero-padded comment ID, so 255 characters
+    # hold this many levels
+    MAX_DEPTH = 20
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     artwork = models.ForeignKey(Artwork, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies'
+    )
+    # IDs of the ancestors and the comment itself, e.g. "0000000003/0000000017/",
+    # so a whole thread is one range scan on (artwork, path) in reading order
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Replies anywhere below this comment
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['artwork', 'path'], name='comment_thread_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        if creating and self.parent_id:
+            self.depth = self.parent.depth + 1
+        if not creating or self.path:
+            super().save(*args, **kwargs)
+            return
+        # The path needs the new ID, so it is written right after the insert,
+        # in the same transaction as the insert and the ancestors' counts
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            prefix = self.parent.path if self.parent_id else ''
+            self.path = f'{prefix}{self.pk:010d}/'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+            if self.parent_id:
+                Comment.objects.filter(pk__in=self.ancestor_ids).update(
+                    reply_count=F('reply_count') + 1
+                )
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.artwork.title}"
 
+    @property
+    def ancestor_ids(self):
+        return [int(segment) for segment in self.path.split('/')[:-2]]
+
+    def descendants(self):
+        """Every reply below this comment, in thread order"""
+        # '~' sorts after the digits and '/', so this bounds the subtree
+        return Comment.objects.filter(
+            artwork_id=self.artwork_id, path__gt=self.path, path__lt=f'{self.path}~'
+        ).order_by('path')
+
+    @staticmethod
+    def root_path_expression():
+        """Path of a top-level comment, for rows created with bulk_create"""
+        return Concat(LPad(Cast('id', models.CharField()), 10, Value('0')), Value('/'))
+
+class EventQuerySet(models.QuerySet):
+
+    def with_status(self, now=None):
+        """Annotate current_status, the database-side Event.status"""
+        conditions = Event.status_conditions(now or timezone.now())
+        return self.annotate(current_status=Case(
+            *(When(condition, then=Value(label)) for label, condition in conditions.items()),
+            output_field=models.CharField(),
+        ))
+
+    def status_counts(self, now=None):
+        """Number of events in each status, from one grouped query"""
+        counts = dict.fromkeys(Event.STATUSES, 0)
+        rows = self.with_status(now).order_by().values('current_status').annotate(
+            count=models.Count('id')
+        )
+        counts.update((row['current_status'], row['count']) for row in rows)
+        return counts
+
 class Event(models.Model):
+    UPCOMING = 'Upcoming'
+    IN_PROGRESS = 'In Progress'
+    COMPLETED = 'Completed'
+    # In lifecycle order, which is how status sorts
+    STATUSES = [UPCOMING, IN_PROGRESS, COMPLETED]
+
     title = models.CharField(max_length=200)
     description = models.TextField()
     location = models.CharField(max_length=200)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
     image = models.ImageField(upload_to='events/', null=True, blank=True)
+    # Filled in from the uploaded file, see base.placeholders
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_blurhash = models.CharField(max_length=64, blank=True, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -104,6 +296,18 @@ class Event(models.Model):
         related_name='joined_events',
         blank=True
     )
+
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = LiveManager.from_queryset(EventQuerySet)()
+    all_objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date', 'end_date'], name='event_dates_idx'),
+            # Overlap queries for recent ranges skip the long tail of past events
+            models.Index(fields=['end_date', 'start_date'], name='event_end_dates_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -113,17 +317,38 @@ class Event(models.Model):
     def __str__(self):
         return self.title
 
+    def soft_delete(self):
+        """Hide the event at once; purge_deleted removes it in the background"""
+        Event.all_objects.filter(pk=self.pk).update(deleted_at=timezone.now())
+
+    @staticmethod
+    def status_conditions(now):
+        """Filter for each status at now; they do not overlap"""
+        return {
+            Event.UPCOMING: Q(start_date__gt=now),
+            Event.IN_PROGRESS: Q(start_date__lte=now, end_date__gte=now),
+            Event.COMPLETED: Q(start_date__lte=now, end_date__lt=now),
+        }
+
+    @property
+    def image_aspect_ratio(self):
+        if not self.image_width or not self.image_height:
+            return None
+        return round(self.image_width / self.image_height, 4)
+
     @property
     def status(self):
-        from django.utils import timezone
+        # Events loaded through with_status() share one timestamp
+        if hasattr(self, 'current_status'):
+            return self.current_status
         now = timezone.now()
         
         if self.start_date > now:
-            return 'Upcoming'
+            return self.UPCOMING
         elif self.start_date <= now and self.end_date >= now:
-            return 'In Progress'
+            return self.IN_PROGRESS
         else:
-            return 'Completed'
+            return self.COMPLETED
 
 class ArtworkRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -136,3 +361,190 @@ class ArtworkRating(models.Model):
 
     class Meta:
         unique_together = ('user', 'artwork')
+
+class ArtworkTrend(models.Model):
+    """Materialized, time-decayed engagement score maintained by update_trending"""
+    # Decayed scores never reach 0; below this an artwork no longer trends.
+    # A single like takes about seven half-lives to fall under it.
+    MIN_SCORE = 0.01
+
+    artwork = models.OneToOneField(Artwork, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    # Copied from the gallery so per-type rankings need no join
+    gallery_type = models.CharField(max_length=20, choices=Gallery.GALLERY_TYPES)
+    score = models.FloatField(default=0)
+    views_seen = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trend_score_idx'),
+            models.Index(fields=['gallery_type', '-score'], name='trend_type_score_idx'),
+        ]
+
+class ArtworkSimilarity(models.Model):
+    """Top-K co-engagement neighbours of an artwork, maintained by update_similar"""
+    artwork = models.ForeignKey(Artwork, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(Artwork, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('artwork', 'similar')
+        indexes = [
+            models.Index(fields=['artwork', '-score'], name='similarity_rank_idx'),
+        ]
+
+class ArtworkImageHash(models.Model):
+    """
+    64-bit dHash of an artwork's image, see base.imagehash. The hash is
+    also split into four 16-bit bands, each indexed, so near-duplicates
+    are found by exact band lookups instead of scanning every hash.
+    """
+    artwork = models.OneToOneField(Artwork, on_delete=models.CASCADE, primary_key=True, related_name='image_hash')
+    # Stored as a signed 64-bit integer, which is what SQLite can hold
+    hash = models.BigIntegerField()
+    band0 = models.PositiveIntegerField(db_index=True)
+    band1 = models.PositiveIntegerField(db_index=True)
+    band2 = models.PositiveIntegerField(db_index=True)
+    band3 = models.PositiveIntegerField(db_index=True)
+
+class JobCheckpoint(models.Model):
+    """Records when an incremental background job last completed"""
+    name = models.CharField(max_length=100, unique=True)
+    last_run_at = models.DateTimeField()
+    # Input rows a resumable job such as import_catalog has committed
+    position = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_run_at}"
+
+
+class ArtistStats(models.Model):
+    """
+    Per-artist totals behind the artist directory. Signals and the rating
+    endpoints apply deltas as things happen; update_artist_stats rebuilds
+    rows from the source tables, e.g. after bulk imports.
+    """
+    artist = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # Lower-cased username, for indexed case-insensitive prefix search
+    search_name = models.CharField(max_length=150, db_index=True)
+    artwork_count = models.PositiveIntegerField(default=0)
+    total_views = models.PositiveBigIntegerField(default=0)
+    total_likes = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-artwork_count', 'artist'], name='artist_artworks_idx'),
+            models.Index(fields=['-total_views', 'artist'], name='artist_views_idx'),
+            models.Index(fields=['-total_likes', 'artist'], name='artist_likes_idx'),
+            models.Index(fields=['-average_rating', 'artist'], name='artist_rating_idx'),
+        ]
+
+    @staticmethod
+    def average_expression(rating_sum, rating_count):
+        return Case(
+            When(GreaterThan(rating_count, 0), then=Cast(rating_sum, models.FloatField()) / rating_count),
+            default=Value(0.0),
+        )
+
+    @classmethod
+    def apply(cls, artist, **deltas):
+        """
+        Add deltas to an artist's totals in one UPDATE. artist is an ID or a
+        queryset of IDs; artists without a row are left to update_artist_stats.
+        """
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not updates:
+            return
+        if 'rating_sum' in updates or 'rating_count' in updates:
+            updates['average_rating'] = cls.average_expression(
+                updates.get('rating_sum', F('rating_sum')), updates.get('rating_count', F('rating_count'))
+            )
+        lookup = 'artist_id__in' if isinstance(artist, models.QuerySet) else 'artist_id'
+        cls.objects.filter(**{lookup: artist}).update(**updates)
+
+    @classmethod
+    def refresh(cls, artist_ids):
+        """Recompute the rows of the given users from the source tables"""
+        artist_ids = list(artist_ids)
+        artworks = {
+            row['artist_id']: row for row in Artwork.objects.filter(artist_id__in=artist_ids)
+            .values('artist_id').annotate(count=Count('id'), views=Sum('views'))
+        }
+        likes = dict(
+            Like.objects.filter(artwork__artist_id__in=artist_ids, artwork__deleted_at=None)
+            .values('artwork__artist_id')
+            .annotate(count=Count('id')).values_list('artwork__artist_id', 'count')
+        )
+        ratings = {
+            row['artwork__artist_id']: row for row in ArtworkRating.objects
+            .filter(artwork__artist_id__in=artist_ids, artwork__deleted_at=None).values('artwork__artist_id')
+            .annotate(total=Sum('value'), count=Count('id'))
+        }
+        followers = dict(
+            Follow.objects.filter(followed_id__in=artist_ids, follower__deleted_at=None).values('followed_id')
+            .annotate(count=Count('id')).values_list('followed_id', 'count')
+        )
+        following = dict(
+            Follow.objects.filter(follower_id__in=artist_ids, followed__deleted_at=None).values('follower_id')
+            .annotate(count=Count('id')).values_list('follower_id', 'count')
+        )
+        rows = []
+        for artist_id, username in User.objects.filter(pk__in=artist_ids).values_list('id', 'username'):
+            works = artworks.get(artist_id, {})
+            rating = ratings.get(artist_id, {})
+            rating_sum, rating_count = rating.get('total') or 0, rating.get('count') or 0
+            rows.append(cls(
+                artist_id=artist_id, search_name=username.lower(),
+                artwork_count=works.get('count') or 0, total_views=works.get('views') or 0,
+                total_likes=likes.get(artist_id, 0),
+                rating_sum=rating_sum, rating_count=rating_count,
+                average_rating=rating_sum / rating_count if rating_count else 0,
+                follower_count=followers.get(artist_id, 0),
+                following_count=following.get(artist_id, 0),
+            ))
+        cls.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['artist'],
+            update_fields=[
+                'search_name', 'artwork_count', 'total_views', 'total_likes',
+                'rating_sum', 'rating_count', 'average_rating', 'follower_count', 'following_count',
+            ],
+        )
+        return len(rows)
+
+
+class Follow(models.Model):
+    """follower follows followed; counted on both users' ArtistStats"""
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followed = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Also serves "who does this user follow"
+        unique_together = ('follower', 'followed')
+        indexes = [
+            models.Index(fields=['followed', 'follower'], name='follow_followed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followed_id}"
+
+class FeedItem(models.Model):
+    """
+    A followed artist's artwork in a user's precomputed feed inbox. Only
+    users following more than FEED['MERGE_LIMIT'] artists have an inbox,
+    see base.feed.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    artwork = models.ForeignKey(Artwork, on_delete=models.CASCADE, related_name='+')
+    # Copied from the artwork so a page is one index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'artwork')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-artwork'], name='feed_inbox_idx'),
+        ]
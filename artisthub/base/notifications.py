@@ -0,0 +1,174 @@
+"""
+Real-time notifications pushed to artists over server-sent events.
+
+Likes, comments, ratings and event joins publish to a hub once their
+transaction commits. The hub keeps a short backlog per user so a client
+reconnecting with Last-Event-ID picks up what it missed, and fans each
+event out to that user's open streams. Streams are coroutines waiting on
+a bounded queue, so an idle connection costs no thread and no database
+connection; a consumer that falls a full queue behind is disconnected
+and catches up from the backlog when it reconnects.
+
+Browsers open streams with EventSource, which cannot send an
+Authorization header. They first POST for a stream ticket: a signed user
+ID that only opens the stream and expires after TICKET_SECONDS, so the
+URLs that end up in access logs are useless soon after. Streams are
+held open on the event loop, so they are only served under ASGI.
+
+InProcessHub only reaches streams in its own process. To share events
+between workers, subclass it so publish() hands events to a broker and
+the broker's listener calls deliver() in every process, then point
+NOTIFICATIONS['BACKEND'] at the subclass.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BACKEND': 'base.notifications.InProcessHub',
+    # Events kept per user for Last-Event-ID resumption
+    'BACKLOG': 100,
+    'BACKLOG_USERS': 10000,
+    # Events buffered per stream before a slow consumer is dropped
+    'QUEUE_SIZE': 100,
+    'HEARTBEAT_SECONDS': 15,
+    'RETRY_MS': 3000,
+    # How long a stream ticket can be used to connect
+    'TICKET_SECONDS': 60,
+}
+
+TICKET_SALT = 'base.notifications.stream-ticket'
+
+
+def notification_config():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def stream_ticket(user_id):
+    return signing.dumps(user_id, salt=TICKET_SALT)
+
+
+def ticket_user_id(ticket):
+    """The user a stream ticket was issued to; raises signing.BadSignature if forged or expired"""
+    return signing.loads(ticket, salt=TICKET_SALT, max_age=notification_config()['TICKET_SECONDS'])
+
+
+class Subscriber:
+    """One open stream, fed on the event loop it was created in"""
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, event):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind: end the stream rather than buffer without bound
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class InProcessHub:
+
+    def __init__(self):
+        self._subscribers = {}
+        self._backlogs = OrderedDict()
+        self._lock = threading.Lock()
+        # Microsecond-based so IDs keep increasing across restarts
+        self._ids = itertools.count(time.time_ns() // 1000)
+
+    def publish(self, user_id, kind, data):
+        """Send an event to user_id; safe to call from any thread"""
+        event = {'id': next(self._ids), 'user_id': user_id, 'type': kind, 'data': data}
+        self.deliver(event)
+        return event
+
+    def deliver(self, event):
+        config = notification_config()
+        with self._lock:
+            backlog = self._backlogs.get(event['user_id'])
+            if backlog is None:
+                backlog = self._backlogs[event['user_id']] = deque(maxlen=config['BACKLOG'])
+                while len(self._backlogs) > config['BACKLOG_USERS']:
+                    self._backlogs.popitem(last=False)
+            else:
+                self._backlogs.move_to_end(event['user_id'])
+            backlog.append(event)
+            subscribers = list(self._subscribers.get(event['user_id'], ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # The stream's event loop has shut down
+                self.unsubscribe(subscriber)
+
+    def subscribe(self, user_id, last_event_id=None):
+        """
+        Open a stream for user_id. Returns the subscriber and the backlog
+        events after last_event_id, which the stream must send first.
+        """
+        subscriber = Subscriber(user_id, notification_config()['QUEUE_SIZE'])
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            missed = []
+            if last_event_id is not None:
+                missed = [
+                    event for event in self._backlogs.get(user_id, ())
+                    if event['id'] > last_event_id
+                ]
+        return subscriber, missed
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = import_string(notification_config()['BACKEND'])()
+    return _hub
+
+
+def notify(owner_id, actor, kind, **data):
+    """
+    Tell owner_id that actor did something to their content once the
+    current transaction commits. Actions on your own content are skipped.
+    """
+    if owner_id == actor.pk:
+        return
+    data = {
+        'actor': {'id': actor.pk, 'username': actor.username},
+        'created_at': timezone.now().isoformat(),
+        **data,
+    }
+    transaction.on_commit(lambda: get_hub().publish(owner_id, kind, data))
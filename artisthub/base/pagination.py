@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CommentCursorPagination(CursorPagination):
+    """Newest first; the cursor stays stable while new comments arrive"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+
+class ArtistDirectoryPagination(PageNumberPagination):
+    """Numbered pages, so the Artists page can jump between them"""
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
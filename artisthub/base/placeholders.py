@@ -0,0 +1,135 @@
+"""
+Image dimensions and blurhash placeholders.
+
+Computed once when an image is uploaded and stored next to it, so list
+responses tell the frontend how much room each image needs and give it a
+~30 character blurhash (https://blurha.sh) to paint until the real file
+arrives.
+
+NumPy and Pillow are imported on first use; this module is loaded at
+start-up through base.signals and workers should not pay for them.
+"""
+import math
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+# Image field of each model, which is also the prefix of its metadata columns
+IMAGE_FIELDS = {
+    'base.Artwork': 'image',
+    'base.Event': 'image',
+    'base.User': 'profile_picture',
+}
+
+# How to turn a decoded image upright for each EXIF orientation
+ORIENTATIONS = {
+    2: 'FLIP_LEFT_RIGHT',
+    3: 'ROTATE_180',
+    4: 'FLIP_TOP_BOTTOM',
+    5: 'TRANSPOSE',
+    6: 'ROTATE_270',
+    7: 'TRANSVERSE',
+    8: 'ROTATE_90',
+}
+QUARTER_TURNS = {5, 6, 7, 8}
+
+
+def base83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def srgb_to_linear(values):
+    import numpy as np
+
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(value):
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+def blurhash(pixels, x_components, y_components):
+    """Encode an RGB array of shape (height, width, 3)"""
+    import numpy as np
+
+    height, width, _ = pixels.shape
+    linear = srgb_to_linear(pixels.astype(np.float64))
+    xs = np.cos(np.pi * np.outer(np.arange(x_components), np.arange(width)) / width)
+    ys = np.cos(np.pi * np.outer(np.arange(y_components), np.arange(height)) / height)
+    # factors[j, i] is the colour weight of basis function (i, j)
+    factors = np.einsum('jy,ix,yxc->jic', ys, xs, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+
+    dc = factors[0, 0]
+    ac = [factors[j, i] for j in range(y_components) for i in range(x_components) if i or j]
+
+    result = base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = int(max(0, min(82, math.floor(max(abs(v) for c in ac for v in c) * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += base83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += base83(0, 1)
+    r, g, b = (linear_to_srgb(channel) for channel in dc)
+    result += base83((r << 16) + (g << 8) + b, 4)
+    for colour in ac:
+        r, g, b = (
+            int(max(0, min(18, math.floor(sign_pow(channel / maximum, 0.5) * 9 + 9.5))))
+            for channel in colour
+        )
+        result += base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def image_metadata(fp):
+    """Return (width, height, blurhash) of an image file as displayed"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(fp) as img:
+        width, height = img.size
+        orientation = img.getexif().get(0x0112)
+        # The hash only needs a thumbnail, which JPEGs can decode directly
+        img.draft('RGB', (64, 64))
+        small = img.convert('RGB')
+    small.thumbnail((32, 32))
+    if orientation in ORIENTATIONS:
+        small = small.transpose(Image.Transpose[ORIENTATIONS[orientation]])
+    if orientation in QUARTER_TURNS:
+        width, height = height, width
+    pixels = np.asarray(small)
+    x_components, y_components = (4, 3) if width >= height else (3, 4)
+    return width, height, blurhash(pixels, x_components, y_components)
+
+
+def update_metadata(instance, field_name):
+    """
+    Fill instance's <field>_width/_height/_blurhash from its current file,
+    or clear them if there is none. Returns False if the file is unreadable.
+    """
+    file = getattr(instance, field_name)
+    values = (None, None, '')
+    readable = True
+    if file:
+        try:
+            if file._committed:
+                with file.open('rb'):
+                    values = image_metadata(file)
+            else:
+                # A fresh upload, which the storage still has to save
+                values = image_metadata(file.file)
+                file.file.seek(0)
+        except (OSError, ValueError):
+            readable = False
+    for suffix, value in zip(('width', 'height', 'blurhash'), values):
+        setattr(instance, f'{field_name}_{suffix}', value)
+    return readable
@@ -0,0 +1,192 @@
+"""
+Process-local caches of small, rarely changing reference data.
+
+Every artwork names its gallery and artist, and every comment and event
+its author. Rather than joining those rows into each query, serializers
+look them up here by ID. Each cache is a bounded LRU of rows read from
+the database on a miss, stamped with a generation number kept in the
+Django cache. Saving or deleting a row bumps the generation once its
+transaction commits (see base.signals), and every process sharing that
+cache drops its copy once it notices, at most CHECK_INTERVAL seconds
+later. With a cache local to each process, other workers never see the
+bump, so every copy is also dropped once it is MAX_AGE seconds old.
+Lookups only read the Django cache; it is written only on invalidation.
+
+Lookups, misses and evictions are counted in base.metrics, and stats()
+reports them for a process.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import Gallery, User
+
+DEFAULTS = {
+    # Seconds a process trusts its copy before re-reading the shared generation
+    'CHECK_INTERVAL': 5,
+    # Seconds a process keeps its copy at all
+    'MAX_AGE': 300,
+    # Rows kept per process
+    'GALLERIES_SIZE': 1000,
+    'USERNAMES_SIZE': 50000,
+}
+
+
+# IDs per query when loading misses
+LOAD_BATCH = 900
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'REFERENCE_CACHE', {})}
+
+
+class ReferenceCache:
+    """
+    LRU of load(ids) results by ID. load returns {id: value} for the IDs
+    that exist; missing IDs are looked up again every time.
+    """
+
+    def __init__(self, name, load, load_all=None):
+        self.name = name
+        self.load = load
+        self.load_all = load_all
+        self._local = OrderedDict()
+        self._all = None
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = float('-inf')
+        self._cleared_at = time.monotonic()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @property
+    def generation_key(self):
+        return f'refcache:{self.name}:generation'
+
+    def _check_generation(self, now):
+        """Drop this process's copy if the generation moved on or it is too old; call with the lock held"""
+        config = _config()
+        if now - self._checked_at < config['CHECK_INTERVAL']:
+            return
+        generation = cache.get(self.generation_key, 0)
+        if generation != self._generation or now - self._cleared_at >= config['MAX_AGE']:
+            self._clear(now)
+            self._generation = generation
+        self._checked_at = now
+
+    def _clear(self, now):
+        self._local.clear()
+        self._all = None
+        self._cleared_at = now
+
+    def get_many(self, ids):
+        """{id: value} for the IDs that exist"""
+        found, missing = {}, []
+        with self._lock:
+            self._check_generation(time.monotonic())
+            generation = self._generation
+            for pk in set(ids):
+                if pk in self._local:
+                    self._local.move_to_end(pk)
+                    found[pk] = self._local[pk]
+                elif pk is not None:
+                    missing.append(pk)
+        self._count(len(found), len(missing))
+        if not missing:
+            return found
+
+        loaded = {}
+        for start in range(0, len(missing), LOAD_BATCH):
+            loaded.update(self.load(missing[start:start + LOAD_BATCH]))
+        found.update(loaded)
+        self._store(loaded, generation)
+        return found
+
+    def get(self, pk):
+        return self.get_many([pk]).get(pk)
+
+    def all(self):
+        """Every row, in the order load_all() gave them"""
+        with self._lock:
+            self._check_generation(time.monotonic())
+            generation, ids = self._generation, self._all
+        if ids is None:
+            loaded = self.load_all()
+            self._count(0, len(loaded))
+            self._store(loaded, generation)
+            with self._lock:
+                if self._generation == generation:
+                    self._all = list(loaded)
+            return list(loaded.values())
+        rows = self.get_many(ids)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self._stats['hits'] += hits
+            self._stats['misses'] += misses
+        if hits:
+            metrics.reference_cache_lookups.inc(self.name, 'hit', amount=hits)
+        if misses:
+            metrics.reference_cache_lookups.inc(self.name, 'miss', amount=misses)
+
+    def _store(self, loaded, generation):
+        evicted = 0
+        size = _config()[f'{self.name.upper()}_SIZE']
+        with self._lock:
+            # Rows read before an invalidation may already be stale
+            if self._generation != generation:
+                return
+            self._local.update(loaded)
+            while len(self._local) > size:
+                self._local.popitem(last=False)
+                evicted += 1
+            self._stats['evictions'] += evicted
+        if evicted:
+            metrics.reference_cache_evictions.inc(self.name, amount=evicted)
+
+    def invalidate(self):
+        """Bump the shared generation after a row changed, and drop this process's copy"""
+        cache.add(self.generation_key, 0, None)
+        try:
+            generation = cache.incr(self.generation_key)
+        except ValueError:
+            # Evicted from the shared cache in between
+            generation = None
+        with self._lock:
+            now = time.monotonic()
+            self._clear(now)
+            self._generation = generation
+            self._checked_at = now if generation is not None else float('-inf')
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._local), generation=self._generation)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+GALLERY_FIELDS = ('id', 'name', 'type', 'description', 'created_at', 'slug')
+
+
+def _load_galleries(ids):
+    return {row['id']: row for row in Gallery.objects.filter(pk__in=ids).values(*GALLERY_FIELDS)}
+
+
+def _load_all_galleries():
+    return {row['id']: row for row in Gallery.objects.values(*GALLERY_FIELDS)}
+
+
+def _load_usernames(ids):
+    # Soft-deleted users still sign their comments and artworks
+    return dict(User.all_objects.filter(pk__in=ids).values_list('id', 'username'))
+
+
+# Gallery rows as {field: value} dicts of GALLERY_FIELDS
+galleries = ReferenceCache('galleries', _load_galleries, _load_all_galleries)
+usernames = ReferenceCache('usernames', _load_usernames)
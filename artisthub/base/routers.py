@@ -0,0 +1,102 @@
+"""
+Primary/replica database routing with read-your-writes consistency.
+
+Writes always go to 'default'. Reads go to a healthy alias listed in
+settings.DATABASE_REPLICAS, unless the current request is pinned to the
+primary: ReplicaPinningMiddleware pins requests from users who wrote
+within the last few seconds, and any write pins the rest of its request.
+Outside requests nothing is pinned, but reads inside a transaction on the
+primary, such as the write queue's jobs, stay on the primary.
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+
+# The DatabaseCache table, shared state that must never be read stale
+CACHE_APP_LABEL = 'django_cache'
+
+# Any of these can be overridden in settings.DATABASE_REPLICA_ROUTING
+DEFAULTS = {
+    # How long a user's reads stay on the primary after they write
+    'PIN_SECONDS': 5,
+    'HEALTH_CHECK_INTERVAL': 10,
+}
+
+# Whether the current request must read from the primary. None outside
+# requests, where no middleware would reset it
+pinned = ContextVar('pinned', default=None)
+
+
+def replica_config():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_REPLICA_ROUTING', {})}
+
+
+class ReplicaHealth:
+    """Per-process record of which replicas answered their last ping"""
+
+    def __init__(self):
+        self._checked = {}
+        self._healthy = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            due = now - self._checked.get(alias, float('-inf')) >= replica_config()['HEALTH_CHECK_INTERVAL']
+            if due:
+                # Claim the check so concurrent requests do not all ping
+                self._checked[alias] = now
+        if due:
+            healthy = self.ping(alias)
+            with self._lock:
+                self._healthy[alias] = healthy
+        return self._healthy.get(alias, False)
+
+    def ping(self, alias):
+        # Connecting to a missing SQLite file creates an empty one, so read a
+        # table every migrated database has
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+            return True
+        except DatabaseError:
+            return False
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if pinned.get() or model._meta.app_label == CACHE_APP_LABEL:
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            # A transaction must see its own writes
+            return PRIMARY
+        replicas = [
+            alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+            if health.is_healthy(alias)
+        ]
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if pinned.get() is False and model._meta.app_label != CACHE_APP_LABEL:
+            # Later reads in this request must see what was just written;
+            # the middleware resets this when the request ends
+            pinned.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
@@ -1,19 +1,61 @@
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework import serializers
-from .models import User, Gallery, Artwork, Like, Comment, Event
+from rest_framework.validators import UniqueValidator
+from .models import User, Gallery, Artwork, Like, Comment, Event, ArtistStats
+from . import refcache
 import json
 
+class ReferenceField(serializers.CharField):
+    """
+    A read-only value of a related row, looked up by the instance's
+    foreign key in the named base.refcache cache rather than by loading
+    the row
+    """
+
+    def __init__(self, reference, key, value=None, **kwargs):
+        # By name: DRF deep-copies field arguments, and caches hold a lock
+        self.reference = reference
+        self.key = key
+        self.value = value
+        super().__init__(read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        row = getattr(refcache, self.reference).get(getattr(instance, self.key))
+        if row is None or self.value is None:
+            return row
+        return self.value(row)
+
+def gallery_type_label(gallery):
+    # As Gallery.get_type_display()
+    return dict(Gallery.GALLERY_TYPES).get(gallery['type'], gallery['type'])
+
+
 class UserSerializer(serializers.ModelSerializer):
     name = serializers.CharField(write_only=True, required=False)
     
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'password', 'first_name', 
-                 'last_name', 'is_artist', 'name')
+                 'last_name', 'is_artist', 'name', 'profile_picture',
+                 'profile_picture_width', 'profile_picture_height',
+                 'profile_picture_aspect_ratio', 'profile_picture_blurhash')
         extra_kwargs = {
             'password': {'write_only': True},
             'id': {'read_only': True},
             'first_name': {'read_only': True},
-            'last_name': {'read_only': True}
+            'last_name': {'read_only': True},
+            'profile_picture': {'read_only': True},
+            # create() needs it; the model alone would let it be left out
+            'email': {'required': True},
+            # Against all_objects: a soft-deleted user keeps their username
+            # until purge_deleted removes them
+            'username': {'validators': [
+                UnicodeUsernameValidator(),
+                UniqueValidator(
+                    queryset=User.all_objects.all(),
+                    message=User._meta.get_field('username').error_messages['unique'],
+                ),
+            ]},
         }
 
     def create(self, validated_data):
@@ -25,17 +67,45 @@ class UserSerializer(serializers.ModelSerializer):
             validated_data['first_name'] = name_parts[0]
             validated_data['last_name'] = name_parts[1] if len(name_parts) > 1 else ''
 
-        # Create user with hashed password
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
             is_artist=validated_data.get('is_artist', True)
         )
+        # Hash exactly once: callers that already hashed off the request
+        # thread pass the result as encoded_password to save()
+        encoded_password = validated_data.get('encoded_password')
+        if encoded_password:
+            user.password = encoded_password
+        else:
+            user.set_password(validated_data['password'])
+        user.save()
         return user
 
+class ArtistDirectorySerializer(serializers.ModelSerializer):
+    """An artist's public profile with their precomputed ArtistStats"""
+    id = serializers.IntegerField(source='artist_id', read_only=True)
+    username = serializers.CharField(source='artist.username', read_only=True)
+    bio = serializers.CharField(source='artist.bio', read_only=True)
+    profile_picture = serializers.ImageField(source='artist.profile_picture', read_only=True)
+    profile_picture_width = serializers.IntegerField(source='artist.profile_picture_width', read_only=True)
+    profile_picture_height = serializers.IntegerField(source='artist.profile_picture_height', read_only=True)
+    profile_picture_blurhash = serializers.CharField(source='artist.profile_picture_blurhash', read_only=True)
+    average_rating = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArtistStats
+        fields = [
+            'id', 'username', 'bio', 'profile_picture', 'profile_picture_width',
+            'profile_picture_height', 'profile_picture_blurhash', 'artwork_count',
+            'total_views', 'total_likes', 'average_rating', 'rating_count', 'follower_count',
+        ]
+
+    def get_average_rating(self, obj):
+        return round(obj.average_rating, 2)
+
 class GallerySerializer(serializers.ModelSerializer):
     class Meta:
         model = Gallery
@@ -43,13 +113,20 @@ class GallerySerializer(serializers.ModelSerializer):
         read_only_fields = ['slug']
 
 class ArtworkSerializer(serializers.ModelSerializer):
-    artist_name = serializers.CharField(source='artist.username', read_only=True)
-    likes_count = serializers.IntegerField(source='likes.count', read_only=True)
-    gallery_name = serializers.CharField(source='gallery.name', read_only=True)
-    gallery_type = serializers.CharField(source='gallery.get_type_display', read_only=True)
+    artist_name = ReferenceField('usernames', 'artist_id')
+    likes_count = serializers.SerializerMethodField()
+    gallery_name = ReferenceField('galleries', 'gallery_id', lambda gallery: gallery['name'])
+    gallery_type = ReferenceField('galleries', 'gallery_id', gallery_type_label)
     comments = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+    image_aspect_ratio = serializers.FloatField(read_only=True)
     
+    def get_likes_count(self, obj) -> int:
+        # Views that serialize several artworks annotate likes_total
+        likes_total = getattr(obj, 'likes_total', None)
+        return obj.likes.count() if likes_total is None else likes_total
+
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -57,7 +134,11 @@ class ArtworkSerializer(serializers.ModelSerializer):
         return False
 
     def get_comments(self, obj):
-        comments = obj.comments.all()
+        # Top-level comments only; replies are read through comments/<id>/replies/.
+        # List views prefetch them into top_level_comments
+        comments = getattr(obj, 'top_level_comments', None)
+        if comments is None:
+            comments = obj.comments.filter(parent=None).order_by('id')
         return CommentSerializer(comments, many=True).data
 
     class Meta:
@@ -65,30 +146,61 @@ class ArtworkSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'artist', 'artist_name', 'gallery', 'gallery_name',
             'gallery_type', 'image', 'description', 'status', 'created_at',
-            'updated_at', 'slug', 'likes_count', 'is_liked', 'comments'
+            'updated_at', 'slug', 'likes_count', 'is_liked', 'comments',
+            'average_rating', 'rating_count', 'bayesian_score',
+            'image_width', 'image_height', 'image_aspect_ratio', 'image_blurhash'
         ]
-        read_only_fields = ['slug', 'artist']
+        read_only_fields = ['slug', 'artist', 'rating_count', 'bayesian_score']
 
 class CommentSerializer(serializers.ModelSerializer):
-    user_name = serializers.CharField(source='user.username', read_only=True)
+    user_name = ReferenceField('usernames', 'user_id')
     
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'user_name', 'artwork', 'content', 'created_at', 'updated_at']
+        fields = [
+            'id', 'user', 'user_name', 'artwork', 'content', 'created_at', 'updated_at',
+            'parent', 'depth', 'reply_count'
+        ]
         read_only_fields = ['user']
 
+    def validate(self, data):
+        if self.instance is not None:
+            # The materialized path is fixed once a comment exists
+            if any(
+                field in data and data[field] != getattr(self.instance, field)
+                for field in ('parent', 'artwork')
+            ):
+                raise serializers.ValidationError("Comments cannot be moved to another thread")
+            return data
+        parent = data.get('parent')
+        if parent:
+            if parent.artwork_id != data['artwork'].id:
+                raise serializers.ValidationError("Replies must be on the same artwork as their parent")
+            if parent.depth + 1 > Comment.MAX_DEPTH:
+                raise serializers.ValidationError("This thread is too deeply nested to reply to")
+        return data
+
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ['id', 'user', 'artwork', 'created_at']
         read_only_fields = ['user']
 
+class EventCalendarSerializer(serializers.ModelSerializer):
+    """The fields a calendar view places events with; needs no extra queries"""
+    status = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Event
+        fields = ['id', 'title', 'slug', 'location', 'start_date', 'end_date', 'status', 'categories']
+
 class EventSerializer(serializers.ModelSerializer):
-    created_by_name = serializers.CharField(source='created_by.username', read_only=True)
+    created_by_name = ReferenceField('usernames', 'created_by_id')
     status = serializers.CharField(read_only=True)
     participants_count = serializers.SerializerMethodField()
     is_joined = serializers.SerializerMethodField()
     participants = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    image_aspect_ratio = serializers.FloatField(read_only=True)
     
     class Meta:
         model = Event
@@ -97,7 +209,8 @@ class EventSerializer(serializers.ModelSerializer):
             'end_date', 'image', 'created_by', 'created_by_name', 
             'created_at', 'updated_at', 'slug', 'max_participants',
             'categories', 'requirements', 'status', 'participants_count',
-            'is_joined', 'participants'
+            'is_joined', 'participants',
+            'image_width', 'image_height', 'image_aspect_ratio', 'image_blurhash'
         ]
         read_only_fields = ['slug', 'created_by', 'status']
 
@@ -0,0 +1,168 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import feed, placeholders, refcache
+from .authentication import user_cache
+from .models import User, Gallery, Artwork, ArtistStats, Follow, Like, Comment, ArtworkRating, Event
+from .notifications import notify
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop cached copies of a user once a change or deletion commits"""
+    # Before the commit, a reader could cache the old row under the new version
+    transaction.on_commit(partial(user_cache.invalidate, instance.pk))
+
+
+# Reference caches are invalidated once the change commits; before that, a
+# reader could still load the old row and store it under the new generation
+@receiver(post_save, sender=User)
+def invalidate_cached_username(sender, instance, created, update_fields, **kwargs):
+    # New users are not cached yet, and most saves (logins, profile
+    # pictures) name the fields they change
+    if not created and (update_fields is None or 'username' in update_fields):
+        transaction.on_commit(refcache.usernames.invalidate)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_username(sender, instance, **kwargs):
+    transaction.on_commit(refcache.usernames.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Gallery)
+def invalidate_cached_galleries(sender, instance, **kwargs):
+    transaction.on_commit(refcache.galleries.invalidate)
+
+
+@receiver(post_save, sender=User)
+def sync_artist_stats(sender, instance, created, update_fields, **kwargs):
+    """Give every new user a directory row and keep its search name current"""
+    search_name = instance.username.lower()
+    if created:
+        ArtistStats.objects.create(artist=instance, search_name=search_name)
+    elif update_fields is None or 'username' in update_fields:
+        ArtistStats.objects.filter(artist_id=instance.pk).exclude(
+            search_name=search_name
+        ).update(search_name=search_name)
+
+
+@receiver(post_save, sender=Artwork)
+def count_artwork(sender, instance, created, **kwargs):
+    if created:
+        ArtistStats.apply(
+            instance.artist_id, artwork_count=1, total_views=instance.views,
+            rating_sum=instance.rating_sum, rating_count=instance.rating_count,
+        )
+        feed.published(instance)
+
+
+@receiver(pre_delete, sender=Artwork)
+def uncount_artwork(sender, instance, **kwargs):
+    # The rating totals are kept with UPDATEs, so the instance may be stale.
+    # Its likes uncount themselves as they are deleted
+    totals = Artwork.objects.filter(pk=instance.pk).values('views', 'rating_sum', 'rating_count').first()
+    if totals:
+        ArtistStats.apply(
+            instance.artist_id, artwork_count=-1, total_views=-totals['views'],
+            rating_sum=-totals['rating_sum'], rating_count=-totals['rating_count'],
+        )
+
+
+@receiver(post_save, sender=Like)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        ArtistStats.apply(instance.artwork.artist_id, total_likes=1)
+
+
+@receiver(post_delete, sender=Like)
+def uncount_like(sender, instance, **kwargs):
+    # A subquery, so deleting an artwork's likes does not load the artwork per like
+    ArtistStats.apply(
+        Artwork.objects.filter(pk=instance.artwork_id).values('artist_id'), total_likes=-1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        ArtistStats.apply(instance.follower_id, following_count=1)
+        ArtistStats.apply(instance.followed_id, follower_count=1)
+        feed.followed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    ArtistStats.apply(instance.follower_id, following_count=-1)
+    ArtistStats.apply(instance.followed_id, follower_count=-1)
+    feed.unfollowed(instance)
+
+
+@receiver(pre_save)
+def store_image_metadata(sender, instance, **kwargs):
+    """Measure newly uploaded images before they are saved"""
+    field_name = placeholders.IMAGE_FIELDS.get(sender._meta.label)
+    if field_name is None:
+        return
+    file = getattr(instance, field_name)
+    if file and not file._committed:
+        placeholders.update_metadata(instance, field_name)
+    elif not file and getattr(instance, f'{field_name}_blurhash'):
+        placeholders.update_metadata(instance, field_name)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_reply(sender, instance, **kwargs):
+    # Comment.save() counts new replies. Deleting a thread fires this for
+    # every comment in it, so surviving ancestors lose one per deleted reply
+    if instance.parent_id:
+        Comment.objects.filter(pk__in=instance.ancestor_ids).update(
+            reply_count=F('reply_count') - 1
+        )
+
+
+def artwork_summary(artwork):
+    return {'artwork': {'id': artwork.pk, 'slug': artwork.slug, 'title': artwork.title}}
+
+
+@receiver(post_save, sender=Like)
+def notify_like(sender, instance, created, **kwargs):
+    if created:
+        notify(instance.artwork.artist_id, instance.user, 'like', **artwork_summary(instance.artwork))
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if created:
+        notify(
+            instance.artwork.artist_id, instance.user, 'comment',
+            comment={'id': instance.pk, 'content': instance.content[:200]},
+            **artwork_summary(instance.artwork),
+        )
+
+
+@receiver(post_save, sender=ArtworkRating)
+def notify_rating(sender, instance, **kwargs):
+    notify(
+        instance.artwork.artist_id, instance.user, 'rating',
+        value=instance.value, **artwork_summary(instance.artwork),
+    )
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def notify_event_join(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.joined_events.add(...)
+        pairs = [(event, instance) for event in Event.objects.filter(pk__in=pk_set)]
+    else:
+        pairs = [(instance, user) for user in User.objects.filter(pk__in=pk_set)]
+    for event, user in pairs:
+        notify(
+            event.created_by_id, user, 'event_join',
+            event={'id': event.pk, 'slug': event.slug, 'title': event.title},
+        )
@@ -1,3 +1,1323 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import ical, notifications, refcache, routers
+from .authentication import user_cache
+from .benchmark import auth_header
+from .middleware import QueryRecorder, current_recorder
+from .models import (
+    ArtistStats, Artwork, ArtworkImageHash, ArtworkRating, ArtworkSimilarity, ArtworkTrend, Comment, Event,
+    FeedItem, Follow, Gallery, Like, User,
+)
+from .serializers import ArtworkSerializer, EventSerializer, GallerySerializer
+from .views import filter_events_by_status
+from .writequeue import WriteQueue, WriteTimeout
+
+# Import time budget for a cold worker, in milliseconds. Workers are
+# autoscaled, so this is part of every scale-up; raise it deliberately.
+IMPORT_BUDGET_MS = int(os.environ.get('ARTISTHUB_IMPORT_BUDGET_MS', 1500))
+
+# This repo's heavy imports, which it loads on first use, never at start-up.
+# Only modules the code here imports belong in the list: whether a library
+# pulls in another when it is installed is up to the environment
+LAZY_MODULES = [
+    'drf_spectacular.views', 'drf_spectacular.generators',
+    'numpy', 'scipy', 'PIL.Image',
+]
+
+COLD_START = '''
+import sys
+from {module} import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print('\\n'.join(sys.modules))
+'''
+
+
+class WorkerImportTimeTest(SimpleTestCase):
+    """Profile a worker's cold start with python -X importtime"""
+
+    def cold_start(self, module):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', COLD_START.format(module=module)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        timings = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or '[us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        return timings, set(result.stdout.split())
+
+    def check_cold_start(self, module):
+        timings, loaded = self.cold_start(module)
+        total_ms = sum(self_us for self_us, _ in timings.values()) / 1000
+        slowest = sorted(timings.items(), key=lambda item: -item[1][1])[:10]
+        self.assertLess(total_ms, IMPORT_BUDGET_MS, 'Slowest imports (cumulative ms): ' + ', '.join(
+            f'{name} {cumulative_us / 1000:.0f}' for name, (_, cumulative_us) in slowest
+        ))
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, loaded, f'{name} is imported at worker start-up')
+
+    def test_wsgi_cold_start(self):
+        self.check_cold_start('artisthub.wsgi')
+
+    def test_asgi_cold_start(self):
+        self.check_cold_start('artisthub.asgi')
+
+
+class RowSerializerOutputTest(TestCase):
+    """The list endpoints' row serializers must match the DRF serializers byte for byte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'password')
+        artist = User.objects.create_user('ärtist', 'artist@example.com', 'password', is_artist=True)
+        gone = User.objects.create_user('gone', 'gone@example.com', 'password')
+        photos = Gallery.objects.create(name='Fotografía', type='PHOTO', slug='photos', description='Line\u2028break')
+        other = Gallery.objects.create(name='Other', type='UNKNOWN', slug='other')
+        first = Artwork.objects.create(
+            title='Ça va \u2029 "quoted" \\ \x07', slug='first', artist=artist, gallery=photos,
+            image='artworks/first.jpg', description='ünïcode 🎨', rating_sum=14, rating_count=3,
+            bayesian_score=3.8125, image_width=1200, image_height=900, image_blurhash='LEHV6nWB2yk8',
+        )
+        Artwork.objects.create(
+            title='Untitled', slug='second', artist=cls.viewer, gallery=other, image='',
+            description='', status='completed',
+        )
+        Like.objects.create(user=cls.viewer, artwork=first)
+        Like.objects.create(user=gone, artwork=first)
+        thread = Comment.objects.create(user=cls.viewer, artwork=first, content='Lovely')
+        Comment.objects.create(user=artist, artwork=first, content='Merci\n', parent=thread)
+        event = Event.objects.create(
+            title='Opening', slug='opening', description='Doors at 7', location='Kigali',
+            start_date=now + timedelta(days=3), end_date=now + timedelta(days=4),
+            created_by=artist, categories=['art', 'música'], image='events/opening.png',
+            image_width=640, image_height=0,
+        )
+        Event.objects.create(
+            title='Past', slug='past', description='', location='', created_by=cls.viewer,
+            start_date=now - timedelta(days=9), end_date=now - timedelta(days=8),
+        )
+        # Joined out of ID order
+        event.participants.add(artist, gone, cls.viewer)
+        gone.soft_delete()
+
+    def drf_bytes(self, serializer_class, queryset, path, user=None, with_request=True):
+        request = Request(APIRequestFactory().get(path))
+        if user is not None:
+            request.user = user
+        context = {'request': request} if with_request else {}
+        return JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+
+    def assertSameOutput(self, path, expected, user=None):
+        response = self.client.get(path, **(auth_header(user) if user else {}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected)
+
+    def test_artworks(self):
+        for user in (None, self.viewer):
+            expected = self.drf_bytes(ArtworkSerializer, Artwork.objects.all(), '/api/artworks/', user)
+            self.assertSameOutput('/api/artworks/', expected, user)
+        self.assertSameOutput('/api/public/artworks/', self.drf_bytes(
+            ArtworkSerializer, Artwork.objects.all(), '/api/public/artworks/',
+        ))
+
+    def test_replies_are_not_nested(self):
+        # Replies are read through comments/<id>/replies/
+        artwork = self.client.get('/api/artworks/first/', **auth_header(self.viewer)).json()
+        self.assertEqual([comment['content'] for comment in artwork['comments']], ['Lovely'])
+        self.assertEqual(artwork['comments'][0]['reply_count'], 1)
+        artworks = self.client.get('/api/public/artworks/').json()
+        self.assertEqual([len(artwork['comments']) for artwork in artworks], [1, 0])
+
+    def test_top_rated(self):
+        queryset = Artwork.objects.order_by('-bayesian_score')
+        for user in (None, self.viewer):
+            expected = self.drf_bytes(ArtworkSerializer, queryset, '/api/artworks/top_rated/', user)
+            self.assertSameOutput('/api/artworks/top_rated/', expected, user)
+
+    def test_gallery_artworks(self):
+        expected = self.drf_bytes(
+            ArtworkSerializer, Artwork.objects.filter(gallery__slug='photos'), '', with_request=False,
+        )
+        self.assertSameOutput('/api/galleries/photos/artworks/', expected, self.viewer)
+        self.assertSameOutput('/api/public/galleries/photos/artworks/', expected)
+
+    def test_galleries(self):
+        expected = self.drf_bytes(GallerySerializer, Gallery.objects.all(), '/api/galleries/')
+        self.assertSameOutput('/api/galleries/', expected)
+
+    def test_events(self):
+        for query, status, ordering in [('', None, None), ('?status=upcoming&ordering=-status', 'upcoming', '-status')]:
+            queryset = filter_events_by_status(Event.objects.all(), status, ordering)
+            for user in (None, self.viewer):
+                expected = self.drf_bytes(EventSerializer, queryset, f'/api/events/{query}', user)
+                self.assertSameOutput(f'/api/events/{query}', expected, user)
+            expected = self.drf_bytes(EventSerializer, queryset, f'/api/public/events/{query}')
+            self.assertSameOutput(f'/api/public/events/{query}', expected)
+
+    def test_participants_order(self):
+        artist = User.objects.get(username='ärtist')
+        expected = sorted([self.viewer.pk, artist.pk])
+        self.assertEqual(self.client.get('/api/events/opening/').json()['participants'], expected)
+        for path in ('/api/events/', '/api/public/events/'):
+            event = next(event for event in self.client.get(path).json() if event['slug'] == 'opening')
+            self.assertEqual(event['participants'], expected, path)
+
+
+
+class SoftDeleteTest(TestCase):
+    """Soft-deleted rows are hidden but keep their usernames and slugs until purged"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        cls.artwork = Artwork.objects.create(
+            title='Sunset', slug='sunset', artist=cls.bob, gallery=gallery, image='artworks/sunset.jpg',
+        )
+        now = timezone.now()
+        cls.event = Event.objects.create(
+            title='Opening', slug='opening', description='', location='', created_by=cls.bob,
+            start_date=now + timedelta(days=1), end_date=now + timedelta(days=2),
+        )
+
+    def test_deleted_user_is_hidden(self):
+        response = self.client.delete('/api/users/bob/', **auth_header(self.bob))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(username='bob').exists())
+        self.assertFalse(User.all_objects.get(username='bob').is_active)
+        self.assertEqual(self.client.get('/api/artworks/sunset/').status_code, 404)
+        self.assertEqual(self.client.get('/api/events/opening/').status_code, 404)
+        self.assertEqual(self.client.get('/api/artworks/').json(), [])
+        self.assertTrue(Artwork.all_objects.filter(slug='sunset').exists())
+        self.assertFalse(ArtistStats.objects.filter(artist=self.bob).exists())
+
+    def test_deleted_username_stays_taken(self):
+        self.bob.soft_delete()
+        response = self.client.post('/api/register/', {
+            'username': 'bob', 'email': 'new@example.com', 'password': 'another-password',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.json())
+
+    def test_deleted_slug_stays_taken(self):
+        self.event.soft_delete()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        now = timezone.now()
+        response = self.client.post('/api/events/', {
+            'title': 'Opening', 'description': 'Again', 'location': 'Kigali',
+            'start_date': (now + timedelta(days=5)).isoformat(),
+            'end_date': (now + timedelta(days=6)).isoformat(),
+        }, content_type='application/json', **auth_header(owner))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['slug'], 'opening-1')
+
+
+class PurgeDeletedTest(TestCase):
+    """purge_deleted removes dependents and recomputes the totals they fed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('artist', 'artist@example.com', 'password')
+        cls.fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        cls.kept = Artwork.objects.create(
+            title='Kept', slug='kept', artist=cls.artist, gallery=gallery, image='artworks/kept.jpg',
+        )
+        cls.fans_own = Artwork.objects.create(
+            title='Fan art', slug='fan-art', artist=cls.fan, gallery=gallery, image='artworks/fan.jpg',
+        )
+        Like.objects.create(user=cls.fan, artwork=cls.kept)
+        Like.objects.create(user=cls.artist, artwork=cls.fans_own)
+        for user, value in ((cls.fan, 5), (cls.artist, 3)):
+            ArtworkRating.objects.create(user=user, artwork=cls.kept, value=value)
+        ArtworkRating.objects.create(user=cls.artist, artwork=cls.fans_own, value=4)
+        Artwork.objects.filter(pk=cls.kept.pk).update(rating_sum=8, rating_count=2)
+        Artwork.objects.filter(pk=cls.fans_own.pk).update(rating_sum=4, rating_count=1)
+        # A thread on the kept artwork with the fan's reply in the middle
+        cls.thread = Comment.objects.create(user=cls.artist, artwork=cls.kept, content='Thoughts?')
+        reply = Comment.objects.create(user=cls.fan, artwork=cls.kept, content='Yes', parent=cls.thread)
+        Comment.objects.create(user=cls.artist, artwork=cls.kept, content='Thanks', parent=reply)
+        Comment.objects.create(user=cls.artist, artwork=cls.fans_own, content='Nice')
+        Follow.objects.create(follower=cls.fan, followed=cls.artist)
+        Follow.objects.create(follower=cls.artist, followed=cls.fan)
+        ArtistStats.refresh([cls.artist.pk, cls.fan.pk])
+
+    def purge(self):
+        call_command('purge_deleted', stdout=StringIO())
+
+    def test_purge_user(self):
+        self.fan.soft_delete()
+        self.purge()
+
+        self.assertFalse(User.all_objects.filter(pk=self.fan.pk).exists())
+        self.assertFalse(Artwork.all_objects.filter(pk=self.fans_own.pk).exists())
+        self.assertFalse(Like.objects.filter(user=self.fan).exists())
+        self.assertFalse(Like.objects.filter(artwork_id=self.fans_own.pk).exists())
+        self.assertFalse(ArtworkRating.objects.filter(user=self.fan).exists())
+        self.assertFalse(Follow.objects.exists())
+        # The fan's reply goes with the reply below it
+        self.assertEqual(list(Comment.objects.values_list('content', flat=True)), ['Thoughts?'])
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.reply_count, 0)
+
+        self.kept.refresh_from_db()
+        self.assertEqual((self.kept.rating_sum, self.kept.rating_count), (3, 1))
+        self.assertAlmostEqual(self.kept.bayesian_score, Artwork.bayesian_expression(3, 1))
+        stats = ArtistStats.objects.get(artist=self.artist)
+        self.assertEqual((stats.artwork_count, stats.total_likes), (1, 0))
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.average_rating), (3, 1, 3.0))
+        self.assertEqual((stats.follower_count, stats.following_count), (0, 0))
+
+    def test_purge_artwork(self):
+        self.kept.soft_delete()
+        self.purge()
+
+        self.assertFalse(Artwork.all_objects.filter(pk=self.kept.pk).exists())
+        self.assertFalse(Like.objects.filter(artwork_id=self.kept.pk).exists())
+        self.assertFalse(ArtworkRating.objects.filter(artwork_id=self.kept.pk).exists())
+        self.assertFalse(Comment.objects.filter(artwork_id=self.kept.pk).exists())
+        self.assertTrue(User.objects.filter(pk=self.artist.pk).exists())
+        stats = ArtistStats.objects.get(artist=self.artist)
+        self.assertEqual((stats.artwork_count, stats.total_likes, stats.rating_count), (0, 0, 0))
+        self.assertEqual(stats.follower_count, 1)
+
+    def test_live_rows_are_kept(self):
+        self.purge()
+        self.assertEqual(Artwork.all_objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 4)
+        self.assertEqual(ArtworkRating.objects.count(), 3)
+
+
+class ArtistStatsBackfillTest(TestCase):
+    """Migrations 0019 and 0021 fill in what users who predate ArtistStats lack"""
+
+    def test_backfill(self):
+        artist = User.objects.create_user('Artist', 'artist@example.com', 'password')
+        fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        gone = User.objects.create_user('gone', 'gone@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        artwork = Artwork.objects.create(
+            title='Work', slug='work', artist=artist, gallery=gallery, image='artworks/work.jpg', views=7,
+        )
+        Like.objects.create(user=fan, artwork=artwork)
+        ArtworkRating.objects.create(user=fan, artwork=artwork, value=4)
+        Follow.objects.create(follower=fan, followed=artist)
+        gone.soft_delete()
+        # As before the table existed, except for a row the signals keep current
+        ArtistStats.objects.exclude(artist=fan).delete()
+        ArtistStats.objects.filter(artist=fan).update(total_likes=9)
+
+        migration = importlib.import_module('base.migrations.0019_backfill_artist_stats')
+        migration.backfill_artist_stats(apps, None)
+
+        stats = ArtistStats.objects.get(artist=artist)
+        self.assertEqual(stats.search_name, 'artist')
+        self.assertEqual((stats.artwork_count, stats.total_views, stats.total_likes), (1, 7, 1))
+        self.assertEqual((stats.rating_sum, stats.rating_count, stats.average_rating), (4, 1, 4.0))
+        self.assertEqual((stats.follower_count, stats.following_count), (1, 0))
+        self.assertEqual(ArtistStats.objects.get(artist=fan).total_likes, 9)
+        self.assertFalse(ArtistStats.objects.filter(artist=gone).exists())
+
+    @override_settings(FEED={'MERGE_LIMIT': 1})
+    def test_feed_inboxes(self):
+        fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        for name in ('first', 'second'):
+            artist = User.objects.create_user(name, f'{name}@example.com', 'password')
+            Artwork.objects.create(
+                title=name, slug=name, artist=artist, gallery=gallery, image=f'artworks/{name}.jpg',
+            )
+            Follow.objects.create(follower=fan, followed=artist)
+        # Followed before ArtistStats existed, so no inbox was built
+        FeedItem.objects.all().delete()
+        ArtistStats.objects.all().delete()
+
+        importlib.import_module('base.migrations.0019_backfill_artist_stats').backfill_artist_stats(apps, None)
+        self.assertEqual(self.client.get('/api/feed/', **auth_header(fan)).json()['results'], [])
+        importlib.import_module('base.migrations.0021_fill_feed_inboxes').fill_feed_inboxes(apps, None)
+
+        response = self.client.get('/api/feed/', **auth_header(fan))
+        self.assertEqual([artwork['slug'] for artwork in response.json()['results']], ['second', 'first'])
+
+
+
+class ArtworkRankingTest(TestCase):
+    """The ranked artwork lists and the rating endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rater', 'rater@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        cls.artworks = [
+            Artwork.objects.create(
+                title=f'Artwork {n}', slug=f'artwork-{n}', artist=cls.user, gallery=gallery,
+                image=f'artworks/{n}.jpg',
+            )
+            for n in range(3)
+        ]
+
+    def assertLimits(self, path, default):
+        for limit, count in (('', default), ('?limit=2', 2), ('?limit=-5', 1), ('?limit=0', 1), ('?limit=x', default)):
+            response = self.client.get(f'{path}{limit}')
+            self.assertEqual(response.status_code, 200, limit)
+            self.assertEqual(len(response.json()), count, limit)
+
+    def test_top_rated_limit(self):
+        self.assertLimits('/api/artworks/top_rated/', 3)
+
+    def test_trending(self):
+        for artwork, score in zip(self.artworks, (2.0, 0.5, ArtworkTrend.MIN_SCORE / 2)):
+            ArtworkTrend.objects.create(artwork=artwork, gallery_type='PHOTO', score=score)
+        # The last one has decayed out of the ranking
+        self.assertLimits('/api/artworks/trending/', 2)
+        slugs = [artwork['slug'] for artwork in self.client.get('/api/artworks/trending/').json()]
+        self.assertEqual(slugs, ['artwork-0', 'artwork-1'])
+
+    def test_similar_limit(self):
+        source, *others = self.artworks
+        for artwork, score in zip(others, (0.9, 0.4)):
+            ArtworkSimilarity.objects.create(artwork=source, similar=artwork, score=score)
+        self.assertLimits('/api/artworks/artwork-0/similar/', 2)
+        # Hidden neighbours are skipped, and a missing or hidden artwork has none
+        self.artworks[1].soft_delete()
+        self.assertEqual(len(self.client.get('/api/artworks/artwork-0/similar/').json()), 1)
+        self.assertEqual(self.client.get('/api/artworks/missing/similar/').status_code, 404)
+        source.soft_delete()
+        self.assertEqual(self.client.get('/api/artworks/artwork-0/similar/').status_code, 404)
+
+    @override_settings(WRITE_QUEUE={'ENABLED': False})
+    def test_views_counted(self):
+        for path in ('/api/artworks/artwork-0/', '/api/public/artworks/artwork-0/'):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertEqual(Artwork.objects.get(slug='artwork-0').views, 2)
+        self.assertEqual(ArtistStats.objects.get(artist=self.user).total_views, 2)
+        response = self.client.get('/api/dashboard/stats/', **auth_header(self.user))
+        self.assertEqual(response.json()['totalViews'], 2)
+
+    def test_rate_replaces_rating(self):
+        for value, expected in ((4, (4, 1)), (2, (2, 1))):
+            response = self.client.post(
+                '/api/artworks/artwork-0/rate/', {'value': value},
+                content_type='application/json', **auth_header(self.user),
+            )
+            self.assertEqual(response.status_code, 200)
+            artwork = Artwork.objects.get(slug='artwork-0')
+            self.assertEqual((artwork.rating_sum, artwork.rating_count), expected)
+        stats = ArtistStats.objects.get(artist=self.user)
+        self.assertEqual((stats.rating_sum, stats.rating_count), (2, 1))
+
+
+def image_file(name, size=(120, 80), flip=False, format='PNG'):
+    """An uploadable horizontal gradient; flipped, it hashes very differently"""
+    from PIL import Image
+
+    image = Image.linear_gradient('L').resize(size).rotate(90, expand=False).convert('RGB')
+    if flip:
+        image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    buffer = BytesIO()
+    image.save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class ArtworkUploadTest(TestCase):
+    """What creating an artwork computes from the uploaded image"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('artist', 'artist@example.com', 'password')
+        cls.gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_root = override_settings(MEDIA_ROOT=self.media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def upload(self, title, image):
+        response = self.client.post('/api/artworks/', {
+            'title': title, 'description': 'A picture', 'gallery': self.gallery.pk, 'image': image,
+        }, **auth_header(self.artist))
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_possible_duplicates(self):
+        original = self.upload('Original', image_file('original.png'))
+        self.assertEqual(original['possible_duplicates'], [])
+        # Re-encoded and resized, it is still the same picture
+        copy = self.upload('Copy', image_file('copy.jpg', size=(240, 160), format='JPEG'))
+        self.assertEqual(
+            [(duplicate['slug'], duplicate['artist_name']) for duplicate in copy['possible_duplicates']],
+            [('original', 'artist')],
+        )
+        self.assertEqual(self.upload('Mirror', image_file('mirror.png', flip=True))['possible_duplicates'], [])
+        self.assertEqual(ArtworkImageHash.objects.count(), 3)
+
+    def test_image_metadata(self):
+        created = self.upload('Wide', image_file('wide.png', size=(120, 80)))
+        self.assertEqual((created['image_width'], created['image_height'], created['image_aspect_ratio']), (120, 80, 1.5))
+        # 'L' encodes the 4x3 components of a landscape image, which take 28 characters
+        self.assertEqual((created['image_blurhash'][0], len(created['image_blurhash'])), ('L', 28))
+        artwork = Artwork.objects.get(slug='wide')
+        self.assertEqual(
+            (artwork.image_width, artwork.image_height, artwork.image_blurhash),
+            (120, 80, created['image_blurhash']),
+        )
+        self.assertNotEqual(
+            self.upload('Mirror', image_file('mirror.png', size=(120, 80), flip=True))['image_blurhash'],
+            artwork.image_blurhash,
+        )
+
+
+class CommentThreadTest(TestCase):
+    """Replies keep their thread's path and counts, and stay in it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        cls.artwork, cls.other = (
+            Artwork.objects.create(
+                title=slug, slug=slug, artist=cls.user, gallery=gallery, image=f'artworks/{slug}.jpg',
+            )
+            for slug in ('work', 'other')
+        )
+
+    def post(self, content, parent=None, artwork=None):
+        return self.client.post('/api/comments/', {
+            'artwork': (artwork or self.artwork).pk, 'content': content, 'parent': parent,
+        }, content_type='application/json', **auth_header(self.user))
+
+    def test_replies(self):
+        root = self.post('Thoughts?').json()
+        reply = self.post('Yes', parent=root['id']).json()
+        nested = self.post('Agreed', parent=reply['id']).json()
+        sibling = self.post('No', parent=root['id']).json()
+        self.assertEqual([c['depth'] for c in (root, reply, nested, sibling)], [0, 1, 2, 1])
+
+        comments = Comment.objects.in_bulk()
+        self.assertEqual(comments[nested['id']].path, f"{root['id']:010d}/{reply['id']:010d}/{nested['id']:010d}/")
+        self.assertEqual(comments[root['id']].reply_count, 3)
+        self.assertEqual(comments[reply['id']].reply_count, 1)
+        response = self.client.get(f"/api/comments/{root['id']}/replies/", **auth_header(self.user))
+        self.assertEqual([c['content'] for c in response.json()], ['Yes', 'Agreed', 'No'])
+
+    def test_reply_on_another_artwork(self):
+        root = self.post('Thoughts?').json()
+        response = self.post('Elsewhere', parent=root['id'], artwork=self.other)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Comment.objects.get(pk=root['id']).reply_count, 0)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_max_depth(self):
+        parent = None
+        with mock.patch.object(Comment, 'MAX_DEPTH', 2):
+            for depth in range(3):
+                parent = self.post(f'Level {depth}', parent=parent).json()['id']
+            response = self.post('Too deep', parent=parent)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Comment.objects.count(), 3)
+
+
+@override_settings(WRITE_QUEUE={'ENABLED': False})
+class LikeTest(TestCase):
+    """PUT and DELETE on artworks/<slug>/like/ are idempotent"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('artist', 'artist@example.com', 'password')
+        cls.fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        cls.artwork = Artwork.objects.create(
+            title='Work', slug='work', artist=cls.artist, gallery=gallery, image='artworks/work.jpg',
+        )
+
+    def send(self, method, slug='work'):
+        return getattr(self.client, method)(f'/api/artworks/{slug}/like/', **auth_header(self.fan))
+
+    def total_likes(self):
+        return ArtistStats.objects.get(artist=self.artist).total_likes
+
+    def test_put_and_delete_repeat(self):
+        with mock.patch('base.likes.notify') as notify:
+            for changed in (True, False, False):
+                response = self.send('put')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), {'status': 'liked', 'changed': changed, 'likes_count': 1})
+                self.assertEqual(self.total_likes(), 1)
+        # Only the PUT that created the like notifies
+        self.assertEqual(notify.call_count, 1)
+        self.assertEqual(notify.call_args.args[:3], (self.artist.pk, mock.ANY, 'like'))
+
+        for changed in (True, False):
+            response = self.send('delete')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'status': 'unliked', 'changed': changed, 'likes_count': 0})
+            self.assertEqual(self.total_likes(), 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_missing_artwork(self):
+        for method in ('put', 'delete'):
+            self.assertEqual(self.send(method, slug='missing').status_code, 404)
+        self.artwork.soft_delete()
+        self.assertEqual(self.send('put').status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+
+@override_settings(WRITE_QUEUE={'ENABLED': False})
+class FollowFeedTest(TestCase):
+    """Following and unfollowing, and the feed it builds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        cls.artists = [
+            User.objects.create_user(name, f'{name}@example.com', 'password', is_artist=True)
+            for name in ('ann', 'bob', 'cat', 'dan')
+        ]
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        start = timezone.now() - timedelta(days=1)
+        # Interleaved across artists, with a tie on created_at that id breaks
+        for minute, artist in enumerate([0, 1, 2, 0, 1, 2, 0, 3]):
+            artwork = Artwork.objects.create(
+                title=f'Work {minute}', slug=f'work-{minute}', artist=cls.artists[artist], gallery=gallery,
+                image=f'artworks/{minute}.jpg',
+            )
+            Artwork.objects.filter(pk=artwork.pk).update(created_at=start + timedelta(minutes=min(minute, 5)))
+
+    def follow(self, artist):
+        return self.client.post(f'/api/users/{artist.username}/follow/', **auth_header(self.fan))
+
+    def read_feed(self, size):
+        """Slugs of every page of the fan's feed, following the cursors"""
+        pages = []
+        path = f'/api/feed/?page_size={size}'
+        while path:
+            response = self.client.get(path, **auth_header(self.fan))
+            self.assertEqual(response.status_code, 200)
+            pages.append([artwork['slug'] for artwork in response.json()['results']])
+            path = response.json()['next']
+        return pages
+
+    def expected(self, artists):
+        return list(
+            Artwork.objects.filter(artist__in=artists).order_by('-created_at', '-id').values_list('slug', flat=True)
+        )
+
+    def test_follow_toggle(self):
+        ann = self.artists[0]
+        for result, count in (('followed', 1), ('unfollowed', 0), ('followed', 1)):
+            response = self.follow(ann)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'status': result, 'follower_count': count})
+            self.assertEqual(ArtistStats.objects.get(artist=ann).follower_count, count)
+            self.assertEqual(ArtistStats.objects.get(artist=self.fan).following_count, count)
+        self.assertEqual(Follow.objects.filter(follower=self.fan).count(), 1)
+
+        response = self.client.post('/api/users/fan/follow/', **auth_header(self.fan))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ArtistStats.objects.get(artist=self.fan).follower_count, 0)
+
+    def test_merged_page(self):
+        for artist in self.artists[:3]:
+            self.follow(artist)
+        self.assertFalse(FeedItem.objects.exists())
+        expected = self.expected(self.artists[:3])
+        self.assertEqual(len(expected), 7)
+        pages = self.read_feed(3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.client.get('/api/feed/?cursor=nonsense', **auth_header(self.fan))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(FEED={'MERGE_LIMIT': 2})
+    def test_inbox_above_merge_limit(self):
+        ann, bob, cat, dan = self.artists
+        self.follow(ann)
+        self.follow(bob)
+        self.assertFalse(FeedItem.objects.exists())
+        # The third follow crosses the limit and builds the inbox
+        self.follow(cat)
+        self.assertEqual(FeedItem.objects.filter(owner=self.fan).count(), 7)
+        self.assertEqual(sum(self.read_feed(3), []), self.expected([ann, bob, cat]))
+        self.follow(dan)
+        self.assertEqual(sum(self.read_feed(3), []), self.expected([ann, bob, cat, dan]))
+
+        # New artworks are fanned out once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Artwork.objects.create(
+                title='New', slug='new', artist=bob, gallery=Gallery.objects.get(), image='artworks/new.jpg',
+            )
+        self.assertEqual(self.read_feed(20)[0][0], 'new')
+
+        # Back under the limit, the inbox is dropped and the feed merged again
+        self.follow(dan)
+        self.follow(cat)
+        self.assertFalse(FeedItem.objects.exists())
+        self.assertEqual(sum(self.read_feed(3), []), self.expected([ann, bob]))
+
+
+class ArtistDirectoryTest(TestCase):
+    """users/directory/: numbered pages, prefix search, no deleted artists"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Alice', 'alfred', 'albert', 'bob', 'carol'):
+            User.objects.create_user(name, f'{name}@example.com', 'password')
+        User.objects.create_user('alan', 'alan@example.com', 'password', is_artist=False)
+        User.objects.get(username='albert').soft_delete()
+
+    def usernames(self, query):
+        response = self.client.get(f'/api/users/directory/?ordering=username&{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages(self):
+        first = self.usernames('page_size=3')
+        self.assertEqual(first['count'], 4)
+        self.assertEqual([artist['username'] for artist in first['results']], ['alfred', 'Alice', 'bob'])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([artist['username'] for artist in second['results']], ['carol'])
+        self.assertIsNone(second['next'])
+
+    def test_search(self):
+        everyone = ['alfred', 'Alice', 'bob', 'carol']
+        for search, expected in (('AL', ['alfred', 'Alice']), ('alice', ['Alice']), ('lice', []), ('', everyone)):
+            results = self.usernames(f'search={search}')['results']
+            self.assertEqual([artist['username'] for artist in results], expected, search)
+
+
+
+def artists_only(user):
+    return user.is_artist
+
+
+class TokenObtainPairTest(TransactionTestCase):
+    """Login through authenticate(), with its signals"""
+
+    # Committed, because the hashing pool's threads read through their own connections
+    def setUp(self):
+        self.user = User.objects.create_user('login', 'login@example.com', 'password')
+
+    def login(self, body):
+        return self.client.post('/api/token/', body, content_type='application/json')
+
+    def test_login(self):
+        response = self.login({'username': 'login', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'refresh', 'access'})
+        # SIMPLE_JWT leaves UPDATE_LAST_LOGIN off
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        with self.settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'UPDATE_LAST_LOGIN': True}):
+            self.assertEqual(self.login({'username': 'login', 'password': 'password'}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_authentication_rule(self):
+        rule = 'base.tests.artists_only'
+        self.assertEqual(self.login({'username': 'login', 'password': 'password'}).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_artist=False)
+        with self.settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'USER_AUTHENTICATION_RULE': rule}):
+            self.assertEqual(self.login({'username': 'login', 'password': 'password'}).status_code, 401)
+
+    def test_rejected(self):
+        failed = []
+
+        def record(credentials, **kwargs):
+            failed.append(credentials['username'])
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        User.objects.create_user('inactive', 'inactive@example.com', 'password', is_active=False)
+        for username, password in (('login', 'wrong'), ('nobody', 'password'), ('inactive', 'password')):
+            self.assertEqual(self.login({'username': username, 'password': password}).status_code, 401)
+        self.assertEqual(failed, ['login', 'nobody', 'inactive'])
+
+    def test_malformed(self):
+        for body in ([1], '"text"', {'username': 'login'}, {'username': ['login'], 'password': 'password'}):
+            self.assertEqual(self.login(body).status_code, 400, body)
+
+
+
+class RegisterTest(TestCase):
+
+    def register(self, body):
+        return self.client.post('/api/register/', body, content_type='application/json')
+
+    def test_password_is_hashed_once(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as hashed, \
+                mock.patch('base.hashing.make_password', wraps=make_password) as pooled:
+            response = self.register({'username': 'new', 'email': 'New@Example.COM', 'password': 'password'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((pooled.call_count, hashed.call_count), (1, 0))
+        user = User.objects.get(username='new')
+        self.assertEqual(user.email, 'New@example.com')
+        self.assertTrue(user.check_password('password'))
+
+    def test_missing_email(self):
+        response = self.register({'username': 'new', 'password': 'password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()), ['email'])
+        self.assertFalse(User.all_objects.filter(username='new').exists())
+
+
+class EventStatusTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user('creator', 'creator@example.com', 'password')
+        now = timezone.now()
+        for slug, start, end in [
+            ('later', 5, 6), ('soon', 1, 2), ('now', -1, 1), ('ended', -4, -3), ('long-ago', -9, -8),
+            ('cancelled', 3, 4),
+        ]:
+            Event.objects.create(
+                title=slug, slug=slug, description='', location='', created_by=cls.creator,
+                start_date=now + timedelta(days=start), end_date=now + timedelta(days=end),
+            )
+        Event.objects.get(slug='cancelled').soft_delete()
+
+    def slugs(self, query):
+        response = self.client.get(f'/api/events/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [event['slug'] for event in response.json()]
+
+    def test_filter_by_status(self):
+        for query, label, expected in [
+            ('upcoming', Event.UPCOMING, ['soon', 'later']),
+            ('In%20Progress', Event.IN_PROGRESS, ['now']),
+            ('COMPLETED', Event.COMPLETED, ['long-ago', 'ended']),
+        ]:
+            events = self.client.get(f'/api/events/?status={query}&ordering=start_date').json()
+            self.assertEqual([event['slug'] for event in events], expected, query)
+            self.assertEqual({event['status'] for event in events}, {label}, query)
+        # An unknown status filters nothing
+        self.assertEqual(len(self.slugs('status=postponed')), 5)
+
+    def test_order_by_status(self):
+        expected = ['soon', 'later', 'now', 'long-ago', 'ended']
+        self.assertEqual(self.slugs('ordering=status'), expected)
+        self.assertEqual(self.slugs('ordering=-status'), expected[::-1])
+
+    def test_summary(self):
+        response = self.client.get('/api/events/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'total': 5,
+            'statuses': {Event.UPCOMING: 2, Event.IN_PROGRESS: 1, Event.COMPLETED: 2},
+        })
+
+    def test_status_after_update(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'password')
+        now = timezone.now()
+        Event.objects.create(
+            title='Past', slug='past', description='', location='', created_by=owner,
+            start_date=now - timedelta(days=9), end_date=now - timedelta(days=8),
+        )
+        response = self.client.patch('/api/events/past/', {
+            'start_date': (now + timedelta(days=1)).isoformat(),
+            'end_date': (now + timedelta(days=2)).isoformat(),
+        }, content_type='application/json', **auth_header(owner))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], Event.UPCOMING)
+        self.assertEqual(self.client.get('/api/events/past/').json()['status'], Event.UPCOMING)
+
+
+
+class ReferenceCacheTest(TestCase):
+
+    def setUp(self):
+        self.names = {1: 'one', 2: 'two', 3: 'three'}
+        self.loaded = []
+
+    def process_cache(self):
+        """A cache as another worker process would hold it"""
+        def load(ids):
+            self.loaded.extend(sorted(ids))
+            return {pk: self.names[pk] for pk in ids if pk in self.names}
+        return refcache.ReferenceCache('usernames', load)
+
+    @override_settings(REFERENCE_CACHE={'USERNAMES_SIZE': 2})
+    def test_least_recently_used_are_evicted(self):
+        cache = self.process_cache()
+        self.assertEqual(cache.get_many([1, 2]), {1: 'one', 2: 'two'})
+        cache.get(1)
+        self.assertEqual(cache.get(3), 'three')
+        self.assertEqual(cache.get(1), 'one')
+        self.assertEqual(cache.get(2), 'two')
+        self.assertEqual(self.loaded, [1, 2, 3, 2])
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['hits'], stats['misses']), (2, 2, 2, 4))
+
+    @override_settings(REFERENCE_CACHE={'CHECK_INTERVAL': 0})
+    def test_invalidation_reaches_other_processes(self):
+        reader, writer = self.process_cache(), self.process_cache()
+        self.assertEqual(reader.get(1), 'one')
+        self.names[1] = 'uno'
+        self.assertEqual(reader.get(1), 'one')
+        writer.invalidate()
+        self.assertEqual(reader.get(1), 'uno')
+
+    @override_settings(REFERENCE_CACHE={'CHECK_INTERVAL': 0, 'MAX_AGE': 0})
+    def test_expires_without_invalidation(self):
+        # As under a per-process CACHES, where another worker's bump is never seen
+        cache = self.process_cache()
+        self.assertEqual(cache.get(1), 'one')
+        self.names[1] = 'uno'
+        self.assertEqual(cache.get(1), 'uno')
+
+    def test_lookups_do_not_write(self):
+        user = User.objects.create_user('viewer', 'viewer@example.com', 'password')
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        Artwork.objects.create(title='Work', slug='work', artist=user, gallery=gallery, image='artworks/work.jpg')
+        refcache.usernames.invalidate()
+        refcache.galleries.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/artworks/', **auth_header(user)).status_code, 200)
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_invalidated_on_commit(self):
+        gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+        self.assertEqual(refcache.galleries.get(gallery.pk)['name'], 'Photos')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            gallery.name = 'Photography'
+            gallery.save()
+            self.assertEqual(refcache.galleries.get(gallery.pk)['name'], 'Photos')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(refcache.galleries.get(gallery.pk)['name'], 'Photography')
+
+
+
+class UserCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear_local()
+
+    def test_warm_request_reads_nothing(self):
+        user = User.objects.create_user('cached', 'cached@example.com', 'password')
+        headers = auth_header(user)
+        # Every request is past LOCAL_TTL, so the version is checked each time
+        with override_settings(AUTH_USER_CACHE={'LOCAL_TTL': 0}):
+            self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 200)
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as queries, \
+                        mock.patch.object(LocMemCache, 'set') as cache_set, \
+                        mock.patch.object(LocMemCache, 'add') as cache_add:
+                    self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 200)
+                self.assertEqual([query['sql'] for query in queries if 'FROM "base_user"' in query['sql']], [])
+                cache_set.assert_not_called()
+                cache_add.assert_not_called()
+
+    def test_deactivated_user_is_rejected(self):
+        user = User.objects.create_user('cached', 'cached@example.com', 'password')
+        headers = auth_header(user)
+        self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 401)
+
+
+    def test_deactivated_by_admin_action(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        user = User.objects.create_user('cached', 'cached@example.com', 'password')
+        headers = auth_header(user)
+        self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 200)
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/base/user/', {
+                'action': 'deactivate', '_selected_action': [user.pk],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get('/api/users/me/', **headers).status_code, 401)
+
+
+
+class NotificationStreamTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('listener', 'listener@example.com', 'password')
+
+    def setUp(self):
+        # IDs are reused across tests, which the cached users predate
+        cache.clear()
+        user_cache.clear_local()
+
+    def ticket(self):
+        response = self.client.post('/api/notifications/ticket/', **auth_header(self.user))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ticket(self):
+        self.assertEqual(self.client.post('/api/notifications/ticket/').status_code, 401)
+        ticket = self.ticket()
+        self.assertEqual(notifications.ticket_user_id(ticket['ticket']), self.user.pk)
+        url = urlsplit(ticket['url'])
+        self.assertEqual(url.path, '/api/notifications/stream/')
+        self.assertEqual(parse_qs(url.query)['ticket'], [ticket['ticket']])
+        # Only good for the stream
+        response = self.client.get('/api/users/me/', HTTP_AUTHORIZATION=f"Bearer {ticket['ticket']}")
+        self.assertEqual(response.status_code, 401)
+
+    def test_not_served_under_wsgi(self):
+        response = self.client.get('/api/notifications/stream/', **auth_header(self.user))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream(self):
+        ticket = await sync_to_async(self.ticket)()
+        response = await self.async_client.get('/api/notifications/stream/', {'ticket': ticket['ticket']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue((await anext(aiter(response.streaming_content))).startswith(b'retry: '))
+        await response.streaming_content.aclose()
+
+    async def test_rejected_tickets(self):
+        ticket = (await sync_to_async(self.ticket)())['ticket']
+        with self.settings(NOTIFICATIONS={'TICKET_SECONDS': -1}):
+            response = await self.async_client.get('/api/notifications/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+        # The access token is no longer accepted in the query string
+        access_token = auth_header(self.user)['HTTP_AUTHORIZATION'].split()[1]
+        for params in ({'ticket': ticket + 'x'}, {'token': access_token}, {}):
+            response = await self.async_client.get('/api/notifications/stream/', params)
+            self.assertEqual(response.status_code, 401, params)
+
+    def revoked_credentials(self, change):
+        """A ticket and an access token issued before their user was deactivated or deleted"""
+        user = User.objects.create_user(change, f'{change}@example.com', 'password')
+        response = self.client.post('/api/notifications/ticket/', **auth_header(user))
+        credentials = [({'ticket': response.json()['ticket']}, {}), ({}, auth_header(user))]
+        with self.captureOnCommitCallbacks(execute=True):
+            if change == 'deactivate':
+                user.is_active = False
+                user.save(update_fields=['is_active'])
+            else:
+                user.soft_delete()
+        return credentials
+
+    async def test_inactive_users(self):
+        for change in ('deactivate', 'soft_delete'):
+            for params, headers in await sync_to_async(self.revoked_credentials)(change):
+                response = await self.async_client.get('/api/notifications/stream/', params, **headers)
+                self.assertEqual(response.status_code, 401, (change, params))
+
+
+
+@override_settings(WRITE_QUEUE={'TIMEOUT': 0.2, 'RETRIES': 0})
+class WriteQueueTest(SimpleTestCase):
+    databases = {'default'}
+
+    def test_queued_write_is_dropped_on_timeout(self):
+        queue, release, ran = WriteQueue(), threading.Event(), []
+        self.addCleanup(release.set)
+        blocking = queue.submit(lambda: release.wait(5))
+        with self.assertRaises(WriteTimeout):
+            queue.run(lambda: ran.append('late'))
+        release.set()
+        blocking.result(5)
+        self.assertEqual(queue.run(lambda: 'next'), 'next')
+        self.assertEqual(ran, [])
+
+    def test_running_write_is_waited_for(self):
+        self.assertEqual(WriteQueue().run(lambda: time.sleep(0.4) or 'written'), 'written')
+
+    def test_queries_count_against_the_request(self):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            WriteQueue().run(lambda: User.objects.exists())
+        finally:
+            current_recorder.reset(token)
+        self.assertGreaterEqual(recorder.count, 1)
+
+
+
+class EventCalendarTest(TestCase):
+    """events/calendar/ takes a bounded [from, to) range"""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = User.objects.create_user('creator', 'creator@example.com', 'password')
+        for slug, start, end in [
+            ('before', '2026-03-01T10:00', '2026-03-31T18:00'),
+            ('spans-start', '2026-03-20T10:00', '2026-04-02T18:00'),
+            ('inside', '2026-04-10T10:00', '2026-04-10T18:00'),
+            ('after', '2026-05-01T00:00', '2026-05-01T18:00'),
+        ]:
+            Event.objects.create(
+                title=slug, slug=slug, description='', location='', created_by=creator,
+                start_date=timezone.make_aware(datetime.fromisoformat(start)),
+                end_date=timezone.make_aware(datetime.fromisoformat(end)),
+            )
+
+    def calendar(self, start, end):
+        return self.client.get(f'/api/events/calendar/?from={start}&to={end}')
+
+    def test_range(self):
+        response = self.calendar('2026-04-01', '2026-05-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['slug'] for event in response.json()], ['spans-start', 'inside'])
+        # 2026 is not a leap year, so this is exactly CALENDAR_MAX_DAYS
+        self.assertEqual(self.calendar('2026-01-01', '2027-01-02').status_code, 200)
+
+    def test_bad_ranges(self):
+        for start, end in [
+            ('2026-01-01', '2027-01-03'), ('', '2026-04-01'), ('2026-04-01', ''), ('yesterday', '2026-04-01'),
+            ('2026-02-30', '2026-04-01'), ('2026-04-01', '2026-04-01'), ('2026-04-02', '2026-04-01'),
+        ]:
+            response = self.calendar(start, end)
+            self.assertEqual(response.status_code, 400, (start, end))
+            self.assertEqual(response.json()['status'], 'error')
+
+
+class CalendarFeedTest(TestCase):
+    """Feed URLs work until the user rotates their calendar secret"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'password')
+
+    def setUp(self):
+        # IDs are reused across tests, which the cached users predate
+        cache.clear()
+        user_cache.clear_local()
+
+    def feed_path(self):
+        response = self.client.get('/api/events/calendar/feed/', **auth_header(self.user))
+        self.assertEqual(response.status_code, 200)
+        return urlsplit(response.json()['url']).path
+
+    def test_rotate(self):
+        old = self.feed_path()
+        self.assertEqual(self.client.get(old).status_code, 200)
+        self.assertEqual(self.feed_path(), old)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/events/calendar/feed/rotate/', **auth_header(self.user))
+        self.assertEqual(response.status_code, 200)
+        new = urlsplit(response.json()['url']).path
+        self.assertNotEqual(new, old)
+        self.assertEqual(self.client.get(old).status_code, 404)
+        self.assertEqual(self.client.get(new).status_code, 200)
+        self.assertEqual(self.feed_path(), new)
+
+    def test_forged_token(self):
+        self.user.calendar_secret = 'guessed'
+        token = ical.feed_token(self.user)
+        self.assertEqual(self.client.get(f'/api/events/calendar/{token}.ics').status_code, 404)
+        self.assertEqual(self.client.get('/api/events/calendar/junk.ics').status_code, 404)
+
+
+class AdminChangelistTest(TestCase):
+    """Changelists run the same queries however many rows the page shows"""
+
+    CHANGELISTS = ['user', 'artwork', 'comment', 'like', 'event']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.gallery = Gallery.objects.create(name='Photos', type='PHOTO', slug='photos')
+
+    def add_rows(self, count):
+        now = timezone.now()
+        for _ in range(count):
+            n = User.all_objects.count()
+            artist = User.objects.create_user(f'artist-{n}', f'artist-{n}@example.com', 'password')
+            artwork = Artwork.objects.create(
+                title=f'Work {n}', slug=f'work-{n}', artist=artist, gallery=self.gallery,
+                image=f'artworks/{n}.jpg',
+            )
+            Comment.objects.create(user=self.admin, artwork=artwork, content='Lovely')
+            Like.objects.create(user=self.admin, artwork=artwork)
+            Event.objects.create(
+                title=f'Show {n}', slug=f'show-{n}', description='', location='', created_by=artist,
+                start_date=now, end_date=now + timedelta(days=1),
+            )
+
+    def query_counts(self):
+        counts = {}
+        for name in self.CHANGELISTS:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/admin/base/{name}/')
+            self.assertEqual(response.status_code, 200, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_counts(self):
+        self.client.force_login(self.admin)
+        self.add_rows(2)
+        few = self.query_counts()
+        self.add_rows(8)
+        self.assertEqual(self.query_counts(), few)
+
+
+class MetricsAccessTest(TestCase):
+    """/metrics is for staff and for scrapers holding the token"""
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_staff(self):
+        user = User.objects.create_user('member', 'member@example.com', 'password')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_token(self):
+        with self.settings(PERFORMANCE_MONITORING={'METRICS_TOKEN': 's3cret'}):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'# TYPE', response.content)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 403)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """Writes pin the rest of a request to the primary, and only a request"""
+
+    def test_write_pins_request(self):
+        token = routers.pinned.set(False)
+        try:
+            self.assertEqual(routers.ReplicaRouter().db_for_write(User), routers.PRIMARY)
+            self.assertIs(routers.pinned.get(), True)
+        finally:
+            routers.pinned.reset(token)
+        self.assertIsNone(routers.pinned.get())
+
+    def test_write_outside_request(self):
+        # e.g. on the write queue's thread, where nothing would unpin it
+        routers.ReplicaRouter().db_for_write(User)
+        self.assertIsNone(routers.pinned.get())
+
+
+class ImportCatalogTest(TestCase):
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.media)
+        media_root = override_settings(MEDIA_ROOT=self.media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        with open(os.path.join(self.source, 'sunset.jpg'), 'wb') as fh:
+            fh.write(b'image')
+        self.path = os.path.join(self.source, 'catalog.ndjson')
+
+    def write(self, *records):
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            for record in records:
+                fh.write(json.dumps(record) + '\n')
+
+    def run_import(self, *args):
+        stdout = StringIO()
+        call_command('import_catalog', self.path, '--media-source', self.source,
+                     '--workers', '2', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def records(self, artist='painter'):
+        return [
+            {'model': 'user', 'username': 'painter', 'email': 'painter@example.com'},
+            {'model': 'gallery', 'name': 'Photos', 'type': 'PHOTO'},
+            {'model': 'artwork', 'title': 'Sunset', 'artist': 'painter', 'gallery': 'photos'},
+            {'model': 'artwork', 'title': 'Sunset', 'artist': artist, 'gallery': 'photos', 'image': 'sunset.jpg'},
+        ]
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media) for name in names]
+
+    def test_resume_after_failure(self):
+        # The second batch fails on its unknown artist
+        self.write(*self.records(artist='nobody'))
+        with self.assertRaisesMessage(CommandError, "Row 4: unknown artist 'nobody'"):
+            self.run_import('--batch-size', '3')
+        self.assertEqual(list(Artwork.objects.values_list('slug', flat=True)), ['sunset'])
+        self.assertEqual(self.stored_files(), [])
+
+        self.write(*self.records())
+        self.run_import('--batch-size', '3')
+        self.run_import('--batch-size', '3')
+        self.assertEqual(sorted(Artwork.objects.values_list('slug', flat=True)), ['sunset', 'sunset-1'])
+        self.assertEqual(Gallery.objects.count(), 1)
+        self.assertEqual(len(self.stored_files()), 1)
+
+        self.run_import('--restart')
+        self.assertEqual(Artwork.objects.count(), 4)
+
+    def test_duplicate_slugs_are_rejected(self):
+        records = self.records()
+        for record in records[2:]:
+            record['slug'] = 'sunset'
+        self.write(*records)
+        with self.assertRaisesMessage(CommandError, "Row 4: duplicate artwork slug 'sunset'"):
+            self.run_import()
+        self.assertFalse(User.objects.filter(username='painter').exists())
+        self.assertEqual(self.stored_files(), [])
+
+        # Rows whose slug was imported before are skipped
+        del records[3]
+        self.write(*records)
+        self.run_import()
+        self.run_import('--restart')
+        self.assertEqual(list(Artwork.objects.values_list('slug', flat=True)), ['sunset'])
+
+    @override_settings(FEED={'MERGE_LIMIT': 0})
+    def test_signal_side_effects(self):
+        artist = User.objects.create_user('artist', 'artist@example.com', 'password')
+        fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        Follow.objects.create(follower=fan, followed=artist)
+        self.write(*self.records(artist='artist'))
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.run_import()
+
+        # Totals of imported users and of existing artists with new artworks
+        painter = User.objects.get(username='painter')
+        self.assertEqual(ArtistStats.objects.get(artist=painter).artwork_count, 1)
+        self.assertEqual(ArtistStats.objects.get(artist=artist).artwork_count, 1)
+        self.assertEqual(ArtistStats.objects.get(artist=fan).following_count, 1)
+        self.assertEqual(
+            list(FeedItem.objects.filter(owner=fan).values_list('artwork__artist', flat=True)), [artist.pk],
+        )
+        self.assertIn('Copied 1 images', output)
+        self.assertIn('backfill_image_metadata', output)
+        self.assertIn('index_image_hashes', output)
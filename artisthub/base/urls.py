@@ -1,10 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from . import views
+from rest_framework_simplejwt.views import TokenRefreshView
+from . import views, async_views
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
@@ -15,9 +12,17 @@ router.register(r'events', views.EventViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', async_views.token_obtain_pair, name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('register/', views.RegisterView.as_view(), name='register'),
+    path('register/', async_views.register, name='register'),
+    path('public/artworks/', async_views.artwork_list, name='public-artwork-list'),
+    path('public/artworks/<slug:slug>/', async_views.artwork_detail, name='public-artwork-detail'),
+    path('public/galleries/<slug:slug>/artworks/', async_views.gallery_artworks, name='public-gallery-artworks'),
+    path('public/events/', async_views.event_list, name='public-event-list'),
+    path('events/calendar/<str:token>.ics', async_views.event_calendar_feed, name='event-calendar-feed'),
+    path('notifications/stream/', async_views.notification_stream, name='notification-stream'),
+    path('notifications/ticket/', views.notification_ticket, name='notification-ticket'),
+    path('feed/', views.following_feed, name='following-feed'),
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
     path('dashboard/activities/', views.dashboard_activities, name='dashboard-activities'),
     path('dashboard/analytics/', views.dashboard_analytics, name='dashboard-analytics'),
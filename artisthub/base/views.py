@@ -1,35 +1,52 @@
-from rest_framework import viewsets, permissions, status, generics
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import User, Gallery, Artwork, Like, Comment, Event
+from .models import (
+    User, Gallery, Artwork, Like, Comment, Event, ArtworkRating, ArtworkTrend, ArtworkSimilarity,
+    ArtworkImageHash, ArtistStats, Follow
+)
 from .serializers import (
-    UserSerializer, GallerySerializer, ArtworkSerializer,
-    CommentSerializer, LikeSerializer, EventSerializer
+    UserSerializer, GallerySerializer, ArtworkSerializer, ArtistDirectorySerializer,
+    CommentSerializer, LikeSerializer, EventSerializer, EventCalendarSerializer
 )
-from rest_framework_simplejwt.views import TokenObtainPairView
+import hmac
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.contrib.auth.hashers import make_password
 from django.utils.text import slugify
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import Http404
-from django.urls import re_path
-from urllib.parse import unquote
-from django.db.models import Count, Avg, Sum
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.urls import re_path, reverse
+from urllib.parse import unquote, urlencode
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Avg, Sum, F, Case, When, Value, Prefetch
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from . import feed, ical, imagehash, likes, notifications, metrics as performance_metrics
+from .authentication import LiteJWTAuthentication
+from .pagination import ArtistDirectoryPagination, CommentCursorPagination
+from .renderers import FastJSONRenderer
+from .rowserializers import ArtworkRows, EventRows, GalleryRows
+from .writequeue import write_queue
 
-class RegisterView(generics.CreateAPIView):
-    """Register a new user"""
-    queryset = User.objects.all()
-    permission_classes = (permissions.AllowAny,)
-    serializer_class = UserSerializer
+# ?ordering= values of the artist directory; each is backed by an index on ArtistStats
+ARTIST_ORDERING = {
+    'username': ['search_name'],
+    'artwork_count': ['-artwork_count', 'artist_id'],
+    'total_views': ['-total_views', 'artist_id'],
+    'total_likes': ['-total_likes', 'artist_id'],
+    'average_rating': ['-average_rating', 'artist_id'],
+}
 
-    def perform_create(self, serializer):
-        # Hash the password before saving
-        password = serializer.validated_data.get('password')
-        serializer.validated_data['password'] = make_password(password)
-        return super().perform_create(serializer)
+def parse_limit(request, default, maximum=100):
+    """?limit= clamped to 1..maximum, or default when it is not a number"""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        return default
+    return max(1, min(limit, maximum))
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -41,7 +58,7 @@ class UserViewSet(viewsets.ModelViewSet):
     lookup_value_regex = '[^/]+'  # Allow any character except forward slash
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'directory']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -53,6 +70,50 @@ class UserViewSet(viewsets.ModelViewSet):
         artists = User.objects.filter(is_artist=True)
         serializer = UserSerializer(artists, many=True)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def follow(self, request, username=None):
+        """Follow or unfollow a user"""
+        user = self.get_object()
+        if user.pk == request.user.pk:
+            return Response({
+                'status': 'error',
+                'message': 'You cannot follow yourself'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        def toggle():
+            with transaction.atomic():
+                follow, created = Follow.objects.get_or_create(follower=request.user, followed=user)
+                if not created:
+                    follow.delete()
+                    return 'unfollowed'
+                return 'followed'
+
+        result = write_queue.run(toggle)
+        follower_count = ArtistStats.objects.filter(artist=user).values_list(
+            'follower_count', flat=True
+        ).first() or 0
+        return Response({'status': result, 'follower_count': follower_count})
+
+    @action(detail=False, methods=['get'])
+    def directory(self, request):
+        """
+        Artists with their stats, a page at a time. ?ordering= takes a key of
+        ARTIST_ORDERING (most first; default total_likes) and ?search= matches
+        the start of the username, ignoring case.
+        """
+        ordering = ARTIST_ORDERING.get(
+            request.query_params.get('ordering'), ARTIST_ORDERING['total_likes']
+        )
+        stats = ArtistStats.objects.filter(artist__is_artist=True).select_related('artist')
+        search = request.query_params.get('search', '').strip().lower()
+        if search:
+            # A range on the indexed column, which a LIKE could not use on every backend
+            stats = stats.filter(search_name__gte=search, search_name__lt=f'{search}\U0010ffff')
+        paginator = ArtistDirectoryPagination()
+        page = paginator.paginate_queryset(stats.order_by(*ordering), request, view=self)
+        serializer = ArtistDirectorySerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -68,6 +129,10 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = ArtworkSerializer(artworks, many=True)
         return Response(serializer.data)
 
+    def perform_destroy(self, instance):
+        # Hidden now with their artworks and events, removed by purge_deleted
+        instance.soft_delete()
+
     def get_object(self):
         """
         Returns the object the view is displaying.
@@ -92,6 +157,7 @@ class GalleryViewSet(viewsets.ModelViewSet):
     queryset = Gallery.objects.all()
     serializer_class = GallerySerializer
     lookup_field = 'slug'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -100,6 +166,10 @@ class GalleryViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def list(self, request, *args, **kwargs):
+        # GallerySerializer's output, from the process's gallery cache
+        return Response(GalleryRows(request).all())
+
     def create(self, request, *args, **kwargs):
         """Create a new gallery with proper slug handling"""
         serializer = self.get_serializer(data=request.data)
@@ -122,9 +192,8 @@ class GalleryViewSet(viewsets.ModelViewSet):
     def artworks(self, request, slug=None):
         """List artworks in a gallery"""
         gallery = self.get_object()
-        artworks = gallery.artworks.all()
-        serializer = ArtworkSerializer(artworks, many=True)
-        return Response(serializer.data)
+        # As ArtworkSerializer without a request: relative image URLs, nothing liked
+        return Response(ArtworkRows().serialize(gallery.artworks.all()))
 
 class ArtworkViewSet(viewsets.ModelViewSet):
     """
@@ -134,32 +203,87 @@ class ArtworkViewSet(viewsets.ModelViewSet):
     serializer_class = ArtworkSerializer
     lookup_field = 'slug'
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'top_rated', 'trending', 'similar']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def list(self, request, *args, **kwargs):
+        # ArtworkSerializer's output, built from .values() rows
+        return Response(ArtworkRows(request).serialize(self.filter_queryset(self.get_queryset())))
+
+    def retrieve(self, request, *args, **kwargs):
+        artwork = self.get_object()
+        # Counted on the writer thread without holding up the response
+        write_queue.submit(lambda: Artwork.record_view(artwork.pk, artwork.artist_id))
+        return Response(self.get_serializer(artwork).data)
+
     def create(self, request, *args, **kwargs):
         """Create a new artwork with proper slug handling"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        image_hash = self._hash_image(serializer.validated_data['image'])
+        duplicates = imagehash.find_duplicates(image_hash) if image_hash is not None else []
         
         # Handle potential slug conflicts
         base_title = request.data.get('title')
         slug = slugify(base_title)
         counter = 1
-        while Artwork.objects.filter(slug=slug).exists():
+        # Soft-deleted artworks keep their slugs until purge_deleted runs
+        while Artwork.all_objects.filter(slug=slug).exists():
             slug = f"{slugify(base_title)}-{counter}"
             counter += 1
         
         serializer.validated_data['slug'] = slug
-        serializer.save(artist=request.user)
+        artwork = serializer.save(artist=request.user)
+        if image_hash is not None:
+            imagehash.hash_row(artwork.id, image_hash).save()
         
         headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        return Response({
+            **serializer.data,
+            'possible_duplicates': self._describe_duplicates(duplicates),
+        }, status=status.HTTP_201_CREATED, headers=headers)
+
+    def perform_update(self, serializer):
+        artwork = serializer.save()
+        if 'image' in serializer.validated_data:
+            image_hash = self._hash_image(artwork.image)
+            ArtworkImageHash.objects.filter(artwork=artwork).delete()
+            if image_hash is not None:
+                imagehash.hash_row(artwork.id, image_hash).save()
+
+    def perform_destroy(self, instance):
+        # Hidden now, removed by purge_deleted
+        instance.soft_delete()
+
+    def _hash_image(self, image):
+        try:
+            return imagehash.dhash(image)
+        except OSError:
+            return None
+        finally:
+            image.seek(0)
+
+    def _describe_duplicates(self, duplicates):
+        """Existing artworks whose image looks the same as the upload"""
+        artworks = Artwork.objects.select_related('artist').in_bulk(
+            [artwork_id for artwork_id, _ in duplicates]
+        )
+        return [
+            {
+                'id': artwork_id,
+                'slug': artworks[artwork_id].slug,
+                'title': artworks[artwork_id].title,
+                'artist_name': artworks[artwork_id].artist.username,
+                'distance': distance,
+            }
+            for artwork_id, distance in duplicates if artwork_id in artworks
+        ]
 
     def get_queryset(self):
         """Filter artworks based on query parameters"""
@@ -181,26 +305,149 @@ class ArtworkViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post', 'put', 'delete'])
     def like(self, request, slug=None):
-        """Like or unlike an artwork"""
+        """
+        POST toggles the like. PUT likes and DELETE unlikes, idempotently,
+        and both return the artwork's like count.
+        """
+        if request.method in ('PUT', 'DELETE'):
+            change = likes.like if request.method == 'PUT' else likes.unlike
+            result = write_queue.run(lambda: change(request.user, slug))
+            if result is None:
+                raise Http404
+            changed, likes_count = result
+            return Response({
+                'status': 'liked' if request.method == 'PUT' else 'unliked',
+                'changed': changed,
+                'likes_count': likes_count,
+            })
+
+        artwork = self.get_object()
+
+        def toggle():
+            like, created = Like.objects.get_or_create(
+                user=request.user,
+                artwork=artwork
+            )
+            if not created:
+                like.delete()
+                return 'unliked'
+            return 'liked'
+
+        return Response({'status': write_queue.run(toggle)})
+
+    @action(detail=True, methods=['post'])
+    def rate(self, request, slug=None):
+        """Rate an artwork from 1 to 5, replacing any previous rating"""
+        try:
+            value = int(request.data.get('value'))
+        except (TypeError, ValueError):
+            value = None
+        if value not in range(1, 6):
+            return Response({
+                'status': 'error',
+                'message': 'Rating must be an integer from 1 to 5'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        artwork = self.get_object()
+        try:
+            self._save_rating(request.user, artwork, value)
+        except IntegrityError:
+            # A concurrent first rating by the same user inserted the row
+            # between our read and insert; it is an update now
+            self._save_rating(request.user, artwork, value)
+        return Response({'status': 'rated', 'value': value, **self._rating_summary(artwork)})
+
+    @action(detail=True, methods=['post'])
+    def unrate(self, request, slug=None):
+        """Remove the current user's rating from an artwork"""
         artwork = self.get_object()
-        like, created = Like.objects.get_or_create(
-            user=request.user,
-            artwork=artwork
+        with transaction.atomic():
+            rating = ArtworkRating.objects.select_for_update().filter(
+                user=request.user, artwork=artwork
+            ).first()
+            if rating:
+                rating.delete()
+                self._apply_rating_delta(artwork, -rating.value, -1)
+        return Response({'status': 'unrated', **self._rating_summary(artwork)})
+
+    def _save_rating(self, user, artwork, value):
+        with transaction.atomic():
+            rating = ArtworkRating.objects.select_for_update().filter(
+                user=user, artwork=artwork
+            ).first()
+            if rating:
+                sum_delta, count_delta = value - rating.value, 0
+                rating.value = value
+                rating.save(update_fields=['value'])
+            else:
+                ArtworkRating.objects.create(user=user, artwork=artwork, value=value)
+                sum_delta, count_delta = value, 1
+            self._apply_rating_delta(artwork, sum_delta, count_delta)
+
+    def _apply_rating_delta(self, artwork, sum_delta, count_delta):
+        """Adjust the running totals and score in a single UPDATE"""
+        rating_sum = F('rating_sum') + sum_delta
+        rating_count = F('rating_count') + count_delta
+        score = Artwork.bayesian_expression(rating_sum, rating_count)
+        if count_delta < 0:
+            # Removing the last rating returns the artwork to the unrated score
+            score = Case(When(rating_count__lte=-count_delta, then=Value(0.0)), default=score)
+        Artwork.objects.filter(pk=artwork.pk).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            bayesian_score=score,
         )
-        if not created:
-            like.delete()
-            return Response({'status': 'unliked'})
-        return Response({'status': 'liked'})
+        ArtistStats.apply(artwork.artist_id, rating_sum=sum_delta, rating_count=count_delta)
+
+    def _rating_summary(self, artwork):
+        artwork.refresh_from_db(fields=['rating_sum', 'rating_count', 'bayesian_score'])
+        return {
+            'average_rating': artwork.average_rating,
+            'rating_count': artwork.rating_count,
+            'bayesian_score': artwork.bayesian_score,
+        }
+
+    @action(detail=False, methods=['get'])
+    def top_rated(self, request):
+        """Highest rated artworks, ranked by the precomputed Bayesian score"""
+        limit = parse_limit(request, 20)
+        artworks = Artwork.objects.order_by('-bayesian_score')[:limit]
+        return Response(ArtworkRows(request).serialize(artworks))
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Trending artworks, optionally for one gallery type, from the materialized ranking"""
+        limit = parse_limit(request, 20)
+        trends = ArtworkTrend.objects.filter(score__gte=ArtworkTrend.MIN_SCORE, artwork__deleted_at=None)
+        gallery_type = request.query_params.get('type')
+        if gallery_type:
+            trends = trends.filter(gallery_type=gallery_type.upper())
+        trends = trends.select_related('artwork').order_by('-score')[:limit]
+        serializer = self.get_serializer([trend.artwork for trend in trends], many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """Artworks engaged with by the same people, from the precomputed neighbours"""
+        artwork = self.get_object()
+        limit = parse_limit(request, 10)
+        similarities = ArtworkSimilarity.objects.filter(
+            artwork=artwork, similar__deleted_at=None
+        ).select_related('similar').order_by('-score')[:limit]
+        serializer = self.get_serializer([s.similar for s in similarities], many=True)
+        return Response(serializer.data)
 
     @action(detail=True)
     def comments(self, request, slug=None):
-        """List comments on an artwork"""
+        """List top-level comments on an artwork, newest first, by cursor"""
         artwork = self.get_object()
-        comments = artwork.comments.all()
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        comments = artwork.comments.filter(parent=None).select_related('user')
+        paginator = CommentCursorPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
+        serializer = CommentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def my_artworks(self, request):
@@ -209,42 +456,139 @@ class ArtworkViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('user')
     serializer_class = CommentSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=True)
+    def replies(self, request, pk=None):
+        """All replies below a comment, in thread order"""
+        comment = self.get_object()
+        replies = comment.descendants().select_related('user')
+        serializer = self.get_serializer(replies, many=True)
+        return Response(serializer.data)
+
+# Widest ?from= to ?to= span the calendar endpoint serves
+CALENDAR_MAX_DAYS = 366
+
+def parse_calendar_bound(value):
+    """An ISO date or datetime query parameter as an aware datetime, or None"""
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+EVENT_ORDERING = {
+    # Lifecycle order, then soonest first
+    'status': ['status_rank', 'start_date'],
+    'start_date': ['start_date'],
+    'end_date': ['end_date'],
+    'created_at': ['created_at'],
+}
+
+def filter_events_by_status(queryset, status, ordering=None):
+    """
+    Annotate an Event queryset with its status, narrow it to the events
+    whose status matches and apply an ?ordering= value from EVENT_ORDERING
+    """
+    now = timezone.now()
+    queryset = queryset.with_status(now)
+    if status:
+        # Plain date ranges rather than the annotation, so they can use the index
+        for label, condition in Event.status_conditions(now).items():
+            if status.lower() == label.lower():
+                queryset = queryset.filter(condition)
+    
+    if ordering and ordering.lstrip('-') in EVENT_ORDERING:
+        fields = EVENT_ORDERING[ordering.lstrip('-')]
+        if 'status_rank' in fields:
+            queryset = queryset.alias(status_rank=Case(
+                *(When(current_status=label, then=Value(rank)) for rank, label in enumerate(Event.STATUSES)),
+            ))
+        if ordering.startswith('-'):
+            fields = [f'-{field}' for field in fields]
+        queryset = queryset.order_by(*fields)
+    return queryset
+
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     lookup_field = 'slug'
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'summary', 'calendar']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        """Filter events based on query parameters"""
+        """Filter and order events based on query parameters"""
         queryset = super().get_queryset()
+        if self.action != 'list':
+            # Annotated statuses would go stale once an update changes the dates
+            return queryset
         status = self.request.query_params.get('status', None)
-        
-        if status:
-            # Convert status to date filtering logic
-            from django.utils import timezone
-            now = timezone.now()
-            
-            if status.lower() == 'upcoming':
-                queryset = queryset.filter(start_date__gt=now)
-            elif status.lower() == 'in progress':
-                queryset = queryset.filter(start_date__lte=now, end_date__gte=now)
-            elif status.lower() == 'completed':
-                queryset = queryset.filter(end_date__lt=now)
-        
-        return queryset
+        ordering = self.request.query_params.get('ordering', None)
+        return filter_events_by_status(queryset, status, ordering)
+
+    def list(self, request, *args, **kwargs):
+        # EventSerializer's output, built from .values() rows
+        return Response(EventRows(request).serialize(self.filter_queryset(self.get_queryset())))
+
+    def perform_destroy(self, instance):
+        # Hidden now, removed by purge_deleted
+        instance.soft_delete()
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Number of events in each status"""
+        counts = Event.objects.status_counts()
+        return Response({'total': sum(counts.values()), 'statuses': counts})
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """Events overlapping [from, to), soonest first"""
+        start = parse_calendar_bound(request.query_params.get('from'))
+        end = parse_calendar_bound(request.query_params.get('to'))
+        if start is None or end is None or end <= start:
+            return Response({
+                'status': 'error',
+                'message': 'from and to must be ISO dates or datetimes, with from before to'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+            return Response({
+                'status': 'error',
+                'message': f'The range can span at most {CALENDAR_MAX_DAYS} days'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        events = Event.objects.filter(
+            start_date__lt=end, end_date__gte=start
+        ).with_status().order_by('start_date', 'id')
+        serializer = EventCalendarSerializer(events, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='calendar/feed')
+    def calendar_feed(self, request):
+        """The URL of the current user's iCalendar feed of joined events"""
+        path = reverse('event-calendar-feed', args=[ical.feed_token(request.user)])
+        return Response({'url': request.build_absolute_uri(path)})
+
+    @action(detail=False, methods=['post'], url_path='calendar/feed/rotate')
+    def rotate_calendar_feed(self, request):
+        """Revoke the current user's feed URL and return its replacement"""
+        request.user.rotate_calendar_secret()
+        return self.calendar_feed(request)
 
     def create(self, request, *args, **kwargs):
         """Create a new event with proper slug handling"""
@@ -255,7 +599,8 @@ class EventViewSet(viewsets.ModelViewSet):
         base_title = request.data.get('title')
         slug = slugify(base_title)
         counter = 1
-        while Event.objects.filter(slug=slug).exists():
+        # Soft-deleted events keep their slugs until purge_deleted runs
+        while Event.all_objects.filter(slug=slug).exists():
             slug = f"{slugify(base_title)}-{counter}"
             counter += 1
         
@@ -271,54 +616,65 @@ class EventViewSet(viewsets.ModelViewSet):
         event = self.get_object()
         user = request.user
         
-        if event.participants.filter(id=user.id).exists():
-            # User is already joined, so remove them
-            event.participants.remove(user)
-            return Response({
-                'status': 'left',
-                'message': 'Successfully left the event',
-                'participants_count': event.participants.count()
-            })
-        else:
+        def toggle():
+            if event.participants.filter(id=user.id).exists():
+                # User is already joined, so remove them
+                event.participants.remove(user)
+                return 'left', event.participants.count()
             # Check if event is full
             if event.max_participants and event.participants.count() >= event.max_participants:
-                return Response({
-                    'status': 'error',
-                    'message': 'Event is full'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
+                return 'full', None
             # Add user to participants
             event.participants.add(user)
+            return 'joined', event.participants.count()
+
+        result, participants_count = write_queue.run(toggle)
+        if result == 'full':
             return Response({
-                'status': 'joined',
-                'message': 'Successfully joined the event',
-                'participants_count': event.participants.count()
-            })
+                'status': 'error',
+                'message': 'Event is full'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'status': result,
+            'message': f'Successfully {result} the event',
+            'participants_count': participants_count
+        })
 
 @api_view(['GET'])
+@authentication_classes([LiteJWTAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
     """Get dashboard statistics for the current user"""
-    user = request.user
+    # Only the ID is needed, so the user comes from the token claims
+    user_id = request.user.id
     
+    totals = Artwork.objects.filter(artist=user_id).aggregate(
+        artworks=Count('id'), views=Sum('views'),
+        rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'),
+    )
+    average_rating = 0
+    if totals['rating_count']:
+        average_rating = round(totals['rating_sum'] / totals['rating_count'], 2)
+
     stats = {
-        'totalArtworks': Artwork.objects.filter(artist=user).count(),
-        'eventsJoined': Event.objects.filter(participants=user).count(),
-        'totalViews': 0,  # You'll need to add a views field to your Artwork model
-        'averageRating': 0  # You'll need to add a rating system
+        'totalArtworks': totals['artworks'],
+        'eventsJoined': Event.objects.filter(participants=user_id).count(),
+        'totalViews': totals['views'] or 0,
+        'averageRating': average_rating
     }
     
     return Response(stats)
 
 @api_view(['GET'])
+@authentication_classes([LiteJWTAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_activities(request):
     """Get recent activities for the current user"""
-    user = request.user
+    user_id = request.user.id
     activities = []
     
     # Get recent artworks
-    recent_artworks = Artwork.objects.filter(artist=user).order_by('-created_at')[:5]
+    recent_artworks = Artwork.objects.filter(artist=user_id).order_by('-created_at')[:5]
     for artwork in recent_artworks:
         activities.append({
             'type': 'upload',
@@ -327,7 +683,7 @@ def dashboard_activities(request):
         })
     
     # Get recent event participations
-    recent_events = Event.objects.filter(participants=user).order_by('-created_at')[:5]
+    recent_events = Event.objects.filter(participants=user_id).order_by('-created_at')[:5]
     for event in recent_events:
         activities.append({
             'type': 'event',
@@ -340,10 +696,11 @@ def dashboard_activities(request):
     return Response(activities[:10])
 
 @api_view(['GET'])
+@authentication_classes([LiteJWTAuthentication])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_analytics(request):
     """Get analytics data for the current user"""
-    user = request.user
+    user_id = request.user.id
     now = timezone.now()
     
     # Get last 6 months of data
@@ -353,12 +710,12 @@ def dashboard_analytics(request):
         month_data = {
             'name': month_start.strftime('%B'),
             'artworks': Artwork.objects.filter(
-                artist=user,
+                artist=user_id,
                 created_at__year=month_start.year,
                 created_at__month=month_start.month
             ).count(),
             'events': Event.objects.filter(
-                participants=user,
+                participants=user_id,
                 created_at__year=month_start.year,
                 created_at__month=month_start.month
             ).count()
@@ -366,3 +723,70 @@ def dashboard_analytics(request):
         analytics_data.append(month_data)
     
     return Response(analytics_data)
+
+def metrics_allowed(request):
+    """Staff sessions, or a scraper sending PERFORMANCE_MONITORING['METRICS_TOKEN'] as a bearer token"""
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'PERFORMANCE_MONITORING', {}).get('METRICS_TOKEN')
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme == 'Bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics(request):
+    """Expose request metrics in the Prometheus text format"""
+    # Per-route latency and query counts are not for the public
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        performance_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def notification_ticket(request):
+    """A short-lived ticket for opening the notification stream with EventSource"""
+    ticket = notifications.stream_ticket(request.user.pk)
+    url = f"{reverse('notification-stream')}?{urlencode({'ticket': ticket})}"
+    return Response({
+        'ticket': ticket,
+        'expires_in': notifications.notification_config()['TICKET_SECONDS'],
+        'url': request.build_absolute_uri(url),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def following_feed(request):
+    """Newest artworks from the artists the current user follows, by cursor"""
+    config = feed.feed_config()
+    try:
+        size = min(int(request.query_params.get('page_size', config['PAGE_SIZE'])), config['MAX_PAGE_SIZE'])
+    except ValueError:
+        size = config['PAGE_SIZE']
+    size = max(size, 1)
+    cursor = request.query_params.get('cursor')
+    position = feed.decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_404_NOT_FOUND)
+
+    entries = feed.page(request.user.id, position, size)
+    artworks = Artwork.objects.select_related('artist', 'gallery').annotate(
+        likes_total=Count('likes'),
+    ).prefetch_related(
+        Prefetch(
+            'comments', queryset=Comment.objects.filter(parent=None).select_related('user').order_by('id'),
+            to_attr='top_level_comments',
+        ),
+    ).in_bulk([artwork_id for _, artwork_id in entries])
+    # An artwork deleted since the page was read is skipped
+    page = [artworks[artwork_id] for _, artwork_id in entries if artwork_id in artworks]
+    next_url = None
+    if len(entries) == size:
+        next_url = request.build_absolute_uri(
+            f'{request.path}?cursor={feed.encode_cursor(*entries[-1])}&page_size={size}'
+        )
+    serializer = ArtworkSerializer(page, many=True, context={'request': request})
+    return Response({'next': next_url, 'results': serializer.data})
@@ -0,0 +1,126 @@
+"""
+Single-writer queue for hot write endpoints.
+
+SQLite allows one writer at a time. Rather than letting every request
+thread race for the lock, the like/join toggles hand their write to one
+thread per process, which runs jobs back to back in their own
+transactions and retries when another process holds the lock. View
+counts are queued the same way but not waited for. Jobs run in the
+context of the request that queued them, so base.middleware counts their
+queries against it.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    'ENABLED': True,
+    'RETRIES': 5,
+    'BACKOFF': 0.05,
+    # Seconds a write may wait in the queue before it is dropped
+    'TIMEOUT': 30,
+}
+
+
+class WriteTimeout(APIException):
+    """The write was still queued after TIMEOUT seconds and was dropped unwritten"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many writes are queued; nothing was saved, try again.'
+    default_code = 'write_timeout'
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'WRITE_QUEUE', {})}
+
+
+def _is_lock_error(exc):
+    message = str(exc).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_with_retry(func, retries, backoff):
+    """Run func in a transaction, retrying while the database is locked"""
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError as exc:
+            if attempt == retries or not _is_lock_error(exc):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+class WriteQueue:
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def run(self, func):
+        """
+        Run func on the writer thread and return its result. Raises
+        WriteTimeout if it has not started within TIMEOUT seconds; a job
+        that has started is waited for, so the caller never reports a
+        failure for a write that then commits.
+        """
+        future = self.submit(func)
+        try:
+            return future.result(timeout=_config()['TIMEOUT'])
+        except TimeoutError:
+            if future.cancel():
+                raise WriteTimeout()
+            # Already running; run_with_retry bounds how long it can take
+            return future.result()
+
+    def submit(self, func):
+        """
+        Queue func for the writer thread and return a Future of its result,
+        for writes the request does not need to wait for
+        """
+        config = _config()
+        future = Future()
+        if not config['ENABLED']:
+            try:
+                future.set_result(run_with_retry(func, config['RETRIES'], config['BACKOFF']))
+            except BaseException as exc:
+                future.set_exception(exc)
+            return future
+        self._ensure_started()
+        self._jobs.put((func, future, contextvars.copy_context()))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._work, name='write-queue', daemon=True
+                )
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            func, future, context = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            config = _config()
+            # Keeps the thread's connection open until CONN_MAX_AGE, or after an error
+            close_old_connections()
+            try:
+                result = context.run(run_with_retry, func, config['RETRIES'], config['BACKOFF'])
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+write_queue = WriteQueue()